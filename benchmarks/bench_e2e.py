@@ -0,0 +1,274 @@
+"""End-to-end benchmark of SharepointTransfer against a local Graph stand-in.
+
+A real SharepointTransfer is created (with authentication stubbed out), and its
+Graph requests are redirected to the stand-in in graph_standin.py. For each
+combination of file count and size, the files are uploaded, listed, downloaded,
+and then moved by a post copy action. Each phase reports files/s, MB/s and the
+number of HTTP requests made per file.
+
+Results can be saved as a baseline, and later runs compared against it. A run
+fails if a phase's files/s drops by more than --max-regression percent, or if it
+makes more requests per file than the baseline did. Throughput baselines depend on
+the machine they were recorded on, so compare runs from the same machine.
+
+Usage:
+    python benchmarks/bench_e2e.py [--counts 10,200] [--sizes 4096,1048576]
+        [--latency-ms 5] [--throttle-rate 0] [--async-engine]
+        [--baseline benchmarks/baselines/e2e.json] [--save-baseline]
+        [--max-regression 25]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+# Keep the handler's logging off disk, and out of the timings
+os.environ.setdefault("OTF_NO_LOG", "1")
+os.environ.setdefault("OTF_LOG_LEVEL", "WARNING")
+
+# pylint: disable=wrong-import-position
+import requests
+from graph_standin import StandInProcess
+
+from opentaskpy.addons.o365.remotehandlers import sharepoint, sharepoint_async
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "e2e.json"
+
+
+class StandInTransport:
+    """Sends the handler's requests to the stand-in, instead of Graph.
+
+    Requests are made with the module level requests functions, exactly as the
+    handler's default transport does, so no connection pooling is added.
+    """
+
+    def __init__(self, graph_url: str):
+        """Redirect requests for GRAPH_URL to graph_url."""
+        self.graph_url = graph_url
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request to the stand-in."""
+        return requests.request(
+            method, url.replace(GRAPH_URL, self.graph_url), **kwargs
+        )
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+def _make_handler(standin: StandInProcess, protocol: dict) -> SharepointTransfer:
+    spec = {
+        "task_id": "bench-e2e",
+        "siteHostname": "standin.sharepoint.com",
+        "siteName": "bench",
+        "directory": "bench",
+        "postCopyAction": {"action": "move", "destination": "bench-archive"},
+        "protocol": {
+            "name": "opentaskpy.addons.o365.remotehandlers.sharepoint.SharepointTransfer",
+            "refreshToken": "refresh",
+            "clientId": "client",
+            "tenantId": "tenant",
+            **protocol,
+        },
+    }
+    credentials = {
+        "access_token": "token",
+        "refresh_token": "refresh",
+        "expiry": time.time() + 3600,
+    }
+    transport = StandInTransport(standin.graph_url)
+    handler = SharepointTransfer(spec)
+    handler._transport = transport  # pylint: disable=protected-access
+    with patch.object(sharepoint, "get_access_token", return_value=credentials):
+        # The token and site are only fetched on first use
+        handler._bootstrap()  # pylint: disable=protected-access
+    return handler
+
+
+def _run_phase(standin: StandInProcess, count: int, size: int, operation: Any) -> dict:
+    standin.reset_counts()
+    start = time.perf_counter()
+    rc = operation()
+    elapsed = time.perf_counter() - start
+    requests_made = standin.reset_counts()["requests"]
+    return {
+        "rc": rc,
+        "seconds": round(elapsed, 4),
+        "files_per_s": round(count / elapsed, 2),
+        "mb_per_s": round(count * size / elapsed / 1024 / 1024, 2),
+        "requests_per_file": round(requests_made / count, 3),
+    }
+
+
+def run_scenario(
+    standin: StandInProcess, handler: SharepointTransfer, count: int, size: int
+) -> dict[str, dict]:
+    """Upload, list, download and move count files of the given size.
+
+    Returns:
+        dict: The results for each phase.
+    """
+    results = {}
+    with (
+        tempfile.TemporaryDirectory() as upload_dir,
+        tempfile.TemporaryDirectory() as download_dir,
+    ):
+        content = os.urandom(size)
+        for i in range(count):
+            Path(upload_dir, f"file{i:06d}.dat").write_bytes(content)
+
+        results["upload"] = _run_phase(
+            standin,
+            count,
+            size,
+            lambda: handler.push_files_from_worker(upload_dir),
+        )
+
+        listing: dict = {}
+
+        def list_files() -> int:
+            listing.update(handler.list_files("bench", r"file\d+\.dat"))
+            return 0 if len(listing) == count else 1
+
+        results["list"] = _run_phase(standin, count, 0, list_files)
+        results["download"] = _run_phase(
+            standin,
+            count,
+            size,
+            lambda: handler.pull_files_to_worker(listing, download_dir),
+        )
+        results["post_copy"] = _run_phase(
+            standin,
+            count,
+            0,
+            lambda: handler.handle_post_copy_action(listing),
+        )
+    return results
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Return a description of each regression against the baseline."""
+    failures = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        floor = expected["files_per_s"] * (1 - max_regression / 100)
+        if result["files_per_s"] < floor:
+            failures.append(
+                f"{key}: {result['files_per_s']} files/s is below"
+                f" {expected['files_per_s']} by more than {max_regression:g}%"
+            )
+        if result["requests_per_file"] > expected["requests_per_file"] + 0.001:
+            failures.append(
+                f"{key}: {result['requests_per_file']} requests per file, up from"
+                f" {expected['requests_per_file']}"
+            )
+    return failures
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=_int_list, default=[10, 200])
+    parser.add_argument(
+        "--sizes",
+        type=_int_list,
+        default=[4096, 1024 * 1024],
+        help="File sizes in bytes. Sizes over 200MB exercise upload sessions",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=5.0,
+        help="Latency added to every request",
+    )
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="Proportion of requests rejected with 429",
+    )
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--async-engine", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=25.0,
+        help="Fail if files/s drops by more than this %% against the baseline",
+    )
+    args = parser.parse_args()
+
+    engine = "async" if args.async_engine else "sync"
+    settings = {
+        "latency_ms": args.latency_ms,
+        "throttle_rate": args.throttle_rate,
+        "max_concurrency": args.max_concurrency,
+    }
+    protocol = {
+        "maxConcurrency": args.max_concurrency,
+        "asyncEngine": args.async_engine,
+    }
+
+    results: dict[str, dict] = {}
+    failed = False
+    with StandInProcess(
+        latency=args.latency_ms / 1000, throttle_rate=args.throttle_rate
+    ) as standin:
+        handler = _make_handler(standin, protocol)
+        with patch.object(sharepoint_async, "GRAPH_URL", standin.graph_url):
+            for size in args.sizes:
+                for count in args.counts:
+                    for phase, result in run_scenario(
+                        standin, handler, count, size
+                    ).items():
+                        key = f"{engine}/{phase}/{count}x{size}"
+                        results[key] = result
+                        failed = failed or result["rc"] != 0
+                        print(
+                            f"{key:<32} {result['files_per_s']:>10.1f} files/s"
+                            f" {result['mb_per_s']:>9.2f} MB/s"
+                            f" {result['requests_per_file']:>7.3f} requests/file"
+                            f"{'' if result['rc'] == 0 else '  FAILED'}"
+                        )
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        if stored.get("settings", settings) != settings:
+            stored = {}
+        stored["settings"] = settings
+        stored.setdefault("results", {}).update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {args.baseline}")
+    elif stored:
+        if stored.get("settings") != settings:
+            print(f"Baseline was recorded with {stored.get('settings')}, not comparing")
+        else:
+            failures = compare(results, stored["results"], args.max_regression)
+            for failure in failures:
+                print(f"REGRESSION: {failure}")
+            failed = failed or bool(failures)
+
+    if failed:
+        print("FAIL")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
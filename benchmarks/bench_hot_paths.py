@@ -0,0 +1,213 @@
+"""Microbenchmarks for the per-item code paths of the Sharepoint handler.
+
+None of these make any requests, so they measure only the handler's own overhead
+for each item it processes:
+
+    list_page           _add_listed_files on a page of driveItems, with a pattern
+    list_page_all       _add_listed_files on a page of driveItems, without one
+    file_url            get_file_url_from_path for paths relative to the site root
+    file_url_library    get_file_url_from_path for paths in a document library
+    chunk_ranges        iter_chunk_ranges for the chunks of an upload session
+    rename              _rename applying the rename from the spec to a file name
+
+Each case is run over --items synthetic items (a single listing page of that many
+driveItems, for the listing cases), and the best of --repeat runs is reported in
+nanoseconds per item. Results can be saved as a baseline, and later runs fail if
+any case gets slower by more than --max-regression percent. Timings depend on the
+machine and Python version they were recorded with, so compare like with like.
+
+Usage:
+    python benchmarks/bench_hot_paths.py [--items 100000] [--repeat 5]
+        [--baseline benchmarks/baselines/hot_paths.json] [--save-baseline]
+        [--max-regression 25]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.streams import (
+    UPLOAD_CHUNK_MULTIPLE,
+    iter_chunk_ranges,
+)
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "hot_paths.json"
+FILE_PATTERN = r"report_\d+\.csv"
+
+
+def _make_handler() -> SharepointTransfer:
+    handler = SharepointTransfer.__new__(SharepointTransfer)
+    # The handler logs a summary of each listing, and each file at debug. Nothing is
+    # written, as it would be with OTF_LOG_LEVEL above INFO
+    handler.logger = logging.getLogger("bench_hot_paths")
+    handler.logger.setLevel(logging.WARNING)
+    handler.spec = {
+        "siteName": "bench",
+        "rename": {"pattern": r"^report_(\d+)\.csv$", "sub": r"archived_\1.csv"},
+        "protocol": {},
+    }
+    handler.site_id = "contoso.sharepoint.com,site-id,web-id"
+    # Document library IDs are looked up with a request, which is not what is being
+    # measured here
+    handler._get_drive_id = lambda library_name: "b!drive-id"  # type: ignore[method-assign]
+    return handler
+
+
+def make_page(items: int) -> list[dict]:
+    """Return a page of driveItems, as returned by a children request.
+
+    Most items are files matching FILE_PATTERN, with a sprinkling of folders and
+    files that don't match.
+    """
+    page = []
+    for i in range(items):
+        item = {
+            "id": f"01ABCDEF{i:012d}",
+            "name": f"report_{i:06d}.csv",
+            "size": 1024 + i,
+            "lastModifiedDateTime": (
+                f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00Z"
+            ),
+            "file": {
+                "mimeType": "text/csv",
+                "hashes": {"quickXorHash": "AAAAAAAAAAAAAAAAAAAAAAAAAAA="},
+            },
+        }
+        if i % 50 == 0:
+            item["name"] = f"folder_{i:06d}"
+            del item["file"]
+            item["folder"] = {"childCount": 3}
+        elif i % 10 == 0:
+            item["name"] = f"notes_{i:06d}.txt"
+        page.append(item)
+    return page
+
+
+def _cases(handler: SharepointTransfer, items: int) -> dict[str, Callable[[], None]]:
+    page = make_page(items)
+    names = [item["name"] for item in page]
+    relative_paths = [f"reports/2024/{name}" for name in names]
+    library_paths = [f"/Documents/reports/2024/{name}" for name in names]
+    file_size = items * UPLOAD_CHUNK_MULTIPLE
+
+    # pylint: disable=protected-access
+    def list_page() -> None:
+        handler._add_listed_files(page, "reports", FILE_PATTERN, {})
+
+    def list_page_all() -> None:
+        handler._add_listed_files(page, "reports", None, {})
+
+    def file_url() -> None:
+        for file_path in relative_paths:
+            handler.get_file_url_from_path(file_path)
+
+    def file_url_library() -> None:
+        for file_path in library_paths:
+            handler.get_file_url_from_path(file_path)
+
+    def chunk_ranges() -> None:
+        for _ in iter_chunk_ranges(file_size, UPLOAD_CHUNK_MULTIPLE):
+            pass
+
+    def rename() -> None:
+        for name in names:
+            handler._rename(name)
+
+    return {
+        "list_page": list_page,
+        "list_page_all": list_page_all,
+        "file_url": file_url,
+        "file_url_library": file_url_library,
+        "chunk_ranges": chunk_ranges,
+        "rename": rename,
+    }
+
+
+def run(items: int, repeat: int) -> dict[str, float]:
+    """Time each case, returning the best time in nanoseconds per item."""
+    results = {}
+    for name, case in _cases(_make_handler(), items).items():
+        best = float("inf")
+        for _ in range(repeat):
+            # As timeit does, keep garbage collection out of the timings
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter_ns()
+                case()
+                best = min(best, time.perf_counter_ns() - start)
+            finally:
+                gc.enable()
+        results[name] = round(best / items, 1)
+    return results
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], max_regression: float
+) -> list[str]:
+    """Return a description of each case that is slower than the baseline allows."""
+    failures = []
+    for name, ns_per_item in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if ns_per_item > expected * (1 + max_regression / 100):
+            failures.append(
+                f"{name}: {ns_per_item} ns/item is slower than {expected} by more"
+                f" than {max_regression:g}%"
+            )
+    return failures
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=25.0,
+        help="Fail if any case gets slower by more than this %% against the baseline",
+    )
+    args = parser.parse_args()
+
+    settings = {
+        "items": args.items,
+        "python": ".".join(platform.python_version_tuple()[:2]),
+    }
+    results = run(args.items, args.repeat)
+    for name, ns_per_item in results.items():
+        print(f"{name:<20} {ns_per_item:>10.1f} ns/item")
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps({"settings": settings, "results": results}, indent=2) + "\n"
+        )
+        print(f"Saved baseline to {args.baseline}")
+    elif stored:
+        if stored.get("settings") != settings:
+            print(f"Baseline was recorded with {stored.get('settings')}, not comparing")
+        else:
+            failures = compare(results, stored["results"], args.max_regression)
+            for failure in failures:
+                print(f"REGRESSION: {failure}")
+            if failures:
+                print("FAIL")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
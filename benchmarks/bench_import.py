@@ -0,0 +1,116 @@
+"""Import time benchmark for the Sharepoint handler.
+
+Every task process imports the handler, including those that only validate their
+config, so the time it takes is paid on every run. This imports the handler in a
+fresh interpreter --repeat times, and reports the best time in milliseconds. It
+also checks that the modules that are deliberately only imported on first use
+(msal, tenacity, dateutil and asyncio) haven't crept back into the import.
+
+Results can be saved as a baseline, and later runs fail if the import gets slower
+by more than --max-regression percent. Timings depend on the machine and Python
+version they were recorded with, so compare like with like.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 20]
+        [--baseline benchmarks/baselines/import_time.json] [--save-baseline]
+        [--max-regression 25]
+"""
+
+import argparse
+import json
+import platform
+import subprocess  # nosec B404
+import sys
+from pathlib import Path
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "import_time.json"
+MODULE = "opentaskpy.addons.o365.remotehandlers.sharepoint"
+DEFERRED_MODULES = ("msal", "tenacity", "dateutil", "asyncio")
+
+
+def import_once() -> tuple[float, list[str]]:
+    """Import the handler in a fresh interpreter.
+
+    Returns:
+        tuple: The time taken to import it, in milliseconds, and the deferred
+        modules that were imported along with it.
+    """
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {MODULE}\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"deferred = [m for m in {DEFERRED_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, *deferred)\n"
+    )
+    completed = subprocess.run(  # nosec B603
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    milliseconds, *imported = completed.stdout.split()
+    return float(milliseconds), imported
+
+
+def run(repeat: int) -> tuple[float, list[str]]:
+    """Return the best import time in milliseconds, and any deferred modules."""
+    best = float("inf")
+    imported: list[str] = []
+    for _ in range(repeat):
+        milliseconds, imported = import_once()
+        best = min(best, milliseconds)
+    return round(best, 2), imported
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=25.0,
+        help="Fail if the import gets slower by more than this %% against the baseline",
+    )
+    args = parser.parse_args()
+
+    settings = {"python": ".".join(platform.python_version_tuple()[:2])}
+    milliseconds, imported = run(args.repeat)
+    print(f"import {MODULE}: {milliseconds:.2f} ms")
+
+    failed = False
+    if imported:
+        print(f"FAIL: imported at import time: {', '.join(imported)}")
+        failed = True
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps(
+                {"settings": settings, "results": {"import_ms": milliseconds}},
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"Saved baseline to {args.baseline}")
+    elif stored:
+        if stored.get("settings") != settings:
+            print(f"Baseline was recorded with {stored.get('settings')}, not comparing")
+        else:
+            expected = stored["results"]["import_ms"]
+            if milliseconds > expected * (1 + args.max_regression / 100):
+                print(
+                    f"REGRESSION: {milliseconds} ms is slower than {expected} ms by"
+                    f" more than {args.max_regression:g}%"
+                )
+                failed = True
+
+    if failed:
+        print("FAIL")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Microbenchmark for the in-stream quickXorHash.
+
+Reads a temporary file the way http.client sends a request body (8KB blocks),
+pausing after every 1MB to simulate the socket send at the given link speed. The
+same transfer is timed without hashing, with the hash computed inline, and with
+the BackgroundHasher used by the handler, and the slowdown of each is reported.
+
+Usage:
+    python benchmarks/bench_quickxorhash.py [--size-mb 128] [--link-mbps 100]
+        [--max-overhead 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import (
+    BackgroundHasher,
+    HashingReader,
+    QuickXorHash,
+)
+
+HTTP_CLIENT_BLOCK_SIZE = 8192
+SEND_BLOCK_SIZE = 1024 * 1024
+
+
+def _time_transfer(file: str, link_mbps: float, mode: str) -> float:
+    size = os.path.getsize(file)
+    send_time = SEND_BLOCK_SIZE / (link_mbps * 1024 * 1024)
+    start = time.perf_counter()
+    with open(file, "rb") as f:
+        hasher: QuickXorHash | BackgroundHasher | None = None
+        reader = f
+        if mode == "inline":
+            hasher = QuickXorHash()
+        elif mode == "background":
+            hasher = BackgroundHasher()
+        if hasher is not None:
+            reader = HashingReader(f, hasher, size)  # type: ignore[assignment]
+
+        unsent = 0
+        while block := reader.read(HTTP_CLIENT_BLOCK_SIZE):
+            unsent += len(block)
+            if unsent >= SEND_BLOCK_SIZE:
+                # A blocking send releases the GIL, much like sleep does
+                time.sleep(send_time)
+                unsent = 0
+
+        if hasher is not None:
+            hasher.base64digest()
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument(
+        "--link-mbps",
+        type=float,
+        default=100.0,
+        help="Per-file transfer rate to simulate, in MB/s",
+    )
+    parser.add_argument(
+        "--max-overhead",
+        type=float,
+        default=5.0,
+        help="Fail if the handler's hashing slows the transfer by more than this %%",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.NamedTemporaryFile() as tmp:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            tmp.write(block)
+        tmp.flush()
+
+        for mode in ("none", "inline", "background"):
+            # Best of 3 runs for each
+            results[mode] = min(
+                _time_transfer(tmp.name, args.link_mbps, mode) for _ in range(3)
+            )
+
+    print(f"simulated link: {args.link_mbps:g} MB/s, file: {args.size_mb} MB")
+    for mode, elapsed in results.items():
+        overhead = (elapsed / results["none"] - 1) * 100
+        print(
+            f"  hash {mode:<10} {args.size_mb / elapsed:8.1f} MB/s"
+            f"  overhead {overhead:6.2f}%"
+        )
+
+    overhead = (results["background"] / results["none"] - 1) * 100
+    if overhead > args.max_overhead:
+        print(f"FAIL: overhead {overhead:.2f}% exceeds {args.max_overhead:g}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Local HTTP stand-in for the parts of the MS Graph API used by SharepointTransfer.
+
+Serves the in-memory FakeDrive from the handler's package over HTTP, so that
+benchmarks include real connections and request parsing.
+
+Every HTTP request can be given a fixed latency, and a proportion of them can be
+rejected with 429 and a Retry-After header, to mimic Graph's throttling. The
+number of requests and bytes moved are counted, so benchmarks can report
+requests per file.
+
+Usage, to run it on its own:
+    python benchmarks/graph_standin.py [--port 8080] [--latency-ms 20]
+        [--throttle-rate 0.01]
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any
+from urllib.request import urlopen
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    DEFAULT_PAGE_SIZE,
+    FakeDrive,
+)
+
+COUNTS_PATH = "/_standin/counts"
+
+
+class GraphStandIn(FakeDrive):
+    """FakeDrive, served over HTTP on localhost."""
+
+    def __init__(
+        self,
+        libraries: tuple[str, ...] = ("Documents",),
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        seed: int = 0,
+    ):
+        """Create the stand-in.
+
+        Args:
+            libraries: The document libraries in the site. The first is the default
+            drive.
+            latency: Seconds to wait before answering each HTTP request.
+            throttle_rate: The proportion of HTTP requests to reject with 429.
+            retry_after: The Retry-After value sent with each 429.
+            page_size: The default number of children returned per page.
+            seed: Seed for choosing which requests are throttled.
+        """
+        super().__init__(libraries, page_size, base_url="")
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.counts: Counter[str] = Counter()
+
+        self._random = random.Random(seed)
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    # Server lifecycle
+
+    def start(self, port: int = 0) -> "GraphStandIn":
+        """Start serving on localhost, on a free port unless one is given."""
+        standin = self
+
+        class Handler(_RequestHandler):
+            graph = standin
+
+        self._server = _Server(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "GraphStandIn":
+        """Start serving."""
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop serving."""
+        self.stop()
+
+    def reset_counts(self) -> Counter[str]:
+        """Return the request counts so far, and start counting again."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+    def should_throttle(self) -> bool:
+        """Decide whether to reject the current request with a 429."""
+        with self._lock:
+            return self._random.random() < self.throttle_rate
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when clients open many at once
+    request_queue_size = 1024
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    graph: GraphStandIn
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        """Send responses as soon as they are written."""
+        super().setup()
+        # Headers and body are written separately, which otherwise stalls on
+        # Nagle's algorithm and delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Don't log each request."""
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _dispatch(self) -> None:
+        body = self._read_body()
+        if self.path.startswith(COUNTS_PATH):
+            # Control endpoint, used by StandInProcess, which isn't counted
+            self._send(200, {}, json.dumps(self.graph.reset_counts()).encode())
+            return
+
+        with self.graph._lock:  # pylint: disable=protected-access
+            self.graph.counts["requests"] += 1
+            self.graph.counts[self.command] += 1
+            self.graph.counts["bytes_in"] += len(body)
+
+        if self.graph.latency:
+            time.sleep(self.graph.latency)
+
+        if self.graph.should_throttle():
+            status = 429
+            headers = {"Retry-After": str(self.graph.retry_after)}
+            response_body: Any = {
+                "error": {
+                    "code": "activityLimitReached",
+                    "message": "Throttled by the stand-in",
+                }
+            }
+        else:
+            status, headers, response_body = self.graph.handle(
+                self.command,
+                self.path,
+                {key.lower(): value for key, value in self.headers.items()},
+                body,
+            )
+
+        if not isinstance(response_body, bytes):
+            response_body = json.dumps(response_body).encode()
+            headers.setdefault("Content-Type", "application/json")
+
+        with self.graph._lock:  # pylint: disable=protected-access
+            self.graph.counts["bytes_out"] += len(response_body)
+
+        self._send(status, headers, response_body)
+
+    def _send(self, status: int, headers: dict[str, str], body: bytes) -> None:
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _dispatch
+
+
+def _serve(options: dict, connection: Connection) -> None:
+    standin = GraphStandIn(**options).start()
+    connection.send(standin.base_url)
+    threading.Event().wait()
+
+
+class StandInProcess:
+    """Runs a GraphStandIn in a child process.
+
+    Benchmarks use this, so that the stand-in doesn't compete with the handler
+    being measured for the GIL.
+    """
+
+    def __init__(self, **options: Any):
+        """Set up the process.
+
+        Args:
+            **options: Arguments for GraphStandIn.
+        """
+        self.options = options
+        self.base_url = ""
+        self._process: BaseProcess | None = None
+
+    def __enter__(self) -> "StandInProcess":
+        """Start the stand-in, and wait until it is listening."""
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_serve, args=(self.options, sender), daemon=True
+        )
+        self._process.start()
+        self.base_url = receiver.recv()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop the stand-in."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+    @property
+    def graph_url(self) -> str:
+        """Return the URL that stands in for https://graph.microsoft.com/v1.0."""
+        return f"{self.base_url}/v1.0"
+
+    def reset_counts(self) -> Counter[str]:
+        """Return the request counts so far, and start counting again."""
+        with urlopen(f"{self.base_url}{COUNTS_PATH}") as response:
+            return Counter(json.load(response))
+
+
+def main() -> None:
+    """Run the stand-in until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    standin = GraphStandIn(
+        latency=args.latency_ms / 1000, throttle_rate=args.throttle_rate
+    ).start(args.port)
+    print(f"Graph stand-in listening on {standin.graph_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Warm Sharepoint clients, shared by the handlers in a process.
+
+In an OTF batch, every task creates its own handlers, and each one gets an access
+token, looks up the site and its document libraries, and opens connections of its
+own, even when all of them use the same site. With the sharedClient protocol
+option, handlers for the same tenant, client, user, host and site share a
+SharepointClient instead, which holds the access token, the site, drive and folder
+IDs, and the transport with its connection pool.
+
+Clients are reference counted. Each handler acquires its client when it is
+created, and releases it in tidy. A client that is no longer used by any handler
+is kept for CLIENT_IDLE_TIMEOUT seconds, so the next task in the batch can pick it
+up, and is then closed.
+"""
+
+import threading
+from time import monotonic, time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .creds import TOKEN_CACHE_MARGIN, refresh_token_digest
+
+# Seconds an unused client is kept for, before it is closed
+CLIENT_IDLE_TIMEOUT = 300.0
+
+ClientKey = tuple[str, str, str, str, str]
+
+
+class SessionTransport:
+    """Sends requests through a requests Session, so connections are reused."""
+
+    def __init__(self, max_connections: int = 10):
+        """Create the session.
+
+        Args:
+            max_connections (int): The number of connections to keep open.
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_connections, pool_maxsize=max_connections
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request, taking the same arguments as requests.request."""
+        # pylint: disable-next=missing-timeout
+        return self.session.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        """Close the session and its connections."""
+        self.session.close()
+
+
+class SharepointClient:
+    """The state that handlers for the same site can share."""
+
+    def __init__(self, key: ClientKey):
+        """Create an empty client, which the first handler to use it fills in.
+
+        Args:
+            key (tuple): The tenant ID, client ID, refresh token hash, site hostname
+            and site name.
+        """
+        self.key = key
+        self.references = 0
+        self.idle_since: float | None = None
+        # Held while a handler bootstraps from, or into, the client
+        self.lock = threading.RLock()
+        self.credentials: dict | None = None
+        self.site_id: str | None = None
+        self.drive_ids: dict[str, str] | None = None
+        self.folder_ids: dict[str, str] | None = None
+        self.transport: Any = None
+
+    def token_is_valid(self) -> bool:
+        """Return whether the access token is valid for at least a few minutes."""
+        return (
+            self.credentials is not None
+            and self.credentials["expiry"] >= time() + TOKEN_CACHE_MARGIN
+        )
+
+    def close(self) -> None:
+        """Close the transport."""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+
+_clients: dict[ClientKey, SharepointClient] = {}
+_lock = threading.Lock()
+
+
+def client_key(spec: dict) -> ClientKey:
+    """Return the key of the client for a handler spec.
+
+    Args:
+        spec (dict): The source or destination spec.
+
+    Returns:
+        tuple: The tenant ID, client ID, refresh token hash, site hostname and site
+        name. Handlers that authenticate as different users never share a client,
+        as they would otherwise run with each other's access token.
+    """
+    return (
+        spec["protocol"]["tenantId"],
+        spec["protocol"]["clientId"],
+        refresh_token_digest(spec["protocol"]["refreshToken"]),
+        spec["siteHostname"].lower(),
+        spec["siteName"].lower(),
+    )
+
+
+def acquire_client(key: ClientKey) -> SharepointClient:
+    """Return the client for a key, creating it if there isn't one.
+
+    Args:
+        key (tuple): The key, from client_key.
+
+    Returns:
+        SharepointClient: The client, which must be passed to release_client when
+        the handler is finished with it.
+    """
+    with _lock:
+        _close_idle_clients(monotonic())
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = SharepointClient(key)
+        client.references += 1
+        client.idle_since = None
+        return client
+
+
+def add_client_key(client: SharepointClient, key: ClientKey) -> None:
+    """Keep a client under another key too, unless another client has it.
+
+    Getting an access token can rotate the refresh token, and later tasks are
+    given the new one, e.g. from a cacheable variable. Keeping the client under
+    the key for the new refresh token lets them find it.
+
+    Args:
+        client (SharepointClient): The client.
+        key (tuple): The key, from client_key.
+    """
+    with _lock:
+        _clients.setdefault(key, client)
+
+
+def release_client(client: SharepointClient) -> None:
+    """Release a client acquired with acquire_client.
+
+    Args:
+        client (SharepointClient): The client.
+    """
+    with _lock:
+        client.references -= 1
+        if client.references <= 0:
+            client.idle_since = monotonic()
+        _close_idle_clients(monotonic())
+
+
+def close_clients() -> None:
+    """Close every client, whether it is in use or not."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def _close_idle_clients(now: float) -> None:
+    """Close the clients that have been unused for CLIENT_IDLE_TIMEOUT seconds."""
+    for key, client in list(_clients.items()):
+        if client.idle_since is not None and (
+            now - client.idle_since >= CLIENT_IDLE_TIMEOUT
+        ):
+            client.close()
+            del _clients[key]
@@ -0,0 +1,134 @@
+"""File conditionals checked while listing, rather than after.
+
+OTF applies the size, age and count conditionals of a source to the complete
+result of list_files. The handler applies the size conditionals and the maximum
+age while it pages through a folder instead, so files that can't be transferred
+aren't kept. When there is a maximum age, the folder is listed newest first, and
+listing stops at the first page that ends with a file older than the window.
+
+OTF still checks the conditionals itself afterwards, so the minimum age and the
+counts are left to it. A file that is too new now may not be by the time OTF
+checks it, and the count can only be checked once everything is listed.
+"""
+
+from datetime import UTC, datetime
+from math import inf
+from time import time
+
+# Graph orders children by this, newest first, when listing to a maximum age
+NEWEST_FIRST = "lastModifiedDateTime desc"
+
+
+def parse_modified_time(value: str) -> float:
+    """Return a lastModifiedDateTime from Graph as an epoch.
+
+    This is done for every item listed, and fromisoformat is many times faster than
+    strptime.
+
+    Args:
+        value (str): The time, e.g. 2024-01-31T12:00:00Z.
+
+    Returns:
+        float: The time as an epoch.
+    """
+    modified = datetime.fromisoformat(value)
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=UTC)
+    return modified.timestamp()
+
+
+class ListingConditions:
+    """The conditionals of a source that can be checked while listing."""
+
+    def __init__(
+        self,
+        min_size: int | None = None,
+        max_size: int | None = None,
+        max_age: int | None = None,
+    ):
+        """Create the conditions for a single listing.
+
+        Args:
+            min_size (int, optional): Files must be bigger than this.
+            max_size (int, optional): Files must be smaller than this.
+            max_age (int, optional): Files must have been modified less than this
+            many seconds ago.
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        # Files modified at or before this are too old
+        self.oldest = time() - max_age if max_age else None
+        # Cleared if Graph turns out not to have ordered the listing
+        self.in_order = True
+        self._previous_modified = inf
+        self.skipped = 0
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "ListingConditions | None":
+        """Return the conditions to check while listing for a source.
+
+        Args:
+            spec (dict): The source spec.
+
+        Returns:
+            ListingConditions: The conditions, or None if there are none to check.
+            During a file watch, OTF only applies the conditionals to what it finds
+            if checkDuringFilewatch is set, so neither is the handler.
+        """
+        conditionals = spec.get("conditionals")
+        if not conditionals:
+            return None
+        if "fileWatch" in spec and "checkDuringFilewatch" not in conditionals:
+            return None
+
+        size = conditionals.get("size", {})
+        age = conditionals.get("age", {})
+        if not (size.get("gt") or size.get("lt") or age.get("lt")):
+            return None
+        return cls(size.get("gt"), size.get("lt"), age.get("lt"))
+
+    @property
+    def newest_first(self) -> bool:
+        """Return whether the listing should be in lastModifiedDateTime order."""
+        return self.oldest is not None
+
+    def accepts(self, size: int, modified_time: float) -> bool:
+        """Return whether a file meets the conditions, as OTF would check them.
+
+        Args:
+            size (int): The size of the file.
+            modified_time (float): When it was last modified, as an epoch.
+
+        Returns:
+            bool: True if the file should be listed.
+        """
+        if (
+            (self.min_size and size <= self.min_size)
+            or (self.max_size and size >= self.max_size)
+            or (self.oldest is not None and modified_time <= self.oldest)
+        ):
+            self.skipped += 1
+            return False
+        return True
+
+    def window_passed(self, items: list[dict]) -> bool:
+        """Return whether a newest first listing can stop after a page.
+
+        Args:
+            items (list): The driveItems in the page, files and folders.
+
+        Returns:
+            bool: True if the page ended with an item older than the age window,
+            so every later page would too. False if not, or if the items turn out
+            not to be in order.
+        """
+        if self.oldest is None or not self.in_order:
+            return False
+        for item in items:
+            modified_time = parse_modified_time(item["lastModifiedDateTime"])
+            if modified_time > self._previous_modified:
+                self.in_order = False
+                return False
+            self._previous_modified = modified_time
+        return self._previous_modified <= self.oldest
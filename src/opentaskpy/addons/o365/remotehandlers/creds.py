@@ -1,18 +1,132 @@
 """O365 helper functions."""
 
+import hashlib
+import json
+import os
+import tempfile
+import threading
 from time import time
 
 import opentaskpy.otflogging
-from msal import PublicClientApplication
 from opentaskpy.exceptions import RemoteTransferError
 
+# Cached access tokens are only used if they are valid for at least this long
+TOKEN_CACHE_MARGIN = 300
+
+# OTF runs the tasks of a batch as threads, which may refresh tokens at the same time
+_token_cache_lock = threading.Lock()
+
+
+def refresh_token_digest(refresh_token: str) -> str:
+    """Return a hash of a refresh token, which identifies the user it is for.
+
+    Tasks can use the same app registration as different users, so anything kept
+    for a tenant and client ID must be kept per user too.
+
+    Args:
+        refresh_token: The refresh token.
+
+    Returns:
+        str: The SHA-256 of the refresh token, in hex.
+    """
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def _token_cache_key(credentials: dict, refresh_token: str) -> str:
+    digest = refresh_token_digest(refresh_token)
+    return f"{credentials['tenantId']}/{credentials['clientId']}/{digest}"
+
+
+def read_cached_token(cache_file: str, credentials: dict) -> dict | None:
+    """Return a cached access token for the client, if it is still valid.
+
+    Args:
+        cache_file: The token cache file.
+        credentials: The credentials the token is for.
+
+    Returns:
+        dict: The cached access_token, expiry and refresh_token, or None if there
+        isn't one that is valid for at least TOKEN_CACHE_MARGIN seconds. Without a
+        refreshToken there's no way to tell whose token it would be, so None.
+    """
+    if not credentials.get("refreshToken"):
+        return None
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f).get(
+                _token_cache_key(credentials, credentials["refreshToken"])
+            )
+    except (OSError, ValueError):
+        return None
+
+    if not cached or cached["expiry"] < time() + TOKEN_CACHE_MARGIN:
+        return None
+    return dict(cached)
+
+
+def write_cached_token(cache_file: str, credentials: dict, token: dict) -> None:
+    """Save an access token in the cache, readable only by the current user.
+
+    The token is stored for both the refresh token it was acquired with and the
+    one returned with it, so later tasks find it whichever of them they have.
+
+    Args:
+        cache_file: The token cache file. Unexpired tokens for other clients and
+        users are kept.
+        credentials: The credentials the token is for.
+        token: The access_token, expiry and refresh_token.
+    """
+    refresh_tokens = {credentials.get("refreshToken"), token.get("refresh_token")}
+    with _token_cache_lock:
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            tokens = {}
+        now = time()
+        tokens = {
+            key: cached
+            for key, cached in tokens.items()
+            if cached.get("expiry", 0) > now
+        }
+        for refresh_token in refresh_tokens:
+            if refresh_token:
+                tokens[_token_cache_key(credentials, refresh_token)] = token
+
+        # Written to a temporary file, which mkstemp makes readable only by the
+        # current user, and moved into place, so a partial cache is never read
+        fd, temp_file = tempfile.mkstemp(
+            dir=os.path.dirname(cache_file) or None, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(tokens, f)
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+
 
 def get_access_token(credentials: dict) -> dict:
     """Get an access token using the provided credentials.
 
+    If credentials has a tokenCache file, and it holds a valid access token for the
+    client, that is returned without contacting Entra ID, or importing msal.
+
     Args:
         credentials: The credentials to use
     """
+    cache_file = credentials.get("tokenCache")
+    if cache_file:
+        cached = read_cached_token(cache_file, credentials)
+        if cached:
+            return cached
+
+    # msal is slow to import, and isn't needed when there's a cached token
+    from msal import (  # pylint: disable=import-outside-toplevel
+        PublicClientApplication,
+    )
+
     msal_app = PublicClientApplication(
         client_id=credentials["clientId"],
         authority=f"https://login.microsoftonline.com/{credentials['tenantId']}",
@@ -45,8 +159,11 @@ def get_access_token(credentials: dict) -> dict:
     # Get the current epoch
     expiry = int(time()) + result["expires_in"]
 
-    return {
+    token = {
         "access_token": result["access_token"],
         "expiry": expiry,
         "refresh_token": result["refresh_token"],
     }
+    if cache_file:
+        write_cached_token(cache_file, credentials, token)
+    return token
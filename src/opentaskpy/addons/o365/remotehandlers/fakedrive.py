@@ -0,0 +1,645 @@
+"""In-memory stand-in for the parts of the MS Graph API used by the handler.
+
+FakeDrive holds a single site, with one drive per document library, in memory,
+and answers requests the way Graph does. It covers everything SharepointTransfer
+calls:
+
+- site lookup by hostname and path, and the site's drives, by site ID or path, or
+  by drive ID alone
+- children listing, with $select, $top, $orderby and @odata.nextLink paging
+- item lookup by path or ID, folder creation, PATCH (move/rename) and DELETE
+- content PUT, and content GET (redirected to a pre-authenticated download URL)
+- createUploadSession, and the chunked PUTs to the upload URL
+- the copy action, with a monitor URL
+- $batch
+
+FakeDriveTransport puts a FakeDrive behind SharepointTransfer._request, so the
+handler can be run and profiled without a tenant, or a network.
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import UTC, datetime
+from typing import Any
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import requests
+
+from .quickxorhash import QuickXorHash
+from .recording import make_response, request_body
+
+SITE_ID = "fakedrive.sharepoint.com,00000000-0000-0000-0000-000000000001,1"
+DEFAULT_PAGE_SIZE = 200
+MAX_BATCH_SIZE = 20
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+_ITEM_PATTERN = re.compile(
+    r"^(?:root|items/(?P<item_id>[^/:]+))"
+    r"(?:(?::/(?P<path>.+?))(?::/(?P<path_action>children|content|createUploadSession|copy))?"
+    r"|/(?P<action>children|content|createUploadSession|copy))?$"
+)
+
+Response = tuple[int, dict[str, str], Any]
+
+
+def _error(status: int, code: str, message: str) -> Response:
+    return status, {}, {"error": {"code": code, "message": message}}
+
+
+class FakeDrive:
+    """In-memory Graph API, holding a single site."""
+
+    def __init__(
+        self,
+        libraries: tuple[str, ...] = ("Documents",),
+        page_size: int = DEFAULT_PAGE_SIZE,
+        base_url: str = "https://fakedrive.invalid",
+    ):
+        """Create the drive, with an empty root folder for each document library.
+
+        Args:
+            libraries: The document libraries in the site. The first is the default
+            drive.
+            page_size: The default number of children returned per page.
+            base_url: The URL the drive is served from. Download, upload and copy
+            monitor URLs are made from it.
+        """
+        self.page_size = page_size
+        self.base_url = base_url
+        # The properties children can be ordered by. Not every library allows it
+        self.orderable = ("name", "lastModifiedDateTime", "size")
+
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+        self.drives = {
+            f"drive-{index}": name for index, name in enumerate(libraries, start=1)
+        }
+        self.default_drive = next(iter(self.drives))
+        self.items: dict[str, dict] = {}
+        self.children: dict[str, dict[str, str]] = {}
+        self.upload_sessions: dict[str, dict] = {}
+        self.copies: dict[str, str] = {}
+        for drive_id in self.drives:
+            self.items[f"root-{drive_id}"] = {
+                "id": f"root-{drive_id}",
+                "name": "root",
+                "drive": drive_id,
+                "parent": None,
+                "content": None,
+                "modified": time.time(),
+                "version": 1,
+            }
+            self.children[f"root-{drive_id}"] = {}
+
+    @property
+    def graph_url(self) -> str:
+        """Return the URL that stands in for https://graph.microsoft.com/v1.0."""
+        return f"{self.base_url}/v1.0"
+
+    # Drive contents
+
+    def add_file(self, file_path: str, content: bytes, drive_id: str = "") -> dict:
+        """Add a file, creating any folders on the way to it.
+
+        Args:
+            file_path: The path of the file, below the root of the drive.
+            content: The content of the file.
+            drive_id: The drive, or the default drive.
+
+        Returns:
+            dict: The stored item.
+        """
+        with self._lock:
+            drive_id = drive_id or self.default_drive
+            *folders, name = [part for part in file_path.split("/") if part]
+            parent_id = self._make_folders(drive_id, f"root-{drive_id}", folders)
+            return self._put_file(parent_id, name, content)
+
+    def find(self, file_path: str, drive_id: str = "") -> dict | None:
+        """Return the item at a path, or None if there isn't one."""
+        drive_id = drive_id or self.default_drive
+        item_id = self._resolve(f"root-{drive_id}", file_path)
+        return self.items[item_id] if item_id else None
+
+    def _new_id(self) -> str:
+        return f"item-{next(self._ids):08d}"
+
+    def _resolve(self, item_id: str, item_path: str) -> str | None:
+        resolved: str | None = item_id
+        for name in (part for part in item_path.split("/") if part):
+            resolved = self.children.get(resolved or "", {}).get(name.lower())
+            if resolved is None:
+                break
+        return resolved
+
+    def _make_folders(self, drive_id: str, parent_id: str, folders: list[str]) -> str:
+        for folder in folders:
+            existing = self.children[parent_id].get(folder.lower())
+            parent_id = existing or self._add_item(drive_id, parent_id, folder, None)
+        return parent_id
+
+    def _add_item(
+        self, drive_id: str, parent_id: str, name: str, content: bytes | None
+    ) -> str:
+        item_id = self._new_id()
+        self.items[item_id] = {
+            "id": item_id,
+            "name": name,
+            "drive": drive_id,
+            "parent": parent_id,
+            "content": content,
+            "modified": time.time(),
+            "version": 1,
+            "hash": None if content is None else QuickXorHash(content).base64digest(),
+        }
+        if content is None:
+            self.children[item_id] = {}
+        self.children[parent_id][name.lower()] = item_id
+        self._touch(parent_id)
+        return item_id
+
+    def _touch(self, item_id: str | None) -> None:
+        # Like Sharepoint, a change to an item changes the eTag and cTag of every
+        # folder above it
+        while item_id is not None:
+            self.items[item_id]["version"] += 1
+            item_id = self.items[item_id]["parent"]
+
+    def _put_file(self, parent_id: str, name: str, content: bytes) -> dict:
+        existing = self.children[parent_id].get(name.lower())
+        if existing:
+            item = self.items[existing]
+            item.update(
+                content=content,
+                modified=time.time(),
+                hash=QuickXorHash(content).base64digest(),
+            )
+            self._touch(existing)
+            return item
+        drive_id = self.items[parent_id]["drive"]
+        return self.items[self._add_item(drive_id, parent_id, name, content)]
+
+    def _remove(self, item_id: str) -> None:
+        item = self.items[item_id]
+        del self.children[item["parent"]][item["name"].lower()]
+        self._drop(item_id)
+        self._touch(item["parent"])
+
+    def _drop(self, item_id: str) -> None:
+        del self.items[item_id]
+        for child_id in self.children.pop(item_id, {}).values():
+            self._drop(child_id)
+
+    def _item_path(self, item: dict) -> str:
+        names = []
+        while item["parent"] is not None:
+            names.append(item["name"])
+            item = self.items[item["parent"]]
+        return "/".join(reversed(names))
+
+    def _item_json(self, item: dict) -> dict:
+        body: dict[str, Any] = {
+            "id": item["id"],
+            "name": item["name"],
+            "eTag": f'"{{{item["id"]}}},{item["version"]}"',
+            "cTag": f'"c:{{{item["id"]}}},{item["version"]}"',
+            "lastModifiedDateTime": datetime.fromtimestamp(
+                item["modified"], tz=UTC
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "webUrl": f"https://fakedrive.sharepoint.com/{self._item_path(item)}",
+            "parentReference": {
+                "driveId": item["drive"],
+                "id": item["parent"],
+                "path": (
+                    f"/drive/root:/{self._item_path(self.items[item['parent']])}"
+                    if item["parent"]
+                    else None
+                ),
+            },
+        }
+        if item["content"] is None:
+            body["size"] = sum(
+                len(self.items[child]["content"] or b"")
+                for child in self.children[item["id"]].values()
+            )
+            body["folder"] = {"childCount": len(self.children[item["id"]])}
+        else:
+            body["size"] = len(item["content"])
+            body["file"] = {
+                "mimeType": "application/octet-stream",
+                "hashes": {"quickXorHash": item["hash"]},
+            }
+            body["@microsoft.graph.downloadUrl"] = (
+                f"{self.base_url}/download/{item['id']}?tempauth=fakedrive"
+            )
+        return body
+
+    # Request handling
+
+    def handle(
+        self, method: str, target: str, headers: dict[str, str], body: bytes
+    ) -> Response:
+        """Answer a request, as Graph would.
+
+        Args:
+            method: The HTTP method.
+            target: The path and query string of the request.
+            headers: The request headers.
+            body: The request body.
+
+        Returns:
+            tuple: The status, any headers, and a body (dict for JSON, or bytes).
+        """
+        split = urlsplit(target)
+        query = {key: values[0] for key, values in parse_qs(split.query).items()}
+        request_path = split.path
+
+        if request_path.startswith("/download/"):
+            return self._download(request_path.split("/")[-1])
+        if request_path.startswith("/upload/"):
+            return self._upload_chunk(request_path.split("/")[-1], headers, body)
+        if request_path.startswith("/monitor/"):
+            return self._copy_status(request_path.split("/")[-1])
+
+        if not request_path.startswith("/v1.0/"):
+            return _error(404, "notFound", f"No such endpoint {request_path}")
+        request_path = unquote(request_path[len("/v1.0/") :])
+
+        if request_path == "$batch" and method == "POST":
+            return self._batch(json.loads(body))
+
+        if match := re.match(r"^sites/([^/:]+):/sites/([^/]+)$", request_path):
+            return (
+                200,
+                {},
+                {
+                    "id": SITE_ID,
+                    "name": match.group(2),
+                    "webUrl": f"https://{match.group(1)}/sites/{match.group(2)}",
+                },
+            )
+
+        # Anything below a site addressed by its path, e.g. sites/host:/sites/x:/drive
+        if match := re.match(r"^sites/[^/:]+:/sites/[^/:]+:/(.*)$", request_path):
+            request_path = f"sites/{SITE_ID}/{match.group(1)}"
+        # Drives addressed on their own, e.g. drives/<drive>/items/<item>
+        elif request_path.startswith("drives/"):
+            request_path = f"sites/{SITE_ID}/{request_path}"
+
+        match = re.match(
+            r"^sites/([^/]+)/(drives?)(?:/([^/]+))?(?:/(.*))?$", request_path
+        )
+        if not match or match.group(1) != SITE_ID:
+            return _error(404, "itemNotFound", f"No such site path {request_path}")
+
+        kind, drive_id, rest = match.group(2), match.group(3), match.group(4)
+        if kind == "drives" and drive_id is None:
+            return (
+                200,
+                {},
+                {
+                    "value": [
+                        {"id": drive_id, "name": name, "driveType": "documentLibrary"}
+                        for drive_id, name in self.drives.items()
+                    ]
+                },
+            )
+        if kind == "drive":
+            # drive/<rest>, the first path component was captured as the drive
+            rest = f"{drive_id}/{rest}" if rest else drive_id
+            drive_id = self.default_drive
+        if drive_id not in self.drives:
+            return _error(404, "itemNotFound", f"No such drive {drive_id}")
+
+        return self._item_request(method, drive_id, rest or "", query, body)
+
+    def _item_request(
+        self,
+        method: str,
+        drive_id: str,
+        rest: str,
+        query: dict[str, str],
+        body: bytes,
+    ) -> Response:
+        match = _ITEM_PATTERN.match(rest)
+        if not match:
+            return _error(400, "invalidRequest", f"Unsupported item path {rest}")
+
+        base_id = match.group("item_id") or f"root-{drive_id}"
+        item_path = match.group("path")
+        action = match.group("path_action") or match.group("action")
+
+        with self._lock:
+            if base_id not in self.items:
+                return _error(404, "itemNotFound", f"Item not found: {base_id}")
+            item_id = self._resolve(base_id, item_path) if item_path else base_id
+
+            if action == "content" and method == "PUT":
+                if item_id is None:
+                    *folders, name = item_path.split("/")  # type: ignore[union-attr]
+                    parent_id = self._make_folders(drive_id, base_id, folders)
+                    item = self._put_file(parent_id, name, body)
+                    return 201, {}, self._item_json(item)
+                if self.items[item_id]["content"] is None:
+                    return _error(409, "nameAlreadyExists", "A folder exists there")
+                item = self._put_file(
+                    self.items[item_id]["parent"], self.items[item_id]["name"], body
+                )
+                return 200, {}, self._item_json(item)
+
+            if action == "createUploadSession" and method == "POST":
+                if item_path:
+                    *folders, name = item_path.split("/")
+                    parent_id = self._make_folders(drive_id, base_id, folders)
+                else:
+                    parent_id, name = (
+                        self.items[base_id]["parent"],
+                        self.items[base_id]["name"],
+                    )
+                token = self._new_id()
+                self.upload_sessions[token] = {
+                    "parent": parent_id,
+                    "name": name,
+                    "data": bytearray(),
+                }
+                return (
+                    200,
+                    {},
+                    {
+                        "uploadUrl": f"{self.base_url}/upload/{token}",
+                        "expirationDateTime": "2099-01-01T00:00:00Z",
+                        "nextExpectedRanges": ["0-"],
+                    },
+                )
+
+            if item_id is None:
+                return _error(404, "itemNotFound", f"Item not found: {item_path}")
+            item = self.items[item_id]
+            payload = json.loads(body) if body and method in ("POST", "PATCH") else {}
+
+            if action == "children":
+                if method == "POST":
+                    return self._create_child(drive_id, item_id, payload)
+                return self._list_children(item_id, query, rest, drive_id)
+
+            if action == "content":
+                if item["content"] is None:
+                    return _error(400, "invalidRequest", "Folders have no content")
+                return (
+                    302,
+                    {
+                        "Location": f"{self.base_url}/download/{item_id}?tempauth=fakedrive"
+                    },
+                    b"",
+                )
+
+            if action == "copy" and method == "POST":
+                return self._copy(item_id, payload, query)
+
+            if method == "GET":
+                return 200, {}, self._select(self._item_json(item), query)
+            if method == "DELETE":
+                self._remove(item_id)
+                return 204, {}, b""
+            if method == "PATCH":
+                return self._patch(item_id, payload)
+
+        return _error(405, "invalidRequest", f"{method} not supported on {rest}")
+
+    @staticmethod
+    def _select(body: dict, query: dict[str, str]) -> dict:
+        if "$select" not in query:
+            return body
+        fields = set(query["$select"].split(","))
+        return {key: value for key, value in body.items() if key in fields}
+
+    def _list_children(
+        self, item_id: str, query: dict[str, str], rest: str, drive_id: str
+    ) -> Response:
+        if self.items[item_id]["content"] is not None:
+            return _error(400, "invalidRequest", "Files have no children")
+
+        child_ids = sorted(self.children[item_id].values())
+        if "$orderby" in query:
+            field, _, direction = query["$orderby"].partition(" ")
+            if field not in self.orderable:
+                return _error(400, "invalidRequest", f"Can't order by {field}")
+            child_ids.sort(
+                key=lambda child_id: self._item_json(self.items[child_id])[field],
+                reverse=direction == "desc",
+            )
+        top = int(query.get("$top", self.page_size))
+        start = int(query.get("$skiptoken", 0))
+        body: dict[str, Any] = {
+            "value": [
+                self._select(self._item_json(self.items[child_id]), query)
+                for child_id in child_ids[start : start + top]
+            ]
+        }
+        if start + top < len(child_ids):
+            next_query = {**query, "$skiptoken": str(start + top)}
+            query_string = "&".join(
+                f"{key}={quote(value, safe=',')}" for key, value in next_query.items()
+            )
+            drive_part = (
+                f"drives/{drive_id}" if drive_id != self.default_drive else "drive"
+            )
+            body["@odata.nextLink"] = (
+                f"{self.graph_url}/sites/{SITE_ID}/{drive_part}/{quote(rest, safe='/:')}"
+                f"?{query_string}"
+            )
+        return 200, {}, body
+
+    def _create_child(self, drive_id: str, parent_id: str, payload: dict) -> Response:
+        name = payload.get("name")
+        if not name:
+            return _error(400, "invalidRequest", "A name is required")
+        if name.lower() in self.children[parent_id]:
+            return _error(409, "nameAlreadyExists", f"{name} already exists")
+        content = None if "folder" in payload else b""
+        item_id = self._add_item(drive_id, parent_id, name, content)
+        return 201, {}, self._item_json(self.items[item_id])
+
+    def _patch(self, item_id: str, payload: dict) -> Response:
+        item = self.items[item_id]
+        parent_id = payload.get("parentReference", {}).get("id") or item["parent"]
+        name = payload.get("name") or item["name"]
+        if parent_id not in self.children:
+            return _error(404, "itemNotFound", f"Folder not found: {parent_id}")
+        existing = self.children[parent_id].get(name.lower())
+        if existing and existing != item_id:
+            return _error(409, "nameAlreadyExists", f"{name} already exists")
+
+        del self.children[item["parent"]][item["name"].lower()]
+        self._touch(item["parent"])
+        item.update(parent=parent_id, name=name, modified=time.time())
+        self.children[parent_id][name.lower()] = item_id
+        self._touch(item_id)
+        return 200, {}, self._item_json(item)
+
+    def _copy(self, item_id: str, payload: dict, query: dict[str, str]) -> Response:
+        parent_reference = payload.get("parentReference", {})
+        parent_id = parent_reference.get("id") or self.items[item_id]["parent"]
+        if parent_id not in self.children:
+            return _error(404, "itemNotFound", f"Folder not found: {parent_id}")
+        name = payload.get("name") or self.items[item_id]["name"]
+        existing = self.children[parent_id].get(name.lower())
+        if existing:
+            if query.get("@microsoft.graph.conflictBehavior") != "replace":
+                return _error(409, "nameAlreadyExists", f"{name} already exists")
+            self._remove(existing)
+        copy = self._put_file(parent_id, name, self.items[item_id]["content"] or b"")
+        token = self._new_id()
+        self.copies[token] = copy["id"]
+        return 202, {"Location": f"{self.base_url}/monitor/{token}"}, b""
+
+    def _copy_status(self, token: str) -> Response:
+        with self._lock:
+            item_id = self.copies.get(token)
+        if item_id is None:
+            return _error(404, "itemNotFound", "No such copy")
+        return (
+            303,
+            {"Location": f"{self.graph_url}/sites/{SITE_ID}/drive/items/{item_id}"},
+            b"",
+        )
+
+    def _download(self, item_id: str) -> Response:
+        with self._lock:
+            item = self.items.get(item_id)
+        if item is None or item["content"] is None:
+            return _error(404, "itemNotFound", "No such file")
+        return 200, {"Content-Type": "application/octet-stream"}, item["content"]
+
+    def _upload_chunk(
+        self, token: str, headers: dict[str, str], body: bytes
+    ) -> Response:
+        with self._lock:
+            session = self.upload_sessions.get(token)
+            if session is None:
+                return _error(404, "itemNotFound", "No such upload session")
+            match = re.match(
+                r"bytes (\d+)-(\d+)/(\d+|\*)", headers.get("content-range", "")
+            )
+            if not match or int(match.group(1)) != len(session["data"]):
+                return _error(416, "invalidRange", "Unexpected Content-Range")
+
+            session["data"] += body
+            end, total = int(match.group(2)), match.group(3)
+            if total == "*" or end + 1 < int(total):
+                return 202, {}, {"nextExpectedRanges": [f"{end + 1}-"]}
+
+            del self.upload_sessions[token]
+            existed = session["name"].lower() in self.children[session["parent"]]
+            item = self._put_file(
+                session["parent"], session["name"], bytes(session["data"])
+            )
+            return (200 if existed else 201), {}, self._item_json(item)
+
+    def _batch(self, payload: dict) -> Response:
+        batch_requests = payload.get("requests", [])
+        if len(batch_requests) > MAX_BATCH_SIZE:
+            return _error(400, "invalidRequest", f"At most {MAX_BATCH_SIZE} requests")
+
+        responses = []
+        for request in batch_requests:
+            body = request.get("body")
+            status, headers, response_body = self.handle(
+                request["method"],
+                (
+                    f"/v1.0{request['url']}"
+                    if request["url"].startswith("/")
+                    else f"/v1.0/{request['url']}"
+                ),
+                {
+                    key.lower(): value
+                    for key, value in request.get("headers", {}).items()
+                },
+                json.dumps(body).encode() if body is not None else b"",
+            )
+            responses.append(
+                {
+                    "id": request["id"],
+                    "status": status,
+                    "headers": headers,
+                    "body": (
+                        response_body if not isinstance(response_body, bytes) else None
+                    ),
+                }
+            )
+        return 200, {}, {"responses": responses}
+
+
+class FakeDriveTransport:
+    """Answers the handler's requests from a FakeDrive, without any network.
+
+    Requests can be sent to the real Graph URLs, or to the URLs the drive hands
+    out, as only the path and query of each URL are used.
+    """
+
+    def __init__(self, drive: FakeDrive | None = None):
+        """Create the transport.
+
+        Args:
+            drive (FakeDrive, optional): The drive to answer requests from. Defaults
+            to a new, empty, drive.
+        """
+        self.drive = drive if drive is not None else FakeDrive()
+        self.counts: Counter[str] = Counter()
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request to the drive, taking the same arguments as requests.request.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            **kwargs: The params, headers, data, json and allow_redirects arguments
+            supported by requests. Anything else, e.g. timeout, is ignored.
+
+        Returns:
+            requests.Response: The response, with the whole body already read.
+        """
+        # Prepare the URL as requests would, so it is quoted as it is on the wire
+        prepared = requests.PreparedRequest()
+        prepared.prepare_url(url, kwargs.get("params"))
+        url = str(prepared.url)
+        headers = {
+            key.lower(): value for key, value in (kwargs.get("headers") or {}).items()
+        }
+        body = request_body(kwargs.get("data"), kwargs.get("json"))
+
+        while True:
+            split = urlsplit(url)
+            target = f"{split.path}?{split.query}" if split.query else split.path
+            self.counts["requests"] += 1
+            self.counts[method] += 1
+            status, response_headers, response_body = self.drive.handle(
+                method, target, headers, body
+            )
+            if not isinstance(response_body, bytes):
+                response_body = json.dumps(response_body).encode()
+                response_headers = {
+                    **response_headers,
+                    "Content-Type": "application/json",
+                }
+            response_headers.setdefault("Content-Length", str(len(response_body)))
+            if (
+                status not in REDIRECT_STATUSES
+                or not kwargs.get("allow_redirects", True)
+                or "Location" not in response_headers
+            ):
+                return make_response(status, response_headers, response_body, url)
+            # Follow the redirect as requests does, which drops the Authorization
+            # header when changing host, and switches to GET for 302 and 303
+            url = response_headers["Location"]
+            headers.pop("authorization", None)
+            if status in (301, 302, 303):
+                method, body = "GET", b""
+
+    def close(self) -> None:
+        """Nothing to close."""
@@ -0,0 +1,120 @@
+"""Uploads shared between the Sharepoint destinations of a transfer.
+
+OTF creates a handler for each destination of a transfer, and each one uploads
+the staged files from the worker. With fanOut set on the destinations, the
+handlers of the same task share a FanOut, which records every file uploaded by
+any of them. A later destination then copies each file server side from where it
+was first uploaded, rather than sending the same bytes from the worker again. A
+file is only copied if it hasn't changed on the worker since it was uploaded, and
+only between destinations in the same tenant.
+
+FanOuts are reference counted, like shared clients. Each handler acquires its
+task's FanOut when it is created, and releases it in tidy.
+"""
+
+import threading
+from os import path
+from typing import Any
+
+
+class Upload:
+    """A file uploaded by one of the destinations."""
+
+    def __init__(self, handler: Any, remote_path: str, local_file: str):
+        """Record an upload.
+
+        Args:
+            handler (SharepointTransfer): The handler that uploaded the file.
+            remote_path (str): Where it was uploaded to, below the site root.
+            local_file (str): The file on the worker.
+        """
+        self.handler = handler
+        self.remote_path = remote_path
+        self.size = path.getsize(local_file)
+        self.modified = path.getmtime(local_file)
+
+
+class FanOut:
+    """The uploads made by the destinations of a single task, and their results."""
+
+    def __init__(self, task_id: str):
+        """Create an empty FanOut.
+
+        Args:
+            task_id (str): The ID of the task.
+        """
+        self.task_id = task_id
+        self.references = 0
+        self.uploads: dict[str, Upload] = {}
+        # Uploaded, copied and failed counts for each destination
+        self.results: dict[str, dict[str, int]] = {}
+        self.lock = threading.Lock()
+
+    def record_upload(self, local_file: str, handler: Any, remote_path: str) -> None:
+        """Record that a file was uploaded, so other destinations can copy it.
+
+        Args:
+            local_file (str): The file on the worker.
+            handler (SharepointTransfer): The handler that uploaded it.
+            remote_path (str): Where it was uploaded to, below the site root.
+        """
+        upload = Upload(handler, remote_path, local_file)
+        with self.lock:
+            self.uploads.setdefault(path.abspath(local_file), upload)
+
+    def find_upload(self, local_file: str, tenant_id: str) -> Upload | None:
+        """Return an earlier upload of a file that a destination can copy.
+
+        Args:
+            local_file (str): The file on the worker.
+            tenant_id (str): The tenant of the destination. Files can't be copied
+            between tenants.
+
+        Returns:
+            Upload: The earlier upload, or None if there isn't one, or the file has
+            changed since.
+        """
+        with self.lock:
+            upload = self.uploads.get(path.abspath(local_file))
+        if (
+            upload is None
+            or upload.handler.spec["protocol"]["tenantId"] != tenant_id
+            or upload.size != path.getsize(local_file)
+            or upload.modified != path.getmtime(local_file)
+        ):
+            return None
+        return upload
+
+
+_fan_outs: dict[str, FanOut] = {}
+_lock = threading.Lock()
+
+
+def acquire_fan_out(task_id: str) -> FanOut:
+    """Return the FanOut for a task, creating it if there isn't one.
+
+    Args:
+        task_id (str): The ID of the task.
+
+    Returns:
+        FanOut: The FanOut, which must be passed to release_fan_out when the
+        handler is finished with it.
+    """
+    with _lock:
+        fan_out = _fan_outs.get(task_id)
+        if fan_out is None:
+            fan_out = _fan_outs[task_id] = FanOut(task_id)
+        fan_out.references += 1
+        return fan_out
+
+
+def release_fan_out(fan_out: FanOut) -> None:
+    """Release a FanOut acquired with acquire_fan_out.
+
+    Args:
+        fan_out (FanOut): The FanOut. It is forgotten once no handler is using it.
+    """
+    with _lock:
+        fan_out.references -= 1
+        if fan_out.references <= 0 and _fan_outs.get(fan_out.task_id) is fan_out:
+            del _fan_outs[fan_out.task_id]
@@ -0,0 +1,209 @@
+"""Local index of Sharepoint item IDs, kept between runs in a SQLite database.
+
+Recurring jobs look up the same document libraries and folders on every run. With
+the itemIndex protocol option, the handler records the drive ID of each document
+library, and the item ID, eTag, size and modified time of each folder and file it
+comes across, by site and path. Later runs, and other handlers, then find them in
+the index rather than asking Graph again.
+
+Entries are replaced whenever Graph returns a different eTag for a path. When a
+listing, move or copy that used indexed IDs fails with a 404, the handler drops
+the site's drive IDs and everything indexed below the first component of the
+path, and retries once with IDs it looks up again. A stale entry costs one
+failed request.
+"""
+
+import sqlite3
+import threading
+from collections.abc import Iterable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drives (
+    site TEXT NOT NULL,
+    name TEXT NOT NULL,
+    drive_id TEXT NOT NULL,
+    PRIMARY KEY (site, name)
+);
+CREATE TABLE IF NOT EXISTS items (
+    site TEXT NOT NULL,
+    path TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    etag TEXT,
+    size INTEGER,
+    modified REAL,
+    PRIMARY KEY (site, path)
+);
+"""
+
+
+def index_path(item_path: str) -> str:
+    """Return the key for a path below the site root.
+
+    Sharepoint paths aren't case sensitive, and repeated or trailing slashes don't
+    change which item they refer to. A leading / is kept, as it means the first
+    component is a document library.
+
+    Args:
+        item_path (str): The path, as used by the handler.
+
+    Returns:
+        str: The key.
+    """
+    parts = [part for part in item_path.lower().split("/") if part]
+    return ("/" if item_path.startswith("/") else "") + "/".join(parts)
+
+
+class ItemIndex:
+    """Drive and item IDs by site and path, stored in a SQLite database."""
+
+    def __init__(self, file_name: str):
+        """Open the index, creating it if it doesn't exist.
+
+        Args:
+            file_name (str): The database file. It can be shared by several
+            processes.
+        """
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            file_name, timeout=30, check_same_thread=False
+        )
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    def get_drive_ids(self, site: str) -> dict[str, str] | None:
+        """Return the drive ID of each document library in a site.
+
+        Args:
+            site (str): The site ID.
+
+        Returns:
+            dict: The drive IDs by library name, or None if they aren't indexed.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, drive_id FROM drives WHERE site = ?", (site,)
+            ).fetchall()
+        return dict(rows) if rows else None
+
+    def put_drive_ids(self, site: str, drive_ids: dict[str, str]) -> None:
+        """Replace the indexed drive IDs of a site.
+
+        Args:
+            site (str): The site ID.
+            drive_ids (dict): The drive IDs by library name.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM drives WHERE site = ?", (site,))
+            self._connection.executemany(
+                "INSERT INTO drives (site, name, drive_id) VALUES (?, ?, ?)",
+                [(site, name, drive_id) for name, drive_id in drive_ids.items()],
+            )
+
+    def get(self, site: str, item_path: str) -> dict | None:
+        """Return the indexed item at a path.
+
+        Args:
+            site (str): The site ID.
+            item_path (str): The path below the site root.
+
+        Returns:
+            dict: The item_id, etag, size and modified time, or None if the path
+            isn't indexed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT item_id, etag, size, modified FROM items"
+                " WHERE site = ? AND path = ?",
+                (site, index_path(item_path)),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"item_id": row[0], "etag": row[1], "size": row[2], "modified": row[3]}
+
+    def put(  # pylint: disable=too-many-positional-arguments
+        self,
+        site: str,
+        item_path: str,
+        item_id: str,
+        etag: str | None = None,
+        size: int | None = None,
+        modified: float | None = None,
+    ) -> None:
+        """Index an item, replacing anything already indexed at its path.
+
+        Args:
+            site (str): The site ID.
+            item_path (str): The path below the site root.
+            item_id (str): The ID of the item.
+            etag (str, optional): Its eTag.
+            size (int, optional): Its size.
+            modified (float, optional): Its modified time, as an epoch.
+        """
+        self.put_many(site, [(item_path, item_id, etag, size, modified)])
+
+    def put_many(
+        self,
+        site: str,
+        items: Iterable[tuple[str, str, str | None, int | None, float | None]],
+    ) -> None:
+        """Index several items at once, as put does.
+
+        Args:
+            site (str): The site ID.
+            items (Iterable): The path, item ID, eTag, size and modified time of
+            each item.
+        """
+        rows = [
+            (site, index_path(item_path), item_id, etag, size, modified)
+            for item_path, item_id, etag, size, modified in items
+        ]
+        with self._lock, self._connection:
+            # An item with a different ID at the same path replaces everything
+            # that was below the old one
+            for row in rows:
+                self._connection.execute(
+                    "DELETE FROM items WHERE site = ? AND path LIKE ? ESCAPE '\\'"
+                    " AND ? != (SELECT item_id FROM items WHERE site = ? AND path = ?)",
+                    (row[0], f"{_escape_like(row[1])}/%", row[2], row[0], row[1]),
+                )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO items"
+                " (site, path, item_id, etag, size, modified)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def invalidate(self, site: str, item_path: str) -> None:
+        """Remove an item, and anything below it, from the index.
+
+        Args:
+            site (str): The site ID.
+            item_path (str): The path below the site root.
+        """
+        key = index_path(item_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM items WHERE site = ?"
+                " AND (path = ? OR path LIKE ? ESCAPE '\\')",
+                (site, key, f"{_escape_like(key)}/%"),
+            )
+
+    def invalidate_drives(self, site: str) -> None:
+        """Remove the drive IDs of a site from the index.
+
+        Args:
+            site (str): The site ID.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM drives WHERE site = ?", (site,))
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,397 @@
+"""Per-request metrics for the Graph API requests made by the Sharepoint handler.
+
+Requests are grouped by method and endpoint (e.g. "GET children" or "PUT
+upload_chunk"), and for each group the latency histogram, status codes, retries,
+errors, and bytes sent and received are counted. The totals can be written out
+by any of the sinks here: a summary in the task log, a JSON file, or a file in the
+Prometheus text format (e.g. for the node exporter's textfile collector).
+"""
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from logging import Logger
+from typing import Any
+from urllib.parse import urlsplit
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# Graph endpoints, matched against the path after the site or drive
+_GRAPH_ENDPOINTS = (
+    ("batch", re.compile(r"/\$batch$")),
+    ("site", re.compile(r"/sites/[^/]+:/sites/[^/]+$")),
+    ("drives", re.compile(r"/sites/[^/]+/drives$")),
+    ("upload_session", re.compile(r"[:/]createUploadSession$")),
+    ("children", re.compile(r"[:/]children$")),
+    ("content", re.compile(r"[:/]content$")),
+    ("copy", re.compile(r"/copy$")),
+)
+# Other hosts are the pre-authenticated URLs that Graph hands out
+_OTHER_ENDPOINTS = (
+    ("upload_chunk", re.compile(r"uploadSession|/upload/", re.IGNORECASE)),
+    ("copy_monitor", re.compile(r"monitor", re.IGNORECASE)),
+    ("download", re.compile(r"download", re.IGNORECASE)),
+)
+
+
+def endpoint_class(url: str) -> str:
+    """Return the kind of endpoint a URL is for, e.g. children or upload_chunk.
+
+    Args:
+        url (str): The URL of the request.
+
+    Returns:
+        str: The endpoint class, "item" for any other Graph request, and "other"
+        for any other URL.
+    """
+    split = urlsplit(url)
+    if split.path.startswith("/v1.0/"):
+        for name, pattern in _GRAPH_ENDPOINTS:
+            if pattern.search(split.path):
+                return name
+        return "item"
+    for name, pattern in _OTHER_ENDPOINTS:
+        if pattern.search(split.path):
+            return name
+    return "other"
+
+
+def body_size(data: Any = None, json_body: Any = None) -> int:
+    """Return the size of a request body, from the data or json arguments.
+
+    Args:
+        data: The data argument, if any. Iterables of unknown length count as 0.
+        json_body: The json argument, if there is no data.
+
+    Returns:
+        int: The size of the body in bytes.
+    """
+    if data is None:
+        return 0 if json_body is None else len(json.dumps(json_body).encode())
+    if isinstance(data, str):
+        return len(data.encode())
+    if hasattr(data, "__len__"):
+        return len(data)
+    return 0
+
+
+def response_size(response: Any, stream: bool) -> int:
+    """Return the size of a response body, without reading a streamed one.
+
+    Args:
+        response: A requests or httpx response.
+        stream (bool): Whether the body is being streamed. If so, the size comes
+        from the Content-Length header.
+
+    Returns:
+        int: The size of the body in bytes.
+    """
+    if stream:
+        return int(response.headers.get("Content-Length", 0))
+    return len(response.content)
+
+
+class _Endpoint:
+    """Totals for one method and endpoint."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.statuses: Counter[int] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.count,
+            "seconds": {
+                "sum": round(self.seconds, 6),
+                "max": round(self.max_seconds, 6),
+                "buckets": {
+                    _bucket_label(bound): count
+                    for bound, count in zip(LATENCY_BUCKETS, self.buckets, strict=True)
+                },
+            },
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+def _bucket_label(bound: float) -> str:
+    return "+Inf" if bound == math.inf else f"{bound:g}"
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Thread safe totals of the requests made by a handler."""
+
+    def __init__(self, task_id: str = ""):
+        """Start counting.
+
+        Args:
+            task_id (str): The task the requests are for, used to label the metrics.
+        """
+        self.task_id = task_id
+        self._lock = threading.Lock()
+        self._endpoints: dict[tuple[str, str], _Endpoint] = {}
+
+    def _endpoint(self, method: str, url: str) -> _Endpoint:
+        key = (method.upper(), endpoint_class(url))
+        if key not in self._endpoints:
+            self._endpoints[key] = _Endpoint()
+        return self._endpoints[key]
+
+    def record(  # pylint: disable=too-many-positional-arguments
+        self,
+        method: str,
+        url: str,
+        status: int,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+    ) -> None:
+        """Record a request that got a response.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL of the request.
+            status (int): The status code of the response.
+            seconds (float): How long the response took.
+            bytes_sent (int): The size of the request body.
+            bytes_received (int): The size of the response body.
+        """
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.observe(seconds)
+            endpoint.statuses[status] += 1
+            endpoint.bytes_sent += bytes_sent
+            endpoint.bytes_received += bytes_received
+
+    def record_error(
+        self, method: str, url: str, error: BaseException | str, seconds: float
+    ) -> None:
+        """Record a request that failed without a response, e.g. a timeout.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL of the request.
+            error (BaseException | str): The exception, or its name.
+            seconds (float): How long the request took to fail.
+        """
+        name = error if isinstance(error, str) else type(error).__name__
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.observe(seconds)
+            endpoint.errors[name] += 1
+
+    def record_retry(self, method: str, url: str) -> None:
+        """Record that a request is about to be retried.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL of the request.
+        """
+        with self._lock:
+            self._endpoint(method, url).retries += 1
+
+    def as_dict(self) -> dict:
+        """Return the totals for each endpoint, keyed by "<method> <endpoint>"."""
+        with self._lock:
+            return {
+                "task_id": self.task_id,
+                "endpoints": {
+                    f"{method} {endpoint}": totals.as_dict()
+                    for (method, endpoint), totals in sorted(self._endpoints.items())
+                },
+            }
+
+    def to_prometheus(self, prefix: str = "sharepoint") -> str:
+        """Return the totals in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): The prefix for the metric names.
+
+        Returns:
+            str: The metrics.
+        """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str) -> str:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            return f"{prefix}_{name}"
+
+        def labels(method: str, endpoint: str, **extra: Any) -> str:
+            values = {"task_id": self.task_id, "method": method, "endpoint": endpoint}
+            values.update(extra)
+            return ",".join(
+                f'{key}="{_escape_label(value)}"' for key, value in values.items()
+            )
+
+        name = metric(
+            "request_duration_seconds", "histogram", "Graph API request latency."
+        )
+        for (method, endpoint), totals in endpoints:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, totals.buckets, strict=True):
+                cumulative += count
+                le = _bucket_label(bound)
+                lines.append(
+                    f"{name}_bucket{{{labels(method, endpoint, le=le)}}} {cumulative}"
+                )
+            lines.append(f"{name}_sum{{{labels(method, endpoint)}}} {totals.seconds}")
+            lines.append(f"{name}_count{{{labels(method, endpoint)}}} {totals.count}")
+
+        name = metric(
+            "responses_total", "counter", "Graph API responses, by status code."
+        )
+        for (method, endpoint), totals in endpoints:
+            for status, count in sorted(totals.statuses.items()):
+                lines.append(
+                    f"{name}{{{labels(method, endpoint, status=status)}}} {count}"
+                )
+
+        name = metric(
+            "request_errors_total", "counter", "Graph API requests without a response."
+        )
+        for (method, endpoint), totals in endpoints:
+            for error, count in sorted(totals.errors.items()):
+                lines.append(
+                    f"{name}{{{labels(method, endpoint, error=error)}}} {count}"
+                )
+
+        for attribute, help_text in (
+            ("retries", "Graph API requests that were retried."),
+            ("bytes_sent", "Bytes sent in Graph API request bodies."),
+            ("bytes_received", "Bytes received in Graph API response bodies."),
+        ):
+            name = metric(f"request_{attribute}_total", "counter", help_text)
+            for (method, endpoint), totals in endpoints:
+                lines.append(
+                    f"{name}{{{labels(method, endpoint)}}}"
+                    f" {getattr(totals, attribute)}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+
+class LogSink:
+    """Writes a summary line for each endpoint to the task log."""
+
+    def __init__(self, logger: Logger):
+        """Create the sink.
+
+        Args:
+            logger (Logger): The logger to write to.
+        """
+        self.logger = logger
+
+    def write(self, metrics: RequestMetrics) -> None:
+        """Log the totals for each endpoint."""
+        for key, totals in metrics.as_dict()["endpoints"].items():
+            mean = totals["seconds"]["sum"] / totals["requests"] * 1000
+            self.logger.info(
+                f"Requests {key}: {totals['requests']}, mean {mean:.1f}ms, max"
+                f" {totals['seconds']['max'] * 1000:.1f}ms, statuses"
+                f" {totals['statuses']}, errors {totals['errors']}, retries"
+                f" {totals['retries']}, sent {totals['bytes_sent']} bytes, received"
+                f" {totals['bytes_received']} bytes"
+            )
+
+
+def _write_atomically(file_name: str, content: str) -> None:
+    # Readers never see a half written file. Each write has a temporary file of its
+    # own, so handlers writing the same sink from different threads don't clash
+    fd, temp_file_name = tempfile.mkstemp(
+        dir=os.path.dirname(file_name) or None, suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        # mkstemp makes the file readable only by the current user, but the
+        # metrics are read by other processes, e.g. a Prometheus exporter
+        os.chmod(temp_file_name, 0o644)
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        os.unlink(temp_file_name)
+        raise
+
+
+class JsonFileSink:
+    """Writes the totals to a JSON file."""
+
+    def __init__(self, file_name: str):
+        """Create the sink.
+
+        Args:
+            file_name (str): The file to write. It is replaced each time.
+        """
+        self.file_name = file_name
+
+    def write(self, metrics: RequestMetrics) -> None:
+        """Write the totals."""
+        _write_atomically(self.file_name, json.dumps(metrics.as_dict(), indent=2))
+
+
+class PrometheusFileSink:
+    """Writes the totals to a file in the Prometheus text exposition format."""
+
+    def __init__(self, file_name: str):
+        """Create the sink.
+
+        Args:
+            file_name (str): The file to write. It is replaced each time.
+        """
+        self.file_name = file_name
+
+    def write(self, metrics: RequestMetrics) -> None:
+        """Write the totals."""
+        _write_atomically(self.file_name, metrics.to_prometheus())
+
+
+def create_sinks(options: dict, logger: Logger) -> list:
+    """Create the sinks asked for by the metrics protocol option.
+
+    Args:
+        options (dict): The metrics option, with any of log (bool), json (file
+        name) and prometheus (file name).
+        logger (Logger): The logger for the log sink.
+
+    Returns:
+        list: The sinks.
+    """
+    sinks: list = []
+    if options.get("log", True):
+        sinks.append(LogSink(logger))
+    if "json" in options:
+        sinks.append(JsonFileSink(options["json"]))
+    if "prometheus" in options:
+        sinks.append(PrometheusFileSink(options["prometheus"]))
+    return sinks
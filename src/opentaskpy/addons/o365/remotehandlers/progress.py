@@ -0,0 +1,249 @@
+"""Live progress of the files being uploaded and downloaded by the Sharepoint handler.
+
+Each file being transferred is tracked while it is in flight. Every interval, a
+background thread sends an event for each one to the registered callbacks, with the
+bytes done so far, the total, the throughput since the last event and on average,
+and an estimate of the time remaining. A file that hasn't moved any data since the
+last event is reported as stalled, so a slow or stuck transfer shows up long before
+it times out. A final event is sent when each file finishes.
+
+Events are plain dicts, so callbacks can log them, forward them to a monitoring
+system, or drive a progress bar.
+"""
+
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from logging import Logger
+from time import monotonic
+
+DEFAULT_INTERVAL = 5.0
+
+ProgressCallback = Callable[[dict], None]
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class FileProgress:
+    """The progress of a single file, updated by the thread transferring it."""
+
+    def __init__(self, direction: str, name: str, total: int | None = None):
+        """Start tracking a file.
+
+        Args:
+            direction (str): How the file is being transferred, upload or download.
+            name (str): The name of the file.
+            total (int, optional): The size of the file, if it is known.
+        """
+        self.direction = direction
+        self.name = name
+        self.total = total
+        self.bytes_done = 0
+        self.started = monotonic()
+        self._lock = threading.Lock()
+        self._last_bytes = 0
+        self._last_time = self.started
+
+    def update(self, size: int) -> None:
+        """Record that more of the file has been transferred.
+
+        Args:
+            size (int): The number of bytes just transferred.
+        """
+        with self._lock:
+            self.bytes_done += size
+
+    def restart(self) -> None:
+        """Start counting from zero again, e.g. when a request is retried."""
+        with self._lock:
+            self.bytes_done = 0
+            self._last_bytes = 0
+
+    def event(self, finished: bool = False) -> dict:
+        """Return the progress since the last event, and overall.
+
+        Args:
+            finished (bool): Whether the file has finished transferring.
+
+        Returns:
+            dict: The direction and name of the file, bytes_done, total_bytes,
+            percent, bytes_per_second since the last event,
+            average_bytes_per_second, eta_seconds, elapsed_seconds, stalled and
+            finished. percent and eta_seconds are None if the total isn't known.
+        """
+        now = monotonic()
+        with self._lock:
+            bytes_done = self.bytes_done
+            since_last = now - self._last_time
+            moved = bytes_done - self._last_bytes
+            self._last_bytes = bytes_done
+            self._last_time = now
+
+        elapsed = now - self.started
+        average = bytes_done / elapsed if elapsed > 0 else 0.0
+        percent = None
+        eta = None
+        if self.total:
+            percent = round(min(bytes_done / self.total, 1.0) * 100, 1)
+            if average > 0:
+                eta = round(max(self.total - bytes_done, 0) / average, 1)
+        elif self.total == 0:
+            percent = 100.0
+
+        return {
+            "direction": self.direction,
+            "name": self.name,
+            "bytes_done": bytes_done,
+            "total_bytes": self.total,
+            "percent": percent,
+            "bytes_per_second": round(moved / since_last, 1) if since_last > 0 else 0.0,
+            "average_bytes_per_second": round(average, 1),
+            "eta_seconds": 0.0 if finished else eta,
+            "elapsed_seconds": round(elapsed, 3),
+            "stalled": not finished and moved == 0,
+            "finished": finished,
+        }
+
+
+class ProgressReporter:
+    """Sends progress events for every file in flight to a set of callbacks.
+
+    The reporting thread only runs while there are files being tracked.
+    """
+
+    def __init__(
+        self, interval: float = DEFAULT_INTERVAL, logger: Logger | None = None
+    ):
+        """Create the reporter.
+
+        Args:
+            interval (float): Seconds between events for each file.
+            logger (Logger, optional): Where to log callbacks that raise.
+        """
+        self.interval = interval
+        self.logger = logger
+        self.callbacks: list[ProgressCallback] = []
+        self._lock = threading.Lock()
+        self._active: list[FileProgress] = []
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def add_callback(self, callback: ProgressCallback) -> None:
+        """Register a callback to be sent every progress event.
+
+        Args:
+            callback (Callable): Called with each event dict. It is called from the
+            reporting thread, and from the threads transferring files.
+        """
+        self.callbacks.append(callback)
+
+    @contextmanager
+    def track(
+        self, direction: str, name: str, total: int | None = None
+    ) -> Iterator[FileProgress]:
+        """Track a file while it is transferred.
+
+        Args:
+            direction (str): How the file is being transferred, upload or download.
+            name (str): The name of the file.
+            total (int, optional): The size of the file, if it is known.
+
+        Yields:
+            FileProgress: The progress, to update as data is transferred.
+        """
+        progress = FileProgress(direction, name, total)
+        with self._lock:
+            self._active.append(progress)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="sharepoint-progress", daemon=True
+                )
+                self._thread.start()
+        try:
+            yield progress
+        finally:
+            with self._lock:
+                self._active.remove(progress)
+            self._send(progress.event(finished=True))
+
+    def report(self) -> None:
+        """Send an event for each file in flight."""
+        with self._lock:
+            active = list(self._active)
+        for progress in active:
+            self._send(progress.event())
+
+    def _send(self, event: dict) -> None:
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                if self.logger is not None:
+                    self.logger.warning(f"Progress callback failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.report()
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+        with self._lock:
+            self._thread = None
+
+    def close(self) -> None:
+        """Stop the reporting thread."""
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+class LogProgress:
+    """Progress callback that writes each event to the task log.
+
+    Files in flight are logged at info, and stalled ones as a warning. Finished
+    files are logged at debug, as a transfer of many small files would otherwise
+    log a line for each.
+    """
+
+    def __init__(self, logger: Logger):
+        """Create the callback.
+
+        Args:
+            logger (Logger): The logger to write to.
+        """
+        self.logger = logger
+
+    def __call__(self, event: dict) -> None:
+        """Log an event, as a warning if the file has stalled, or debug if finished."""
+        done = _format_bytes(event["bytes_done"])
+        if event["total_bytes"] is not None:
+            done = (
+                f"{done} of {_format_bytes(event['total_bytes'])}"
+                f" ({event['percent']}%)"
+            )
+        message = (
+            f"{event['direction'].capitalize()} of {event['name']}: {done},"
+            f" {_format_bytes(event['bytes_per_second'])}/s now,"
+            f" {_format_bytes(event['average_bytes_per_second'])}/s average"
+        )
+        if event["finished"]:
+            self.logger.debug(f"{message}, finished in {event['elapsed_seconds']:.1f}s")
+        elif event["stalled"]:
+            self.logger.warning(
+                f"{message}, no data moved in the last interval"
+                f" ({event['elapsed_seconds']:.0f}s elapsed)"
+            )
+        else:
+            eta = event["eta_seconds"]
+            eta_text = "unknown" if eta is None else f"{eta:.0f}s"
+            self.logger.info(f"{message}, ETA {eta_text}")
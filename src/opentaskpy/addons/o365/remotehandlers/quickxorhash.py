@@ -0,0 +1,240 @@
+"""QuickXorHash implementation, as used by OneDrive and SharePoint.
+
+The hash is a 160 bit circular XOR of every input byte, where each successive byte
+is shifted 11 bits further along. Since 160 * 11 is a multiple of 160, every byte
+that sits at the same position modulo 160 lands on exactly the same bits. The input
+can therefore be XOR-folded into a single 160 byte block first (which Python does
+in C via big integers), and the per-byte shifting only has to be applied to those
+160 bytes when the digest is requested.
+"""
+
+import base64
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO
+
+WIDTH_IN_BITS = 160
+SHIFT = 11
+LANES = WIDTH_IN_BITS
+_LANE_BITS = LANES * 8
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_FOLD_BLOCK_SIZE = LANES * 256
+_STATE_MASK = (1 << WIDTH_IN_BITS) - 1
+_DIGEST_SIZE = WIDTH_IN_BITS // 8
+
+# Bit offset within the 160 bit state for each of the 160 byte lanes
+_LANE_OFFSETS = tuple((lane * SHIFT) % WIDTH_IN_BITS for lane in range(LANES))
+
+
+class QuickXorHash:
+    """Incremental QuickXorHash.
+
+    Usage mirrors hashlib, so data can be fed in as it is read or written.
+    """
+
+    name = "quickxorhash"
+    digest_size = _DIGEST_SIZE
+
+    def __init__(self, data: bytes | bytearray | memoryview = b""):
+        """Initialise the hash, optionally with some initial data.
+
+        Args:
+            data: Optional initial data to hash.
+        """
+        self._folded = 0
+        self.length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Add data to the hash.
+
+        Args:
+            data: The data to add.
+        """
+        size = len(data)
+        if not size:
+            return
+
+        # XOR the data together in blocks that are a multiple of 160 bytes, since
+        # int.from_bytes and XOR on mid-sized integers are the cheapest operations
+        # available, then fold the remaining rows in half until a single 160 byte
+        # row is left
+        view = memoryview(data).cast("B")
+        value = 0
+        for start in range(0, size, _FOLD_BLOCK_SIZE):
+            value ^= int.from_bytes(view[start : start + _FOLD_BLOCK_SIZE], "little")
+
+        rows = -(-min(size, _FOLD_BLOCK_SIZE) // LANES)
+        while rows > 1:
+            low_rows = rows // 2
+            low_bits = low_rows * _LANE_BITS
+            value = (value >> low_bits) ^ (value & ((1 << low_bits) - 1))
+            rows -= low_rows
+
+        # Rotate the row so that the first byte lines up with the lane it falls
+        # into in the overall stream
+        shift = (self.length % LANES) * 8
+        if shift:
+            value = ((value << shift) | (value >> (_LANE_BITS - shift))) & _LANE_MASK
+
+        self._folded ^= value
+        self.length += size
+
+    def digest(self) -> bytes:
+        """Return the digest of the data passed to update() so far."""
+        state = 0
+        folded = self._folded
+        for lane, bit_offset in enumerate(_LANE_OFFSETS):
+            byte = (folded >> (lane * 8)) & 0xFF
+            if byte:
+                state ^= (byte << bit_offset) | (byte >> (WIDTH_IN_BITS - bit_offset))
+
+        digest = bytearray((state & _STATE_MASK).to_bytes(_DIGEST_SIZE, "little"))
+        # The total length is XORed into the last 8 bytes
+        for i, length_byte in enumerate(self.length.to_bytes(8, "little")):
+            digest[_DIGEST_SIZE - 8 + i] ^= length_byte
+
+        return bytes(digest)
+
+    def base64digest(self) -> str:
+        """Return the digest base64 encoded, as reported by the Graph API."""
+        return base64.b64encode(self.digest()).decode("ascii")
+
+    def copy(self) -> "QuickXorHash":
+        """Return a copy of the current hash state."""
+        clone = QuickXorHash()
+        clone._folded = self._folded  # pylint: disable=protected-access
+        clone.length = self.length
+        return clone
+
+
+class BackgroundHasher:
+    """Feeds a QuickXorHash from a background thread.
+
+    The hash holds the GIL while it works, but sending data over a socket does not,
+    so hashing a block in the background while the previous one is being sent
+    hides almost all of the cost of the hash from the transfer.
+    """
+
+    def __init__(self) -> None:
+        """Initialise the hash and the thread used to update it."""
+        self.hasher = QuickXorHash()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="quickxorhash"
+        )
+        self._pending: Future | None = None
+        self._submitted = 0
+
+    @property
+    def length(self) -> int:
+        """Return the number of bytes submitted so far (hashed or not)."""
+        return self._submitted
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Queue data to be added to the hash, once the previous block is hashed.
+
+        Only one block is queued at a time, so if data arrives faster than it can
+        be hashed, the caller is held up rather than every block not yet hashed
+        being kept in memory.
+
+        Args:
+            data: The data to add. It must not be modified afterwards.
+        """
+        if self._pending is not None:
+            # Also surfaces any exception raised by the worker
+            self._pending.result()
+        self._submitted += len(data)
+        self._pending = self._executor.submit(self.hasher.update, data)
+
+    def result(self) -> QuickXorHash:
+        """Wait for all queued data to be hashed, and return the hash."""
+        self._executor.shutdown(wait=True)
+        if self._pending is not None:
+            # Surface any exception raised by the worker
+            self._pending.result()
+        return self.hasher
+
+    def base64digest(self) -> str:
+        """Wait for all queued data to be hashed, and return the base64 digest."""
+        return self.result().base64digest()
+
+
+class HashingReader:
+    """File-like wrapper that hashes data as it is read.
+
+    Used to compute the hash from the same buffers that are sent over the wire,
+    rather than reading the file a second time. http.client reads the body in 8KB
+    blocks, so the underlying file is read (and hashed) in larger blocks, which are
+    then handed out in whatever size the caller asks for.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        hasher: QuickXorHash | BackgroundHasher,
+        length: int,
+        block_size: int = 1024 * 1024,
+        on_read: Callable[[int], None] | None = None,
+    ):
+        """Wrap a file object.
+
+        Args:
+            file: The file object to read from.
+            hasher: The hash to update with every block read.
+            length: The number of bytes that will be read, used by requests to set
+            the Content-Length header.
+            block_size: The size of each read from the underlying file.
+            on_read: Called with the number of bytes handed out by each read, e.g.
+            to report progress.
+        """
+        self._file = file
+        self._on_read = on_read
+        self._hasher = hasher
+        self._length = length
+        self._block_size = block_size
+        self._buffer = b""
+        self._buffer_pos = 0
+        self._consumed = 0
+
+    def __len__(self) -> int:
+        """Return the number of bytes remaining to be read."""
+        return max(self._length - self._consumed, 0)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read from the underlying file, updating the hash.
+
+        Args:
+            size: Maximum number of bytes to read.
+        """
+        if size is None or size < 0:
+            data = self._buffer[self._buffer_pos :] + self._file.read()
+            self._hasher.update(data[len(self._buffer) - self._buffer_pos :])
+            self._buffer = b""
+            self._buffer_pos = 0
+        else:
+            if self._buffer_pos >= len(self._buffer):
+                self._buffer = self._file.read(max(size, self._block_size))
+                self._buffer_pos = 0
+                self._hasher.update(self._buffer)
+            data = self._buffer[self._buffer_pos : self._buffer_pos + size]
+            self._buffer_pos += len(data)
+
+        self._consumed += len(data)
+        if self._on_read is not None:
+            self._on_read(len(data))
+        return data
+
+
+def quickxorhash_file(file: str, block_size: int = 8 * 1024 * 1024) -> str:
+    """Return the base64 QuickXorHash of a local file.
+
+    Args:
+        file: Path to the file.
+        block_size: Size of each read.
+    """
+    hasher = QuickXorHash()
+    with open(file, "rb") as f:
+        while block := f.read(block_size):
+            hasher.update(block)
+    return hasher.base64digest()
@@ -0,0 +1,320 @@
+"""Transports that record the handler's Graph requests, and replay them later.
+
+A transport is anything with a request method taking the same arguments as
+requests.request, and returning a requests-like response, plus a close method.
+When one is set on SharepointTransfer._transport, every request the handler makes
+goes through it. The transports here let a real workload be captured once, and
+then run again offline, with the same responses and the same timings.
+
+Recordings are JSON lines, one per request. Request headers and bodies are not
+recorded (only the size of the body, where it is known), so access tokens are
+never written, but response bodies are. Recordings of downloads contain the
+files' contents.
+
+Graph also hands out pre-authenticated URLs, which work without an access token
+for a while: download URLs, upload session URLs, and the Location of copy
+monitors and redirects. Each is replaced with a stand-in, in the response it came
+in and in the requests later made to it, so recordings don't contain them and
+still replay.
+"""
+
+import base64
+import hashlib
+import http
+import io
+import json
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+def make_response(
+    status: int, headers: dict[str, str], content: bytes, url: str
+) -> requests.Response:
+    """Build a requests response that has already been read.
+
+    Args:
+        status (int): The status code.
+        headers (dict): The response headers.
+        content (bytes): The response body.
+        url (str): The URL that was requested.
+
+    Returns:
+        requests.Response: The response. iter_content works on it, as it would
+        for a streamed response.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = url
+    response.raw = io.BytesIO(content)
+    response._content = content  # pylint: disable=protected-access
+    response._content_consumed = True  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    try:
+        response.reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        response.reason = ""
+    return response
+
+
+def request_body(data: Any = None, json_body: Any = None) -> bytes:
+    """Read the body of a request, from the data or json arguments of requests.
+
+    Args:
+        data: bytes, str, a file-like object, or an iterable of byte chunks.
+        json_body: An object to send as JSON, if there is no data.
+
+    Returns:
+        bytes: The body. File-like objects and iterables are read to the end.
+    """
+    if data is None:
+        return b"" if json_body is None else json.dumps(json_body).encode()
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        return data.encode()
+    if hasattr(data, "read"):
+        return bytes(data.read())
+    if isinstance(data, Iterable):
+        return b"".join(data)
+    raise TypeError(f"Unsupported request body: {type(data).__name__}")
+
+
+def _prepared_url(url: str, params: Any = None) -> str:
+    # Quote the URL as requests does, so recorded and replayed URLs always match
+    prepared = requests.PreparedRequest()
+    prepared.prepare_url(url, params)
+    return str(prepared.url)
+
+
+# Response fields and headers that hold pre-authenticated URLs
+SECRET_URL_FIELDS = frozenset({"@microsoft.graph.downloadUrl", "uploadUrl"})
+SECRET_URL_HEADERS = ("Location",)
+
+
+def redact_url(url: str) -> str:
+    """Return the stand-in recorded for a pre-authenticated URL.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str: A URL that is the same for the same URL, and can't be used for
+        anything.
+    """
+    digest = hashlib.sha256(_prepared_url(url).encode()).hexdigest()[:32]
+    return f"https://redacted.invalid/{digest}"
+
+
+class RequestsTransport:
+    """Sends requests over the network with requests, as the handler does by default."""
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request, taking the same arguments as requests.request."""
+        # pylint: disable-next=missing-timeout
+        return requests.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        """Nothing to close, as requests doesn't keep connections between calls."""
+
+
+class RecordingTransport:
+    """Passes requests on to another transport, recording each one to a file.
+
+    Each response body is read in full before it is returned, so it can be
+    recorded, even when the request asked for it to be streamed.
+    """
+
+    def __init__(self, transport: Any, file_name: str):
+        """Start a new recording.
+
+        Args:
+            transport: The transport that actually sends the requests.
+            file_name (str): The file to write the recording to. Any existing
+            recording there is replaced.
+        """
+        self.transport = transport
+        # Kept open until close, so each request can be written as it completes
+        self._file = open(  # noqa: SIM115 pylint: disable=consider-using-with
+            file_name, "w", encoding="utf-8"
+        )
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        # The pre-authenticated URLs seen in responses, which requests are made to
+        self._secret_urls: set[str] = set()
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Any:
+        """Send a request through the wrapped transport, and record it.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            **kwargs: The arguments supported by requests.request.
+
+        Returns:
+            The response from the wrapped transport.
+        """
+        data = kwargs.get("data")
+        prepared_url = _prepared_url(url, kwargs.get("params"))
+        with self._lock:
+            secret = prepared_url in self._secret_urls
+        exchange: dict[str, Any] = {
+            "method": method,
+            "url": redact_url(prepared_url) if secret else prepared_url,
+        }
+        if data is not None and hasattr(data, "__len__"):
+            exchange["request_size"] = len(data)
+        elif data is None:
+            exchange["request_size"] = len(request_body(json_body=kwargs.get("json")))
+
+        start = time.perf_counter()
+        try:
+            response = self.transport.request(method, url, **kwargs)
+            content = response.content
+        except requests.exceptions.RequestException as e:
+            # Failures are replayed too, so that retries are reproduced
+            exchange["exception"] = type(e).__name__
+            exchange["message"] = str(e)
+            self._write(exchange, start)
+            raise
+
+        exchange["status"] = response.status_code
+        exchange["headers"] = dict(response.headers)
+        for header in SECRET_URL_HEADERS:
+            if header in exchange["headers"]:
+                exchange["headers"][header] = self._redact(exchange["headers"][header])
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            exchange["text"] = self._redact_json(content.decode("utf-8"))
+        else:
+            exchange["body"] = base64.b64encode(content).decode("ascii")
+        self._write(exchange, start)
+        return response
+
+    def _redact(self, url: str) -> str:
+        with self._lock:
+            self._secret_urls.add(_prepared_url(url))
+        return redact_url(url)
+
+    def _redact_json(self, text: str) -> str:
+        try:
+            body = json.loads(text)
+        except ValueError:
+            return text
+
+        def redact(value: Any) -> Any:
+            if isinstance(value, dict):
+                return {
+                    key: (
+                        self._redact(item)
+                        if key in SECRET_URL_FIELDS and isinstance(item, str)
+                        else redact(item)
+                    )
+                    for key, item in value.items()
+                }
+            if isinstance(value, list):
+                return [redact(item) for item in value]
+            return value
+
+        redacted = redact(body)
+        return text if redacted == body else json.dumps(redacted)
+
+    def _write(self, exchange: dict, start: float) -> None:
+        exchange["started"] = round(start - self._started, 6)
+        exchange["elapsed"] = round(time.perf_counter() - start, 6)
+        with self._lock:
+            self._file.write(json.dumps(exchange) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        """Finish the recording, and close the wrapped transport."""
+        self._file.close()
+        self.transport.close()
+
+
+class ReplayTransport:
+    """Answers requests from a recording, without any network.
+
+    Each recorded response is used once, for a request with the same method and
+    URL, in the order they were recorded. Every response is delayed by the time
+    the original request took, scaled by time_scale.
+    """
+
+    def __init__(self, file_name: str, time_scale: float = 1.0):
+        """Load a recording.
+
+        Args:
+            file_name (str): The file written by a RecordingTransport.
+            time_scale (float): Multiplier for the recorded request durations. 0
+            replays without any delays.
+        """
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._exchanges: dict[tuple[str, str], deque[dict]] = {}
+        with open(file_name, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self._exchanges.setdefault(
+                        (exchange["method"], exchange["url"]), deque()
+                    ).append(exchange)
+
+    @property
+    def remaining(self) -> int:
+        """Return the number of recorded requests that haven't been replayed."""
+        with self._lock:
+            return sum(len(exchanges) for exchanges in self._exchanges.values())
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Answer a request with the next matching recorded response.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            **kwargs: The arguments supported by requests.request.
+
+        Returns:
+            requests.Response: The recorded response.
+
+        Raises:
+            requests.exceptions.ConnectionError: If there is no recorded response
+            left for the request.
+            requests.exceptions.RequestException: The exception the request raised
+            when it was recorded, if any.
+        """
+        url = _prepared_url(url, kwargs.get("params"))
+        with self._lock:
+            exchanges = self._exchanges.get((method, url))
+            exchange = exchanges.popleft() if exchanges else None
+        if exchange is None:
+            raise requests.exceptions.ConnectionError(
+                f"No recorded response for {method} {url}"
+            )
+
+        # Read the body, as sending it would, e.g. so that an upload is hashed
+        request_body(kwargs.get("data"), kwargs.get("json"))
+
+        if self.time_scale:
+            time.sleep(exchange["elapsed"] * self.time_scale)
+
+        if "exception" in exchange:
+            exception_type = getattr(
+                requests.exceptions, exchange["exception"], requests.RequestException
+            )
+            raise exception_type(exchange["message"])
+
+        content = (
+            exchange["text"].encode("utf-8")
+            if "text" in exchange
+            else base64.b64decode(exchange["body"])
+        )
+        return make_response(exchange["status"], exchange["headers"], content, url)
+
+    def close(self) -> None:
+        """Nothing to close."""
@@ -0,0 +1,80 @@
+"""Retry decorator that only imports tenacity when a retried method is first used.
+
+Importing tenacity adds noticeably to the time taken to import the handler, which
+every task process pays, even those that only validate their config. lazy_retry
+behaves like tenacity.retry for methods, but builds the tenacity.Retrying object on
+the first call, or the first time its retry attribute is accessed.
+"""
+
+import functools
+import threading
+import types
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from tenacity import Retrying
+
+
+class LazyRetry:
+    """A method wrapped for retrying, as returned by lazy_retry."""
+
+    def __init__(self, method: Callable, make_retrying: Callable[[], "Retrying"]):
+        """Wrap a method.
+
+        Args:
+            method (Callable): The method to retry.
+            make_retrying (Callable): Returns the tenacity.Retrying to use. Any
+            tenacity imports belong inside it.
+        """
+        functools.update_wrapper(self, method)
+        self._method = method
+        self._make_retrying = make_retrying
+        self._retrying: Retrying | None = None
+        self._wrapped: Callable | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def retry(self) -> "Retrying":
+        """Return the tenacity.Retrying object, as tenacity.retry exposes it."""
+        if self._retrying is None:
+            with self._lock:
+                if self._retrying is None:
+                    self._retrying = self._make_retrying()
+        return self._retrying
+
+    @property
+    def statistics(self) -> dict:
+        """Return the statistics of the last call, as tenacity.retry exposes them."""
+        return self._wrapped.statistics if self._wrapped is not None else {}  # type: ignore[attr-defined]
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        """Call the method, retrying it as the Retrying object says."""
+        if self._wrapped is None:
+            self._wrapped = self.retry.wraps(self._method)
+        return self._wrapped(*args, **kwargs)
+
+    def __get__(self, instance: Any, owner: type | None = None) -> Any:
+        """Bind to an instance, as a function would."""
+        if instance is None:
+            return self
+        return types.MethodType(self, instance)
+
+
+def lazy_retry(
+    make_retrying: Callable[[], "Retrying"],
+) -> Callable[[Callable], LazyRetry]:
+    """Decorate a method so it is retried, without importing tenacity up front.
+
+    Args:
+        make_retrying (Callable): Returns the tenacity.Retrying to use, e.g.
+        Retrying(stop=stop_after_attempt(3)). Any tenacity imports belong inside it.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(method: Callable) -> LazyRetry:
+        return LazyRetry(method, make_retrying)
+
+    return decorator
@@ -1,40 +1,185 @@
 """O365 Sharepoint remote handler."""
 
 import glob
+import itertools
+import logging
 import math
+import posixpath
 import re
+import threading
 import traceback
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
 from datetime import datetime
 from os import path
-from time import sleep
-from typing import Any
+from time import perf_counter, sleep, time
+from typing import IO, TYPE_CHECKING, Any
 
 import opentaskpy.otflogging
 import requests
-from dateutil.tz import tzlocal
 from opentaskpy.config.variablecaching import cache_utils
 from opentaskpy.exceptions import RemoteTransferError
 from opentaskpy.remotehandlers.remotehandler import RemoteTransferHandler
-from tenacity import (
-    RetryCallState,
-    retry,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_exponential,
-)
 
+from .clients import (
+    SessionTransport,
+    SharepointClient,
+    acquire_client,
+    add_client_key,
+    client_key,
+    release_client,
+)
+from .conditionals import NEWEST_FIRST, ListingConditions, parse_modified_time
 from .creds import get_access_token
+from .fanout import FanOut, Upload, acquire_fan_out, release_fan_out
+from .listing import ListedFile
+from .metrics import RequestMetrics, body_size, create_sinks, response_size
+from .progress import DEFAULT_INTERVAL as DEFAULT_PROGRESS_INTERVAL
+from .progress import FileProgress, LogProgress, ProgressCallback, ProgressReporter
+from .quickxorhash import (
+    BackgroundHasher,
+    HashingReader,
+    QuickXorHash,
+    quickxorhash_file,
+)
+from .recording import RecordingTransport, ReplayTransport, RequestsTransport
+from .retries import lazy_retry
+from .streams import (
+    UPLOAD_CHUNK_MULTIPLE,
+    DownloadStream,
+    iter_chunk_ranges,
+    iter_upload_chunks,
+)
+from .timeline import TransferTimeline, timed_phase
 
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
 MAX_FILES_PER_QUERY = 100
+# Only the driveItem properties that the handler uses are requested when listing
+LIST_SELECT_FIELDS = "id,name,size,lastModifiedDateTime,file,folder,parentReference"
+# How many of the files found by a listing are named in the log
+LOGGED_FILE_NAMES = 20
+STREAM_UPLOAD_CHUNK_SIZE = UPLOAD_CHUNK_MULTIPLE * 32
+# Pre-authenticated download URLs are valid for about an hour. They are only used
+# for this long after the listing that returned them
+DOWNLOAD_URL_LIFETIME = 45 * 60
+
+if TYPE_CHECKING:
+    from tenacity import RetryCallState, Retrying
+
+    from .itemindex import ItemIndex
+
+
+def _request_retrying() -> "Retrying":
+    """Return the retry policy for requests, which retries timeouts."""
+    # tenacity is only imported once a request is made
+    from tenacity import (  # pylint: disable=import-outside-toplevel
+        Retrying,
+        retry_if_exception_type,
+        stop_after_attempt,
+        wait_exponential,
+    )
+
+    return Retrying(
+        reraise=True,
+        stop=stop_after_attempt(6),
+        wait=wait_exponential(multiplier=2, min=5, max=60),
+        retry=retry_if_exception_type(requests.exceptions.ReadTimeout),
+        before_sleep=SharepointTransfer._log_retry_attempt,  # pylint: disable=protected-access
+    )
+
+
+def listed_item_url(attributes: dict) -> str | None:
+    """Return the URL of a file returned by list_files, addressed by its IDs.
+
+    Args:
+        attributes (dict): The attributes of the file, as returned by list_files.
+
+    Returns:
+        str: The URL of the item, or None if list_files didn't record its drive ID
+        and item ID.
+    """
+    if attributes.get("drive_id") and attributes.get("item_id"):
+        return (
+            f"{GRAPH_URL}/drives/{attributes['drive_id']}/items/{attributes['item_id']}"
+        )
+    return None
+
+
+def usable_download_url(attributes: dict) -> str | None:
+    """Return the pre-authenticated download URL of a listed file, if still valid.
+
+    Args:
+        attributes (dict): The attributes of the file, as returned by list_files.
+
+    Returns:
+        str: The download URL, or None if list_files didn't capture one, or it is
+        too old to use.
+    """
+    if attributes.get("download_url") and attributes["download_url_expiry"] > time():
+        return str(attributes["download_url"])
+    return None
+
+
+def _copy_listing(remote_files: dict) -> dict:
+    # The caller may remove files from the listing, or change their attributes
+    return {name: attributes.copy() for name, attributes in remote_files.items()}
+
+
+def item_action_url(item_url: str, action: str) -> str:
+    """Return the URL of an action on a drive item, e.g. its content.
+
+    Args:
+        item_url (str): The URL of the item, addressed by path or by ID.
+        action (str): The action, e.g. content or copy.
+
+    Returns:
+        str: The URL of the action.
+    """
+    # Items addressed by path need the path ending before the action
+    if "root:/" in item_url:
+        return f"{item_url}:/{action}"
+    return f"{item_url}/{action}"
 
 
 class SharepointTransfer(RemoteTransferHandler):
     """Sharepoint remote transfer handler."""
 
     TASK_TYPE = "T"
+    # Set when the protocol asks for HTTP/2, or to record or replay requests.
+    # Otherwise requests is used
+    _transport: Any = None
+    # Set when the protocol asks for request metrics
+    metrics: RequestMetrics | None = None
+    _metrics_sinks: list = []
+    # Set when the protocol asks for a timeline report
+    timeline: TransferTimeline | None = None
+    # Set when the protocol asks for progress, or a progress callback is added
+    progress: ProgressReporter | None = None
+    # Set by _bootstrap on first use
+    _credentials: dict | None = None
+    _site_id: str | None = None
+    headers: dict[str, str] = {}
+    _bootstrap_pending = False
+    # Document library names to drive IDs, fetched once
+    _drive_ids: dict[str, str] | None = None
+    # Folder paths to item IDs, primed by a batched bootstrap. "" is the root
+    _folder_ids: dict[str, str] | None = None
+    # Set when the protocol asks for a client shared with other handlers
+    _client: SharepointClient | None = None
+    # Set when a destination asks to share uploads with the task's other
+    # destinations
+    _fan_out: FanOut | None = None
+    # Set when the protocol asks for IDs to be kept in a local index between runs
+    _item_index: "ItemIndex | None" = None
+    # Set once cached IDs have been dropped after a 404, so it's only done once
+    _stale_ids_forgotten = False
+    # The eTag and cTag of each directory listed by a fileWatch with
+    # changeDetection, and what was found, by directory and file pattern
+    _folder_listings: dict[tuple, tuple[tuple, dict]] | None = None
 
     @staticmethod
-    def _log_retry_attempt(retry_state: RetryCallState) -> None:
+    def _log_retry_attempt(retry_state: "RetryCallState") -> None:
         """Log details before tenacity sleeps and retries a request."""
         if not retry_state.args:
             return
@@ -70,18 +215,58 @@ class SharepointTransfer(RemoteTransferHandler):
             exception_traceback,
         )
         self.logger.info(f"Sleeping for {sleep_for} seconds before retry")
+        if self.metrics is not None:
+            self.metrics.record_retry(method, url)
 
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(6),
-        wait=wait_exponential(multiplier=2, min=5, max=60),
-        retry=retry_if_exception_type(requests.exceptions.ReadTimeout),
-        before_sleep=_log_retry_attempt,
-    )
+    @lazy_retry(_request_retrying)
     def _request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
         """Perform a request with retry for transient timeout failures."""
+        self._bootstrap()
         method_upper = method.upper()
         self.logger.debug(f"Making request to {url} with method {method}")
+        if self.metrics is None and self.timeline is None:
+            return self._send_request(method_upper, url, **kwargs)
+
+        # Measured up front, as file-like bodies are consumed by sending them
+        bytes_sent = body_size(kwargs.get("data"), kwargs.get("json"))
+        start = perf_counter()
+        try:
+            response = self._send_request(method_upper, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if self.metrics is not None:
+                self.metrics.record_error(method_upper, url, e, perf_counter() - start)
+            if self.timeline is not None:
+                self.timeline.request_made(bytes_sent)
+            raise
+
+        bytes_received = response_size(response, kwargs.get("stream", False))
+        if self.metrics is not None:
+            self.metrics.record(
+                method_upper,
+                url,
+                response.status_code,
+                perf_counter() - start,
+                bytes_sent,
+                bytes_received,
+            )
+        if self.timeline is not None:
+            self.timeline.request_made(bytes_sent, bytes_received)
+        return response
+
+    def _send_request(
+        self, method_upper: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        """Send a request through the transport, or requests."""
+        if self._transport is not None and method_upper in (
+            "GET",
+            "POST",
+            "PUT",
+            "PATCH",
+            "DELETE",
+        ):
+            return self._transport.request(  # type: ignore[no-any-return]
+                method_upper, url, **kwargs
+            )
         if method_upper == "GET":
             return requests.get(url, **kwargs)  # pylint: disable=missing-timeout
         if method_upper == "POST":
@@ -92,7 +277,7 @@ class SharepointTransfer(RemoteTransferHandler):
             return requests.patch(url, **kwargs)  # pylint: disable=missing-timeout
         if method_upper == "DELETE":
             return requests.delete(url, **kwargs)  # pylint: disable=missing-timeout
-        raise ValueError(f"Unsupported HTTP method for retry wrapper: {method}")
+        raise ValueError(f"Unsupported HTTP method for retry wrapper: {method_upper}")
 
     def __init__(self, spec: dict):
         """Initialise the SharepointTransfer handler.
@@ -107,30 +292,209 @@ class SharepointTransfer(RemoteTransferHandler):
 
         super().__init__(spec)
 
-        self.credentials = get_access_token(self.spec["protocol"])
-        # Update the refresh token in the spec
-        self.spec["protocol"]["refreshToken"] = self.credentials["refresh_token"]
+        if "timeline" in self.spec["protocol"]:
+            self.timeline = TransferTimeline(self.spec["task_id"])
+        if "progress" in self.spec["protocol"]:
+            progress_options = self.spec["protocol"]["progress"]
+            self.progress = ProgressReporter(
+                progress_options.get("interval", DEFAULT_PROGRESS_INTERVAL),
+                self.logger,
+            )
+            if progress_options.get("log", True):
+                self.progress.add_callback(LogProgress(self.logger))
 
-        self.validate_or_refresh_creds()
+        # Nothing is requested until the handler is first used, as plenty of
+        # handlers never are, e.g. if a file watch times out
+        self._bootstrap_pending = True
+        self._bootstrapping = False
+        self._bootstrap_lock = threading.RLock()
 
-        if "cacheableVariables" in self.spec:
-            self.handle_cacheable_variables()
+        self.timeout = self.spec["protocol"].get("timeout", 30)
+        self.sync_stats = {"uploaded": 0, "skipped": 0, "bytes_saved": 0}
+
+        transport_options = self.spec["protocol"].get("transport", {})
+        if self.spec["protocol"].get("httpVersion", "1.1") == "2":
+            self._transport = self._create_http2_transport()
+        if transport_options:
+            self._transport = self._create_recording_transport(transport_options)
+        if self.spec["protocol"].get("sharedClient", False):
+            self._client = acquire_client(client_key(self.spec))
+            # Recordings are per handler, so only other transports are shared
+            if not transport_options:
+                self._share_transport()
+        if self.spec.get("fanOut", False):
+            self._fan_out = acquire_fan_out(self.spec["task_id"])
+            self.fan_out_stats = {"uploaded": 0, "copied": 0, "failed": 0}
+        if "itemIndex" in self.spec["protocol"]:
+            # sqlite3 is only imported when an index is used
+            from .itemindex import (  # pylint: disable=import-outside-toplevel
+                ItemIndex,
+            )
+
+            self._item_index = ItemIndex(self.spec["protocol"]["itemIndex"])
+        if "metrics" in self.spec["protocol"]:
+            self.metrics = RequestMetrics(self.spec["task_id"])
+            self._metrics_sinks = create_sinks(
+                self.spec["protocol"]["metrics"], self.logger
+            )
+
+    @property
+    def credentials(self) -> dict:
+        """Return the access token and its expiry, getting them on first use."""
+        self._bootstrap()
+        return self._credentials  # type: ignore[return-value]
+
+    @credentials.setter
+    def credentials(self, credentials: dict) -> None:
+        self._credentials = credentials
+
+    @property
+    def site_id(self) -> str:
+        """Return the ID of the site, looking it up on first use."""
+        self._bootstrap()
+        return self._site_id  # type: ignore[return-value]
+
+    @site_id.setter
+    def site_id(self, site_id: str) -> None:
+        self._site_id = site_id
 
-        # Obtain the source site ID via the Graph API based on the site name and
-        # hostname
+    def _bootstrap(self) -> None:
+        """Get an access token and look up the site, if not already done.
+
+        Called by the first operation that needs either. Threads that get here
+        while another is bootstrapping wait for it to finish.
+        """
+        if not self._bootstrap_pending:
+            return
+        with self._bootstrap_lock:
+            # The site lookup comes back through here, from the same thread
+            if not self._bootstrap_pending or self._bootstrapping:
+                return
+            self._bootstrapping = True
+            try:
+                self._do_bootstrap()
+                self._bootstrap_pending = False
+            finally:
+                self._bootstrapping = False
+
+    def _share_transport(self) -> None:
+        """Use the shared client's transport, giving it one if it has none."""
+        client: SharepointClient = self._client  # type: ignore[assignment]
+        with client.lock:
+            if client.transport is None:
+                client.transport = self._transport or SessionTransport(
+                    self.spec["protocol"].get("maxConcurrency", 4)
+                )
+            elif self._transport is not None:
+                # Another handler got there first, so its connections are used
+                self._transport.close()
+            self._transport = client.transport
+
+    def _do_bootstrap(self) -> None:
+        """Get an access token and look up the site, or take them from the client.
+
+        The first handler to use a shared client bootstraps as usual, and stores
+        what it found in the client. Later handlers take the token, site, drive and
+        folder IDs from it, only getting a new token if it is about to expire.
+        """
+        client = self._client
+        if client is None:
+            self._bootstrap_site()
+            return
+
+        with client.lock:
+            if client.site_id is None:
+                self._bootstrap_site()
+                self._share_credentials()
+                client.site_id = self._site_id
+                client.drive_ids = self._drive_ids
+                client.folder_ids = self._folder_ids
+                return
+
+            if client.token_is_valid():
+                self.credentials = dict(client.credentials)  # type: ignore[arg-type]
+            else:
+                with self._phase("token"):
+                    self.credentials = get_access_token(self.spec["protocol"])
+            self.spec["protocol"]["refreshToken"] = self.credentials["refresh_token"]
+            self._share_credentials()
+            self.site_id = client.site_id
+            self._drive_ids = client.drive_ids
+            self._folder_ids = client.folder_ids
+
+        self.logger.info(f"Using the shared client for site {self.spec['siteName']}")
         self.headers = {
             "Authorization": "Bearer " + self.credentials["access_token"],
             "Content-Type": "application/json",
         }
+        if "cacheableVariables" in self.spec:
+            self.handle_cacheable_variables()
 
-        self.timeout = self.spec["protocol"].get("timeout", 30)
+    def _share_credentials(self) -> None:
+        """Store the handler's credentials in its shared client.
 
-        response = self._request(
-            "GET",
-            f"https://graph.microsoft.com/v1.0/sites/{self.spec['siteHostname']}:/sites/{self.spec['siteName']}",
-            headers=self.headers,
-            timeout=self.timeout,
-        ).json()
+        The client is also kept under the handler's refresh token, which getting
+        an access token may have rotated, so later tasks given it use the client.
+        """
+        client: SharepointClient = self._client  # type: ignore[assignment]
+        client.credentials = self.credentials
+        add_client_key(client, client_key(self.spec))
+
+    def _bootstrap_site(self) -> None:
+        """Get an access token and look up the site ID.
+
+        Connections are warmed up while the token is fetched, and cacheable
+        variables are written while the site is looked up.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            warm_up = getattr(self._transport, "warm_up", None)
+            if warm_up is not None:
+                executor.submit(warm_up, GRAPH_URL, self.timeout)
+
+            if "replay" in self.spec["protocol"].get("transport", {}):
+                # The recorded responses don't need a real access token, so no
+                # credentials are needed, or updated, when replaying
+                self.credentials = {
+                    "access_token": "replay",
+                    "refresh_token": self.spec["protocol"].get("refreshToken"),
+                    "expiry": time() + 86400,
+                }
+                cached_variables = None
+            else:
+                with self._phase("token"):
+                    self.credentials = get_access_token(self.spec["protocol"])
+                # Update the refresh token in the spec
+                self.spec["protocol"]["refreshToken"] = self.credentials[
+                    "refresh_token"
+                ]
+                cached_variables = (
+                    executor.submit(self.handle_cacheable_variables)
+                    if "cacheableVariables" in self.spec
+                    else None
+                )
+
+            # Obtain the source site ID via the Graph API based on the site name and
+            # hostname
+            self.headers = {
+                "Authorization": "Bearer " + self.credentials["access_token"],
+                "Content-Type": "application/json",
+            }
+            with self._phase("site"):
+                response = (
+                    self._batch_bootstrap()
+                    if self.spec["protocol"].get("batchBootstrap", False)
+                    else None
+                )
+                if response is None:
+                    response = self._request(
+                        "GET",
+                        f"{GRAPH_URL}/sites/{self.spec['siteHostname']}:/sites/{self.spec['siteName']}",
+                        headers=self.headers,
+                        timeout=self.timeout,
+                    ).json()
+
+            if cached_variables is not None:
+                cached_variables.result()
 
         # Check the response is OK
         if response.get("error"):
@@ -140,22 +504,208 @@ class SharepointTransfer(RemoteTransferHandler):
             raise RemoteTransferError(response["error"]["message"])
         self.site_id = response["id"]
 
+    def _batch_bootstrap(self) -> dict | None:
+        """Look up the site, its drives, and the root and target folders together.
+
+        Every request addresses the site by hostname and path, so none depends on
+        another, and they are sent in a single $batch. The drive IDs and folder
+        IDs are cached for later use.
+
+        Returns:
+            dict: The site lookup response, or None if the batch failed, in which
+            case the site should be looked up on its own.
+        """
+        site_path = f"/sites/{self.spec['siteHostname']}:/sites/{self.spec['siteName']}"
+        batch_requests = [
+            {"id": "site", "method": "GET", "url": site_path},
+            {
+                "id": "drives",
+                "method": "GET",
+                "url": f"{site_path}:/drives?$select=id,name",
+            },
+            {
+                "id": "root",
+                "method": "GET",
+                "url": f"{site_path}:/drive/root?$select=id",
+            },
+        ]
+        # Folders in other document libraries can only be addressed by drive ID
+        directory = (self.spec.get("directory") or "").strip("/")
+        if directory and not self.spec["directory"].startswith("/"):
+            batch_requests.append(
+                {
+                    "id": "directory",
+                    "method": "GET",
+                    "url": f"{site_path}:/drive/root:/{directory}?$select=id",
+                }
+            )
+
+        response = self._request(
+            "POST",
+            f"{GRAPH_URL}/$batch",
+            headers=self.headers,
+            json={"requests": batch_requests},
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            self.logger.warning(
+                f"Batched bootstrap failed with status {response.status_code},"
+                " looking up the site on its own"
+            )
+            return None
+
+        responses = {item["id"]: item for item in response.json().get("responses", [])}
+        if "site" not in responses:
+            return None
+
+        drives = responses.get("drives", {})
+        if drives.get("status") == 200:
+            self._drive_ids = {
+                drive["name"]: str(drive["id"]) for drive in drives["body"]["value"]
+            }
+        self._folder_ids = {}
+        for request_id, folder in (("root", ""), ("directory", directory)):
+            item = responses.get(request_id, {})
+            if item.get("status") == 200:
+                self._folder_ids[folder] = str(item["body"]["id"])
+
+        self.logger.debug(
+            f"Batched bootstrap cached {len(self._drive_ids or {})} drives and"
+            f" {len(self._folder_ids)} folders"
+        )
+        return responses["site"].get("body") or {}
+
+    def _create_http2_transport(self) -> Any:
+        """Create the transport used to send requests over HTTP/2."""
+        try:
+            # httpx is an optional dependency, only needed for HTTP/2
+            from .transports import (  # pylint: disable=import-outside-toplevel
+                Http2Transport,
+            )
+        except ImportError as e:
+            raise RemoteTransferError(
+                "httpVersion 2 requires httpx. Install otf-addons-o365[http2] to use it"
+            ) from e
+
+        self.logger.info("Sending Graph API requests over HTTP/2")
+        return Http2Transport(
+            max_connections=self.spec["protocol"].get("maxConcurrency", 4)
+        )
+
+    def _create_recording_transport(self, transport_options: dict) -> Any:
+        """Create the transport that records requests, or replays a recording.
+
+        Args:
+            transport_options (dict): The transport from the protocol definition.
+
+        Returns:
+            RecordingTransport | ReplayTransport: The transport.
+        """
+        if self._use_async_engine():
+            self.logger.warning(
+                "The async engine sends its own requests, which are not recorded or"
+                " replayed"
+            )
+
+        if "replay" in transport_options:
+            self.logger.info(
+                f"Replaying Graph API requests from {transport_options['replay']}"
+            )
+            return ReplayTransport(
+                transport_options["replay"], transport_options.get("timeScale", 1.0)
+            )
+
+        self.logger.info(
+            f"Recording Graph API requests to {transport_options['record']}"
+        )
+        return RecordingTransport(
+            self._transport or RequestsTransport(), transport_options["record"]
+        )
+
+    def _phase(self, name: str) -> AbstractContextManager:
+        """Return a context that times a phase, if there is a timeline.
+
+        Args:
+            name (str): The name of the phase.
+        """
+        return nullcontext() if self.timeline is None else self.timeline.phase(name)
+
+    def add_progress_callback(self, callback: ProgressCallback) -> None:
+        """Register a callback for the progress of uploads and downloads.
+
+        While each file is being transferred, the callback is sent an event every
+        progress interval (5 seconds unless the progress protocol option sets
+        one), and a final event when it finishes. See progress.FileProgress.event
+        for what each event contains.
+
+        Args:
+            callback (Callable): Called with each event dict, from a background
+            thread, or the thread transferring the file.
+        """
+        if self.progress is None:
+            self.progress = ProgressReporter(logger=self.logger)
+        self.progress.add_callback(callback)
+
+    def _track(
+        self, direction: str, name: str, total: int | None
+    ) -> AbstractContextManager[FileProgress | None]:
+        """Return a context that tracks the progress of a file, if it is asked for.
+
+        Args:
+            direction (str): How the file is being transferred, upload or download.
+            name (str): The name of the file.
+            total (int, optional): The size of the file, if it is known.
+        """
+        if self.progress is None:
+            return nullcontext()
+        return self.progress.track(direction, name, total)
+
+    def _timed_file(
+        self,
+        direction: str,
+        name: str,
+        size: int | None,
+        operation: Callable[..., int],
+        *args: Any,
+    ) -> int:
+        """Run a per-file operation, timing it if there is a timeline.
+
+        Args:
+            direction (str): How the file is being transferred, e.g. upload.
+            name (str): The name of the file.
+            size (int, optional): The size of the file, if it is known.
+            operation (Callable): The operation, which returns 0 if successful.
+            *args: The arguments for the operation.
+
+        Returns:
+            int: The result of the operation.
+        """
+        if self.timeline is None:
+            return operation(*args)
+        with self.timeline.file(direction, name, size) as record:
+            result = operation(*args)
+            if result != 0:
+                record["status"] = "failed"
+            return result
+
     def validate_or_refresh_creds(self) -> None:
         """Check the expiry of the access token, and get a new one if necessary."""
-        # Convert the epoch from the credentials into the current datatime
-        expiry_datetime = datetime.fromtimestamp(
-            self.credentials["expiry"], tz=tzlocal()
-        )
+        expiry = self.credentials["expiry"]
         self.logger.debug(
-            f"Creds expire at: {expiry_datetime} - Now: {datetime.now(tz=tzlocal())}"
+            f"Creds expire at: {datetime.fromtimestamp(expiry).astimezone()} - Now:"
+            f" {datetime.now().astimezone()}"
         )
 
         # If the expiry time is less than the current time, refresh the creds
-        if expiry_datetime < datetime.now(tz=tzlocal()):
+        if expiry < time():
             self.logger.info("Refreshing credentials")
-            self.credentials = get_access_token(self.spec["protocol"])
+            with self._phase("token"):
+                self.credentials = get_access_token(self.spec["protocol"])
             # Update the refresh token in the spec
             self.spec["protocol"]["refreshToken"] = self.credentials["refresh_token"]
+            if self._client is not None:
+                with self._client.lock:
+                    self._share_credentials()
 
         # If there's cacheable variables, handle them
         if "cacheableVariables" in self.spec:
@@ -173,9 +723,53 @@ class SharepointTransfer(RemoteTransferHandler):
 
             cache_utils.update_cache(cacheable_variable, updated_value)
 
+    def _use_async_engine(self) -> bool:
+        """Return True if operations should run on the async engine."""
+        return bool(self.spec["protocol"].get("asyncEngine", False))
+
+    def _run_async(self, operation: str, *args: Any) -> Any:
+        """Run an operation on the async engine, and wait for it to finish.
+
+        Args:
+            operation (str): The name of the AsyncSharepointEngine method to run.
+            *args: The arguments for the method.
+
+        Returns:
+            Any: The result of the operation.
+        """
+        try:
+            # httpx is an optional dependency, only needed for the async engine
+            from .sharepoint_async import (  # pylint: disable=import-outside-toplevel
+                AsyncSharepointEngine,
+            )
+        except ImportError as e:
+            raise RemoteTransferError(
+                "asyncEngine requires httpx. Install otf-addons-o365[async] to use it"
+            ) from e
+
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        # Bootstrap before starting the event loop, rather than blocking it
+        self._bootstrap()
+
+        async def run() -> Any:
+            async with AsyncSharepointEngine(self) as engine:
+                return await getattr(engine, operation)(*args)
+
+        return asyncio.run(run())
+
     def supports_direct_transfer(self) -> bool:
-        """Return False, as all files should go via the worker."""
-        return False
+        """Return True, as Sharepoint can copy files between sites itself.
+
+        This can be turned off with serverSideCopy, so that files always go via the
+        worker (e.g. so they can be encrypted). OTF doesn't say what the destination
+        is, so transfer_files streams files through the worker instead when it
+        can't copy them to it.
+        """
+        return bool(
+            self.spec["protocol"].get("serverSideCopy", True)
+            and "encryption" not in self.spec
+        )
 
     def create_folder(self, parent_id: str | None, folder: str) -> str:
         """Create a folder and return its ID.
@@ -209,6 +803,7 @@ class SharepointTransfer(RemoteTransferHandler):
         self.logger.info(f"Successfully created folder: {folder}")
         return str(response.json().get("id"))
 
+    @timed_phase("post_copy")
     def handle_post_copy_action(self, files: dict) -> int:
         """Handle the post copy action specified in the config.
 
@@ -218,19 +813,22 @@ class SharepointTransfer(RemoteTransferHandler):
         Returns:
             int: 0 if successful, 1 if not.
         """
+        if self._use_async_engine():
+            return int(self._run_async("handle_post_copy_action", files))
+
         # Check that our creds are valid
         self.validate_or_refresh_creds()
 
         # Determine the action to take
         # Delete the files
         if self.spec["postCopyAction"]["action"] == "delete":
-            self.logger.info(f"Deleting files: {files}")
+            self.logger.info(f"Deleting files: {list(files)}")
             # No way to bulk delete items from Sharepoint (it seems), so remove each individually
             for file_name, attributes in files.items():
                 # Build up file path below site root
                 file_path = f"{attributes['directory']}/{file_name}"
                 # Get the file url and delete
-                file_url = self.get_file_url_from_path(file_path)
+                file_url = self._get_listed_file_url(file_name, attributes)
                 if not file_url:
                     self.logger.error(f"Failed to get file URL for {file_path}")
                     return 1
@@ -242,6 +840,7 @@ class SharepointTransfer(RemoteTransferHandler):
                     },
                     timeout=self.timeout,
                 )
+                self._forget_indexed_item(file_path)
                 if response.status_code != 204:
                     self.logger.error(f"Failed to delete file: {file_name}")
                     self.logger.error(f"Got return code: {response.status_code}")
@@ -255,7 +854,7 @@ class SharepointTransfer(RemoteTransferHandler):
             for file_name, attributes in files.items():
                 # Build up file path below site root
                 file_path = f"{attributes['directory']}/{file_name}"
-                file_url = self.get_file_url_from_path(file_path)
+                file_url = self._get_listed_file_url(file_name, attributes)
                 if not file_url:
                     self.logger.error(f"Failed to get file URL for {file_path}")
                     return 1
@@ -296,6 +895,24 @@ class SharepointTransfer(RemoteTransferHandler):
                     timeout=self.timeout,
                     json=patch_body,
                 )
+                if response.status_code == 404 and self._forget_stale_ids(
+                    destination_path
+                ):
+                    # The destination folder ID may have been stale, so it is
+                    # looked up again
+                    self.logger.info(
+                        f"Destination folder {destination_path} not found, looking"
+                        " it up again"
+                    )
+                    destination_id = self.create_or_get_folder(destination_path)
+                    patch_body["parentReference"] = {"id": f"{destination_id}"}
+                    response = self._request(
+                        "PATCH",
+                        file_url,
+                        headers=patch_headers,
+                        timeout=self.timeout,
+                        json=patch_body,
+                    )
                 if response.status_code == 409:
                     # Target already exists - delete it and retry (unix-style overwrite)
                     self.logger.info(
@@ -335,6 +952,8 @@ class SharepointTransfer(RemoteTransferHandler):
                         timeout=self.timeout,
                         json=patch_body,
                     )
+                self._forget_indexed_item(file_path)
+                self._forget_indexed_item(f"{destination_path}/{new_file}")
                 if response.status_code != 200:
                     self.logger.error(f"Failed to move file: {file_name}")
                     self.logger.error(f"Got return code: {response.status_code}")
@@ -342,6 +961,49 @@ class SharepointTransfer(RemoteTransferHandler):
                     return 1
         return 0
 
+    def _forget_indexed_item(self, item_path: str) -> None:
+        """Remove an item that has moved, or may no longer exist, from the index.
+
+        Args:
+            item_path (str): The path of the item below the site root.
+        """
+        if self._item_index is not None:
+            self._item_index.invalidate(self.site_id, item_path)
+
+    def _forget_stale_ids(self, item_path: str) -> bool:
+        """Drop cached drive and folder IDs after a request using them got a 404.
+
+        IDs from the item index or a shared client can be out of date, e.g. once a
+        document library or folder has been deleted and created again. The drive
+        IDs, the folder IDs, and everything indexed below the first component of
+        the path are dropped, so they are looked up again. This is only done once
+        per handler, so a path that really is missing costs one extra lookup.
+
+        Args:
+            item_path (str): The path the request was for, below the site root.
+
+        Returns:
+            bool: True if the IDs were dropped, so the request is worth retrying.
+        """
+        if self._stale_ids_forgotten or (
+            self._item_index is None and self._client is None
+        ):
+            return False
+        self._stale_ids_forgotten = True
+
+        self._drive_ids = None
+        self._folder_ids = None
+        if self._client is not None:
+            self._client.drive_ids = None
+            self._client.folder_ids = None
+        if self._item_index is not None:
+            self._item_index.invalidate_drives(self.site_id)
+            parts = [part for part in item_path.split("/") if part]
+            if parts:
+                prefix = "/" if item_path.startswith("/") else ""
+                self._item_index.invalidate(self.site_id, f"{prefix}{parts[0]}")
+        return True
+
     def create_or_get_folder(self, destination_path: str) -> str | None:
         """Create a folder if it does not exist and return its ID or get folder ID if it exists.
 
@@ -350,41 +1012,24 @@ class SharepointTransfer(RemoteTransferHandler):
         Returns:
             folder ID or empty string if creation is unsuccessful
         """
+        if self._folder_ids and destination_path.strip("/") in self._folder_ids:
+            return self._folder_ids[destination_path.strip("/")]
+
         folders = destination_path.split("/")
         current_parent = ""
         parent_id = None  # if root folder exists, no need for parent ID
         for folder in folders:
             # build the path depending on if parent exists
             current_path = f"{current_parent}/{folder}" if current_parent else folder
-            # get folder url from current path
-            folder_url = self.get_file_url_from_path(current_path)
-
-            # if folder doesn't exist, create it and get the actual item ID back
-            if folder_url is None:
-                self.logger.info(f"Folder {folder} does not exist, creating")
-                folder_id = self.create_folder(parent_id, folder)
+            indexed = (
+                self._item_index.get(self.site_id, current_path)
+                if self._item_index is not None
+                else None
+            )
+            if indexed is not None:
+                folder_id = str(indexed["item_id"])
             else:
-                # get_file_url_from_path returns a path-based URL, not a drive item ID;
-                # resolve it to the actual item ID so it can be used in parentReference.id
-                response = self._request(
-                    "GET",
-                    folder_url,
-                    headers={
-                        "Authorization": "Bearer " + self.credentials["access_token"],
-                    },
-                    timeout=self.timeout,
-                )
-                if response.status_code == 404:
-                    self.logger.info(f"Folder {folder} does not exist, creating")
-                    folder_id = self.create_folder(parent_id, folder)
-                elif response.status_code == 200:
-                    folder_id = response.json()["id"]
-                else:
-                    self.logger.error(f"Failed to resolve folder: {current_path}")
-                    self.logger.error(response.json())
-                    raise RemoteTransferError(
-                        f"Failed to resolve folder: {current_path}"
-                    )
+                folder_id = self._resolve_folder(parent_id, folder, current_path)
 
             # updating parent info for the next folder in sequence
             current_parent = current_path
@@ -393,90 +1038,464 @@ class SharepointTransfer(RemoteTransferHandler):
             # return the last folder_id in path
         return folder_id
 
-    def list_files(
-        self, directory: str | None = None, file_pattern: str | None = None
-    ) -> dict:
-        """Return list of files that match the source definition.
+    def _resolve_folder(
+        self, parent_id: str | None, folder: str, current_path: str
+    ) -> str:
+        """Return the ID of a folder, creating it if it does not exist.
 
         Args:
-            directory (str, optional): The directory to search in. Defaults to None.
-            file_pattern (str, optional): The file pattern to search for. Defaults to
-            None.
+            parent_id (str): The ID of the parent folder, or None for the root.
+            folder (str): The name of the folder.
+            current_path (str): The path of the folder below the site root.
 
         Returns:
-            dict: A dict of files that match the source definition.
+            str: The ID of the folder. It is added to the item index, if there is one.
         """
-        remote_files = {}
+        etag = None
+        # get folder url from current path
+        folder_url = self.get_file_url_from_path(current_path)
+
+        # if folder doesn't exist, create it and get the actual item ID back
+        if folder_url is None:
+            self.logger.info(f"Folder {folder} does not exist, creating")
+            folder_id = self.create_folder(parent_id, folder)
+        else:
+            # get_file_url_from_path returns a path-based URL, not a drive item ID;
+            # resolve it to the actual item ID so it can be used in parentReference.id
+            response = self._request(
+                "GET",
+                folder_url,
+                headers={
+                    "Authorization": "Bearer " + self.credentials["access_token"],
+                },
+                timeout=self.timeout,
+            )
+            if response.status_code == 404:
+                self.logger.info(f"Folder {folder} does not exist, creating")
+                folder_id = self.create_folder(parent_id, folder)
+            elif response.status_code == 200:
+                folder_id = response.json()["id"]
+                etag = response.json().get("eTag")
+            else:
+                self.logger.error(f"Failed to resolve folder: {current_path}")
+                self.logger.error(response.json())
+                raise RemoteTransferError(f"Failed to resolve folder: {current_path}")
 
-        self.logger.info(
-            f"Listing files in site {self.spec['siteName']} matching"
-            f" {file_pattern} in {directory if directory else '/'}"
-        )
+        if self._item_index is not None:
+            self._item_index.put(self.site_id, current_path, folder_id, etag)
+        return folder_id
 
-        try:  # pylint: disable=too-many-nested-blocks
-            # Build the path, depending if the directory is just "/" or "" or has a full path
-            dest_path = ""
-            if (directory and directory == "/") or not directory:
-                dest_path = "root/children"
-            elif directory:
-                dest_path = f"root:/{directory}:/children"
+    def _get_children_url(self, directory: str | None) -> str:
+        """Return the URL used to list the children of a directory.
 
-            url = f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/{dest_path}"
+        Args:
+            directory (str): The directory, relative to the site root. If it starts
+            with a /, the first component is the name of a document library.
 
-            while True:
-                # Check that our creds are valid
-                self.validate_or_refresh_creds()
-                headers = {
-                    "Authorization": "Bearer " + self.credentials["access_token"],
-                    "Content-Type": "application/json",
-                }
+        Returns:
+            str: The URL of the children collection.
+        """
+        return item_action_url(self._get_folder_url(directory), "children")
 
-                response = self._request(
-                    "GET",
-                    url,
-                    headers=headers,
-                    timeout=self.timeout,
-                ).json()
+    def _get_folder_url(self, directory: str | None) -> str:
+        """Return the URL of a directory's driveItem.
 
-                if "value" in response and response["value"]:
-                    for object_ in response["value"]:
-                        file_name = object_["name"]
+        Args:
+            directory (str): The directory, relative to the site root. If it starts
+            with a /, the first component is the name of a document library.
 
-                        if file_pattern and not re.match(file_pattern, file_name):
-                            continue
+        Returns:
+            str: The URL of the folder.
+        """
+        if not directory or directory == "/":
+            return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/root"
 
-                        # Check that this is a file, and not a directory
-                        if object_.get("folder"):
-                            continue
+        if directory.startswith("/"):
+            path_parts = [part for part in directory.split("/") if part]
+            # Just the document library on its own
+            if len(path_parts) == 1:
+                drive_id = self._get_drive_id(path_parts[0])
+                return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives/{drive_id}/root"
+            return str(self.get_file_url_from_path(directory.rstrip("/")))
 
-                        self.logger.info(f"Found file: {file_name}")
+        return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/root:/{directory}"
 
-                        # Get the size and modified time
-                        last_modified = datetime.strptime(
-                            object_["lastModifiedDateTime"], "%Y-%m-%dT%H:%M:%SZ"
-                        )
-                        size = object_["size"]
+    def _get_folder_tags(self, directory: str | None) -> tuple | None:
+        """Return the eTag and cTag of a directory, which change with its contents.
 
-                        remote_files[file_name] = {
-                            "size": size,
-                            "modified_time": last_modified.timestamp(),
-                            "directory": directory,
-                        }
-                else:
-                    break
+        Args:
+            directory (str): The directory, relative to the site root.
 
-                if response.get("@odata.nextLink"):
-                    url = response["@odata.nextLink"]
-                else:
-                    break
+        Returns:
+            tuple: The eTag and cTag, or None if they couldn't be fetched, or there
+            is no cTag. Graph doesn't always return a cTag for a folder, and its
+            eTag can stay the same when a file in it changes, so the eTag alone
+            can't show that a folder is unchanged.
+        """
+        response = self._request(
+            "GET",
+            f"{self._get_folder_url(directory)}?$select=id,eTag,cTag",
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            self.logger.info(
+                f"Failed to get the eTag of {directory if directory else '/'}, got"
+                f" return code: {response.status_code}"
+            )
+            return None
+        folder = response.json()
+        if not folder.get("cTag"):
+            self.logger.info(
+                f"Got no cTag for {directory if directory else '/'}, so it is listed"
+                " in full"
+            )
+            return None
+        return folder.get("eTag"), folder["cTag"]
 
-        except Exception as e:  # pylint: disable=broad-exception-caught
-            self.logger.error(f"Error listing files in site: {self.spec['siteName']}")
-            self.logger.exception(e)
-            raise e
+    def _get_drive_id(self, library_name: str) -> str:
+        """Return the drive ID of a document library.
 
+        Args:
+            library_name (str): The name of the document library.
+
+        Returns:
+            str: The ID of the drive backing the document library.
+        """
+        drive_ids = self._drive_ids
+        if drive_ids is None and self._item_index is not None:
+            drive_ids = self._item_index.get_drive_ids(self.site_id)
+        # With an index, the library may have been created since it was written
+        if drive_ids is None or (
+            self._item_index is not None and library_name not in drive_ids
+        ):
+            drive_ids = self._fetch_drive_ids()
+        self._drive_ids = drive_ids
+
+        if library_name in drive_ids:
+            return drive_ids[library_name]
+
+        self.logger.error(f"Failed to find document library with name {library_name}")
+        raise RemoteTransferError(
+            f"Failed to find Document Library named {library_name}"
+        )
+
+    def _fetch_drive_ids(self) -> dict[str, str]:
+        """Get the drive ID of each document library in the site.
+
+        Returns:
+            dict: The drive IDs by library name.
+        """
+        # Do a GET request to /sites/{siteId}/drives to get the document
+        # libraries. They are only fetched once
+        response = self._request(
+            "GET",
+            f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives",
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            self.logger.error("Failed to get document libraries")
+            self.logger.error(response.json())
+            raise RemoteTransferError("Failed to get document libraries")
+
+        drive_ids = {
+            document_library["name"]: str(document_library["id"])
+            for document_library in response.json()["value"]
+        }
+        if self._client is not None:
+            self._client.drive_ids = drive_ids
+        if self._item_index is not None:
+            self._item_index.put_drive_ids(self.site_id, drive_ids)
+        return drive_ids
+
+    @timed_phase("list")
+    def list_files(
+        self, directory: str | None = None, file_pattern: str | None = None
+    ) -> dict:
+        """Return list of files that match the source definition.
+
+        Args:
+            directory (str, optional): The directory to search in. Defaults to None.
+            file_pattern (str, optional): The file pattern to search for. Defaults to
+            None.
+
+        Returns:
+            dict: A dict of files that match the source definition.
+        """
+        # A fileWatch on a folder that hasn't changed gets the previous listing again
+        tags = None
+        if self.spec.get("fileWatch", {}).get("changeDetection", False):
+            tags = self._get_folder_tags(directory)
+            previous = (self._folder_listings or {}).get((directory, file_pattern))
+            if tags is not None and previous is not None and previous[0] == tags:
+                self.logger.info(
+                    f"{directory if directory else '/'} is unchanged since it was"
+                    f" last listed, so found the same {len(previous[1])} files"
+                )
+                return _copy_listing(previous[1])
+
+        remote_files = self._list_files(directory, file_pattern)
+
+        if tags is not None:
+            if self._folder_listings is None:
+                self._folder_listings = {}
+            self._folder_listings[(directory, file_pattern)] = (
+                tags,
+                _copy_listing(remote_files),
+            )
+        return remote_files
+
+    def _list_files(self, directory: str | None, file_pattern: str | None) -> dict:
+        """List the files in a directory, as list_files does.
+
+        Args:
+            directory (str): The directory to search in.
+            file_pattern (str): The file pattern to search for.
+
+        Returns:
+            dict: A dict of files that match the source definition.
+        """
+        if self._use_async_engine():
+            return dict(self._run_async("list_files", directory, file_pattern))
+
+        remote_files = {}
+
+        self.logger.info(
+            f"Listing files in site {self.spec['siteName']} matching"
+            f" {file_pattern} in {directory if directory else '/'}"
+        )
+
+        conditions = ListingConditions.from_spec(self.spec)
+        try:
+            url = f"{self._get_children_url(directory)}?$select={self._list_select()}"
+            remote_files = self._list_children(url, directory, file_pattern, conditions)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Error listing files in site: {self.spec['siteName']}")
+            self.logger.exception(e)
+            raise e
+
+        if conditions is not None and conditions.skipped:
+            self.logger.info(
+                f"Skipped {conditions.skipped} files that don't meet the size or age"
+                " conditionals"
+            )
+        self._log_listed_files(remote_files, directory)
         return remote_files
 
+    def _list_select(self) -> str:
+        """Return the driveItem fields to request when listing."""
+        select = LIST_SELECT_FIELDS
+        if self._item_index is not None:
+            select = f"{select},eTag"
+        if self.spec["protocol"].get("directDownload", False):
+            select = f"{select},@microsoft.graph.downloadUrl"
+        return select
+
+    def _list_children(
+        self,
+        url: str,
+        directory: str | None,
+        file_pattern: str | None = None,
+        conditions: ListingConditions | None = None,
+    ) -> dict:
+        """Page through a children collection, returning the files it contains.
+
+        Args:
+            url (str): The URL of the first page of the children collection.
+            directory (str): The directory being listed, stored against each file.
+            file_pattern (str, optional): Only return files matching this regex.
+            conditions (ListingConditions, optional): Only return files meeting
+            these. With a maximum age, the children are listed newest first, and
+            paging stops once they are older than that.
+
+        Returns:
+            dict: A dict of files, in the same format as list_files.
+        """
+        remote_files: dict[str, dict] = {}
+        unordered_url = None
+        if conditions is not None and conditions.newest_first:
+            unordered_url = url
+            url = f"{url}&$orderby={NEWEST_FIRST}"
+        while True:
+            # Check that our creds are valid
+            self.validate_or_refresh_creds()
+            headers = {
+                "Authorization": "Bearer " + self.credentials["access_token"],
+                "Content-Type": "application/json",
+            }
+
+            raw_response = self._request(
+                "GET",
+                url,
+                headers=headers,
+                timeout=self.timeout,
+            )
+            if (
+                raw_response.status_code == 404
+                and not remote_files
+                and directory
+                and directory.startswith("/")
+                and self._forget_stale_ids(directory)
+            ):
+                # The document library's drive ID may have been stale
+                self.logger.info(
+                    f"{directory} not found, looking up its document library again"
+                )
+                return self._list_children(
+                    f"{self._get_children_url(directory)}?$select={self._list_select()}",
+                    directory,
+                    file_pattern,
+                    conditions,
+                )
+            response = raw_response.json()
+
+            if (
+                "error" in response
+                and unordered_url is not None
+                and conditions is not None
+            ):
+                # Not every library can be ordered by lastModifiedDateTime
+                self.logger.info(
+                    "Failed to list files newest first, listing them in the default"
+                    " order"
+                )
+                conditions.in_order = False
+                url, unordered_url = unordered_url, None
+                continue
+            unordered_url = None
+
+            if "value" in response and response["value"]:
+                self._add_listed_files(
+                    response["value"], directory, file_pattern, remote_files, conditions
+                )
+            else:
+                break
+
+            if conditions is not None and conditions.window_passed(response["value"]):
+                self.logger.info(
+                    f"Stopped listing at files older than {conditions.max_age} secs"
+                )
+                break
+
+            if response.get("@odata.nextLink"):
+                url = response["@odata.nextLink"]
+            else:
+                break
+
+        return remote_files
+
+    def _add_listed_files(
+        self,
+        items: list[dict],
+        directory: str | None,
+        file_pattern: str | None,
+        remote_files: dict,
+        conditions: ListingConditions | None = None,
+    ) -> None:
+        """Add the files from a page of driveItems to the listing.
+
+        Args:
+            items (list): The driveItems from one page of a children collection.
+            directory (str): The directory being listed, stored against each file.
+            file_pattern (str, optional): Only add files matching this regex.
+            remote_files (dict): The listing to add the files to.
+            conditions (ListingConditions, optional): Only add files meeting these.
+        """
+        if self._item_index is not None:
+            self._index_listed_items(items, directory)
+
+        # Compiled once for the page, rather than looked up for every file
+        match = re.compile(file_pattern).match if file_pattern else None
+        log_files = self.logger.isEnabledFor(logging.DEBUG)
+        download_url_expiry = time() + DOWNLOAD_URL_LIFETIME
+
+        for object_ in items:
+            file_name = object_["name"]
+
+            if match is not None and not match(file_name):
+                continue
+
+            # Check that this is a file, and not a directory
+            if object_.get("folder"):
+                continue
+
+            # Get the size and modified time
+            modified_time = parse_modified_time(object_["lastModifiedDateTime"])
+            size = object_["size"]
+            if conditions is not None and not conditions.accepts(size, modified_time):
+                continue
+
+            if log_files:
+                self.logger.debug(f"Found file: {file_name}")
+
+            # Later operations on the file address it by its IDs, when they're known
+            drive_id = object_.get("parentReference", {}).get("driveId")
+            item_id = object_.get("id")
+            # Only returned when directDownload asks for it
+            download_url = object_.get("@microsoft.graph.downloadUrl")
+            remote_files[file_name] = ListedFile(
+                size,
+                modified_time,
+                directory,
+                drive_id=drive_id if drive_id and item_id else None,
+                item_id=item_id if drive_id and item_id else None,
+                quick_xor_hash=(
+                    object_.get("file", {}).get("hashes", {}).get("quickXorHash")
+                    or None
+                ),
+                download_url=download_url or None,
+                download_url_expiry=download_url_expiry,
+            )
+
+    def _log_listed_files(self, remote_files: dict, directory: str | None) -> None:
+        """Log what a listing found, naming the first few files.
+
+        Args:
+            remote_files (dict): The files found.
+            directory (str): The directory that was listed.
+        """
+        names = list(itertools.islice(remote_files, LOGGED_FILE_NAMES))
+        found = f"Found {len(remote_files)} files in {directory if directory else '/'}"
+        if len(remote_files) > len(names):
+            self.logger.info(
+                f"{found}, including: {', '.join(names)}, and"
+                f" {len(remote_files) - len(names)} more"
+            )
+        elif names:
+            self.logger.info(f"{found}: {', '.join(names)}")
+        else:
+            self.logger.info(found)
+
+    def _index_listed_items(self, items: list[dict], directory: str | None) -> None:
+        """Add every file and folder from a page of driveItems to the item index.
+
+        Args:
+            items (list): The driveItems from one page of a children collection.
+            directory (str): The directory being listed.
+        """
+        rows = []
+        for item in items:
+            if not item.get("id"):
+                continue
+            modified = None
+            if not item.get("folder") and item.get("lastModifiedDateTime"):
+                modified = parse_modified_time(item["lastModifiedDateTime"])
+            rows.append(
+                (
+                    posixpath.join((directory or "").rstrip("/"), item["name"]),
+                    item["id"],
+                    item.get("eTag"),
+                    None if item.get("folder") else item.get("size"),
+                    modified,
+                )
+            )
+        self._item_index.put_many(self.site_id, rows)  # type: ignore[union-attr]
+
     def move_files_to_final_location(self, files: list[str]) -> None:
         """Not implemented for this handler."""
         raise NotImplementedError
@@ -486,6 +1505,7 @@ class SharepointTransfer(RemoteTransferHandler):
         """Not implemented for this handler."""
         raise NotImplementedError
 
+    @timed_phase("upload")
     def push_files_from_worker(
         self, local_staging_directory: str, file_list: dict | None = None
     ) -> int:
@@ -499,6 +1519,18 @@ class SharepointTransfer(RemoteTransferHandler):
         Returns:
             int: 0 if successful, 1 if not.
         """
+        # Recursive and fan-out uploads always use the threaded upload
+        if (
+            self._use_async_engine()
+            and not self.spec.get("recursive")
+            and self._fan_out is None
+        ):
+            return int(
+                self._run_async(
+                    "push_files_from_worker", local_staging_directory, file_list
+                )
+            )
+
         # Check that our creds are valid
         self.validate_or_refresh_creds()
 
@@ -506,96 +1538,550 @@ class SharepointTransfer(RemoteTransferHandler):
 
         if file_list:
             files = list(file_list.keys())
+        elif self.spec.get("recursive"):
+            files = [
+                file
+                for file in glob.glob(f"{local_staging_directory}/**/*", recursive=True)
+                if path.isfile(file)
+            ]
         else:
             files = glob.glob(f"{local_staging_directory}/*")
 
+        if self.spec.get("recursive"):
+            return self._push_tree(local_staging_directory, files)
+
+        # In sync mode, list the destination once up front, so files that are
+        # already there can be skipped
+        remote_files = None
+        if "sync" in self.spec:
+            remote_files = self.list_files(self.spec.get("directory"))
+            self.sync_stats = {"uploaded": 0, "skipped": 0, "bytes_saved": 0}
+
+        # Files already uploaded to another destination are copied from there
+        copies: list[tuple[str, str, Upload]] = []
+        if self._fan_out is not None:
+            self.fan_out_stats = {"uploaded": 0, "copied": 0, "failed": 0}
+
         for file in files:
             # Strip the directory from the file
             file_name = file.split("/")[-1]
 
             # Handle any rename that might be specified in the spec
             if "rename" in self.spec:
-                rename_regex = self.spec["rename"]["pattern"]
-                rename_sub = self.spec["rename"]["sub"]
-
-                file_name = re.sub(rename_regex, rename_sub, file_name)
+                file_name = self._rename(file_name)
                 self.logger.info(f"Renaming file to {file_name}")
 
+            if remote_files is not None:
+                if self._is_unchanged(file, remote_files.get(file_name)):
+                    self.logger.info(
+                        f"Skipping file: {file} as {file_name} is already up to date"
+                    )
+                    self.sync_stats["skipped"] += 1
+                    self.sync_stats["bytes_saved"] += path.getsize(file)
+                    continue
+
             # Append a directory if one is defined
             if "directory" in self.spec:
                 file_name = f"{self.spec['directory']}/{file_name}"
 
-            file_url = self.get_file_url_from_path(file_name)
+            if self._fan_out is not None:
+                upload = self._fan_out.find_upload(
+                    file, self.spec["protocol"]["tenantId"]
+                )
+                if upload is not None and upload.handler is not self:
+                    copies.append((file, file_name, upload))
+                    continue
+
+            if self._upload_and_record(file, file_name) != 0:
+                result = 1
+            elif remote_files is not None:
+                self.sync_stats["uploaded"] += 1
+
+        if copies and self._copy_fanned_out_files(copies) != 0:
+            result = 1
 
+        if self._fan_out is not None:
+            destination = (
+                f"{self.spec['siteHostname']}/{self.spec['siteName']}"
+                f"/{self.spec.get('directory', '')}"
+            )
+            with self._fan_out.lock:
+                self._fan_out.results[destination] = dict(self.fan_out_stats)
             self.logger.info(
-                f"Uploading file: {file} to site {self.spec['siteName']} with path: {file_name}"
+                f"Fan-out to {destination}: uploaded"
+                f" {self.fan_out_stats['uploaded']} files, copied"
+                f" {self.fan_out_stats['copied']} server side,"
+                f" {self.fan_out_stats['failed']} failed"
             )
 
-            # Uploads should use an upload session if the file is > 200MB in size
-            # Determine size of the file
-            file_size = path.getsize(file)
-            if file_size > 200000000:
-                if self._do_upload_session(file, file_name) != 0:
-                    result = 1
-                # Skip the standard upload logic below, since large file uploads are fully handled by _do_upload_session().
+        if remote_files is not None:
+            self.logger.info(
+                f"Sync complete. Uploaded {self.sync_stats['uploaded']} files, skipped"
+                f" {self.sync_stats['skipped']} unchanged files, saving"
+                f" {self.sync_stats['bytes_saved']} bytes"
+            )
+
+        return result
+
+    def _upload_and_record(self, file: str, file_name: str) -> int:
+        """Upload a file, recording it for the task's other destinations.
+
+        Args:
+            file (str): The local file to upload.
+            file_name (str): The path to upload the file to, below the site root.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        result = self._timed_file(
+            "upload", file_name, path.getsize(file), self._upload_file, file, file_name
+        )
+        if self._fan_out is not None:
+            if result == 0:
+                self._fan_out.record_upload(file, self, file_name)
+                self.fan_out_stats["uploaded"] += 1
+            else:
+                self.fan_out_stats["failed"] += 1
+        return result
+
+    def _copy_fanned_out_files(self, copies: list[tuple[str, str, Upload]]) -> int:
+        """Copy files server side from where another destination uploaded them.
+
+        Copies are started by the handler that uploaded each file, into this
+        destination's folder. Any that can't be started, or fail, are uploaded
+        from the worker instead.
+
+        Args:
+            copies (list): The local file, the path to copy it to below the site
+            root, and the earlier upload, for each file.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        try:
+            parent_reference = self.get_folder_reference(self.spec.get("directory", ""))
+        except RemoteTransferError as e:
+            self.logger.error("Failed to resolve destination folder")
+            self.logger.exception(e)
+            parent_reference = None
+
+        # The copies are started with the credentials of the uploading handlers
+        uploaders = {id(upload.handler): upload.handler for *_, upload in copies}
+        for uploader in uploaders.values():
+            uploader.validate_or_refresh_creds()
+
+        monitors = {}
+        for _, file_name, upload in copies:
+            monitor_url = (
+                upload.handler._start_copy(  # pylint: disable=protected-access
+                    upload.remote_path,
+                    parent_reference,
+                    posixpath.basename(file_name),
+                )
+                if parent_reference is not None
+                else None
+            )
+            if monitor_url is not None:
+                monitors[file_name] = monitor_url
+
+        failed = set(self._wait_for_copies(monitors, {}))
+        result = 0
+        for file, file_name, _ in copies:
+            if file_name in monitors and file_name not in failed:
+                self.fan_out_stats["copied"] += 1
                 continue
+            self.logger.info(f"Uploading {file_name} from the worker instead")
+            if self._upload_and_record(file, file_name) != 0:
+                result = 1
+        return result
 
-            # Otherwise do a normal upload
-            upload_url = f"{file_url}:/content"
-            self.logger.info(f"Using upload url: {upload_url}")
-            with open(file, "rb") as f:
-                max_retries = 5
-                retry_delay = 1
+    def _rename(self, file_name: str) -> str:
+        """Apply the rename from the spec, if there is one, to a file name.
 
-                for attempt in range(max_retries):
-                    response = self._request(
-                        "PUT",
-                        upload_url,
-                        headers={
-                            "Authorization": (
-                                "Bearer " + self.credentials["access_token"]
+        Args:
+            file_name (str): The name of the file being uploaded.
+
+        Returns:
+            str: The name to upload the file as.
+        """
+        if "rename" not in self.spec:
+            return file_name
+        return re.sub(
+            self.spec["rename"]["pattern"], self.spec["rename"]["sub"], file_name
+        )
+
+    def _push_tree(self, local_staging_directory: str, files: list[str]) -> int:
+        """Upload files, mirroring their directory structure below the directory.
+
+        Remote folders are resolved (and created where missing) one depth at a time,
+        with all of the folders at the same depth handled concurrently. The files are
+        then uploaded concurrently, directly into the resolved folder IDs.
+
+        Args:
+            local_staging_directory (str): The local directory the tree is rooted at.
+            files (list): The local files to upload.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        base_directory = self.spec.get("directory", "")
+
+        # Work out which remote folder, and name, each file is uploaded to
+        uploads = []
+        folders_by_depth: dict[int, set[str]] = {}
+        for file in files:
+            relative_path = path.relpath(file, local_staging_directory).replace(
+                path.sep, "/"
+            )
+            relative_folder, file_name = posixpath.split(relative_path)
+
+            # Handle any rename that might be specified in the spec
+            file_name = self._rename(file_name)
+
+            uploads.append((file, relative_folder, file_name))
+
+            parts = relative_folder.split("/") if relative_folder else []
+            for depth in range(1, len(parts) + 1):
+                folders_by_depth.setdefault(depth, set()).add("/".join(parts[:depth]))
+
+        self.logger.info(
+            f"Uploading {len(uploads)} files in"
+            f" {sum(len(folders) for folders in folders_by_depth.values())} folders to"
+            f" site {self.spec['siteName']} below {base_directory or '/'}"
+        )
+
+        with ThreadPoolExecutor(
+            max_workers=self.spec["protocol"].get("maxConcurrency", 4)
+        ) as executor:
+            try:
+                folder_ids: dict[str, str | None] = {
+                    "": (
+                        self.create_or_get_folder(base_directory)
+                        if base_directory
+                        else None
+                    )
+                }
+                for depth in sorted(folders_by_depth):
+                    folders = sorted(folders_by_depth[depth])
+                    self.logger.info(
+                        f"Resolving {len(folders)} folders at depth {depth}"
+                    )
+                    folder_ids.update(
+                        zip(
+                            folders,
+                            executor.map(
+                                lambda folder: self._get_or_create_folder(
+                                    folder_ids[posixpath.dirname(folder)],
+                                    posixpath.basename(folder),
+                                ),
+                                folders,
                             ),
-                            "Content-Type": "application/json",
-                        },
-                        data=f,
-                        timeout=self.timeout,
+                        )
                     )
-                    if response.status_code != 409:
-                        break
-                    if attempt < max_retries - 1:
-                        sleep_time = retry_delay * (2**attempt)
-                        self.logger.info(
-                            f"Got 409 error from API. Sleeping for {sleep_time} seconds before retrying. Attempt {attempt} of {max_retries}"
+
+                # In sync mode, list each folder that files are going to
+                remote_files: dict[str, dict] | None = None
+                if "sync" in self.spec:
+                    self.sync_stats = {"uploaded": 0, "skipped": 0, "bytes_saved": 0}
+                    target_folders = sorted({upload[1] for upload in uploads})
+                    remote_files = dict(
+                        zip(
+                            target_folders,
+                            executor.map(
+                                lambda folder: self._list_children(
+                                    f"{self._get_item_url(folder_ids[folder])}"
+                                    f"/children?$select={LIST_SELECT_FIELDS}",
+                                    posixpath.join(base_directory, folder),
+                                ),
+                                target_folders,
+                            ),
                         )
-                        sleep(sleep_time)
-                else:
-                    self.logger.error(
-                        f"Failed to upload file after {max_retries} attempts due to 409 error"
                     )
+            except RemoteTransferError as e:
+                self.logger.error("Failed to resolve destination folders")
+                self.logger.exception(e)
+                return 1
 
-                # Check the response was a success
-                if response.status_code not in (200, 201):
-                    self.logger.error(f"Failed to upload file: {file}")
-                    self.logger.error(f"Got return code: {response.status_code}")
-                    self.logger.error(response.json())
-                    result = 1
-                else:
+            pending = []
+            for file, relative_folder, file_name in uploads:
+                if remote_files is not None and self._is_unchanged(
+                    file, remote_files[relative_folder].get(file_name)
+                ):
                     self.logger.info(
-                        f"Successfully uploaded file to: {response.json()['webUrl']}"
+                        f"Skipping file: {file} as {file_name} is already up to date"
+                    )
+                    self.sync_stats["skipped"] += 1
+                    self.sync_stats["bytes_saved"] += path.getsize(file)
+                    continue
+
+                remote_path = "/".join(
+                    part
+                    for part in (base_directory, relative_folder, file_name)
+                    if part
+                )
+                pending.append(
+                    executor.submit(
+                        self._timed_file,
+                        "upload",
+                        remote_path,
+                        path.getsize(file),
+                        self._upload_to_folder,
+                        file,
+                        folder_ids[relative_folder],
+                        file_name,
+                        remote_path,
                     )
+                )
 
-        return result
+            results = [future.result() for future in pending]
 
-    def _do_upload_session(self, file: str, file_name: str) -> int:
-        """Upload a file using an upload session.
+        if remote_files is not None:
+            self.sync_stats["uploaded"] = results.count(0)
+            self.logger.info(
+                f"Sync complete. Uploaded {self.sync_stats['uploaded']} files, skipped"
+                f" {self.sync_stats['skipped']} unchanged files, saving"
+                f" {self.sync_stats['bytes_saved']} bytes"
+            )
+
+        return 1 if any(results) else 0
+
+    def _get_item_url(self, item_id: str | None) -> str:
+        """Return the URL of a drive item, given its ID.
 
         Args:
-            file (str): The file to upload.
-            file_name (str): The name of the file to upload.
+            item_id (str): The ID of the item, or None for the root folder.
+
+        Returns:
+            str: The URL of the item.
+        """
+        if item_id is None:
+            return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/root"
+        return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/items/{item_id}"
+
+    def _get_or_create_folder(self, parent_id: str | None, folder: str) -> str:
+        """Return the ID of a folder within a parent folder, creating it if needed.
+
+        Args:
+            parent_id (str): The ID of the parent folder, or None for the root.
+            folder (str): The name of the folder.
+
+        Returns:
+            str: The ID of the folder.
+        """
+        response = self._request(
+            "GET",
+            f"{self._get_item_url(parent_id)}:/{folder}",
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code == 200:
+            return str(response.json()["id"])
+        if response.status_code == 404:
+            self.logger.info(f"Folder {folder} does not exist, creating")
+            return self.create_folder(parent_id, folder)
+
+        self.logger.error(f"Failed to resolve folder: {folder}")
+        self.logger.error(response.json())
+        raise RemoteTransferError(f"Failed to resolve folder: {folder}")
+
+    def _upload_to_folder(
+        self, file: str, folder_id: str | None, file_name: str, remote_path: str
+    ) -> int:
+        """Upload a single file into a folder that has already been resolved.
+
+        Args:
+            file (str): The local file to upload.
+            folder_id (str): The ID of the folder to upload into, or None for the root.
+            file_name (str): The name to give the file.
+            remote_path (str): The full path of the file, below the site root.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        self.logger.info(
+            f"Uploading file: {file} to site {self.spec['siteName']} with path: {remote_path}"
+        )
+        file_size = path.getsize(file)
+        with self._track("upload", remote_path, file_size) as progress:
+            if file_size > 200000000:
+                return self._do_upload_session(file, remote_path, progress)
+
+            return self._do_simple_upload(
+                file, f"{self._get_item_url(folder_id)}:/{file_name}", progress
+            )
+
+    def _is_unchanged(self, file: str, remote_attributes: dict | None) -> bool:
+        """Determine whether the remote copy of a file is identical to the local one.
+
+        Args:
+            file (str): The local file.
+            remote_attributes (dict): The attributes of the remote file, as returned
+            by list_files, or None if there is no remote file.
+
+        Returns:
+            bool: True if the file does not need to be uploaded.
+        """
+        if not remote_attributes:
+            return False
+
+        if path.getsize(file) != remote_attributes["size"]:
+            return False
+
+        # If asked to, compare the content itself, rather than relying on timestamps
+        if self.spec["sync"].get("compareHash", False):
+            remote_hash = remote_attributes.get("quick_xor_hash")
+            return bool(remote_hash) and quickxorhash_file(file) == remote_hash
+
+        # Otherwise the remote copy is current if it was written after the local
+        # file was last modified
+        return bool(remote_attributes["modified_time"] >= path.getmtime(file))
+
+    def _upload_file(self, file: str, file_name: str) -> int:
+        """Upload a single file.
+
+        Args:
+            file (str): The local file to upload.
+            file_name (str): The path to upload the file to, below the site root.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        file_url = self.get_file_url_from_path(file_name)
+
+        self.logger.info(
+            f"Uploading file: {file} to site {self.spec['siteName']} with path: {file_name}"
+        )
+
+        # Uploads should use an upload session if the file is > 200MB in size
+        # Determine size of the file
+        file_size = path.getsize(file)
+        with self._track("upload", file_name, file_size) as progress:
+            if file_size > 200000000:
+                return self._do_upload_session(file, file_name, progress)
+
+            # Otherwise do a normal upload
+            return self._do_simple_upload(file, file_url, progress)
+
+    def _do_simple_upload(
+        self, file: str, file_url: str | None, progress: FileProgress | None = None
+    ) -> int:
+        """Upload a file with a single PUT request.
+
+        Args:
+            file (str): The local file to upload.
+            file_url (str): The item URL to upload the file to.
+            progress (FileProgress, optional): Updated as the file is sent.
 
         Returns:
             int: 0 if successful, 1 if not.
         """
+        upload_url = f"{file_url}:/content"
+        self.logger.info(f"Using upload url: {upload_url}")
+        file_size = path.getsize(file)
+        with open(file, "rb") as f:
+            max_retries = 5
+            retry_delay = 1
+
+            for attempt in range(max_retries):
+                # Hash the file as requests streams it, starting again for each attempt
+                f.seek(0)
+                hasher = BackgroundHasher()
+                if progress is not None:
+                    progress.restart()
+                response = self._request(
+                    "PUT",
+                    upload_url,
+                    headers={
+                        "Authorization": "Bearer " + self.credentials["access_token"],
+                        "Content-Type": "application/json",
+                    },
+                    data=HashingReader(
+                        f,
+                        hasher,
+                        file_size,
+                        on_read=progress.update if progress is not None else None,
+                    ),
+                    timeout=self.timeout,
+                )
+                if response.status_code != 409:
+                    break
+                if attempt < max_retries - 1:
+                    sleep_time = retry_delay * (2**attempt)
+                    self.logger.info(
+                        f"Got 409 error from API. Sleeping for {sleep_time} seconds before retrying. Attempt {attempt} of {max_retries}"
+                    )
+                    sleep(sleep_time)
+            else:
+                self.logger.error(
+                    f"Failed to upload file after {max_retries} attempts due to 409 error"
+                )
+
+        # Check the response was a success
+        if response.status_code not in (200, 201):
+            self.logger.error(f"Failed to upload file: {file}")
+            self.logger.error(f"Got return code: {response.status_code}")
+            self.logger.error(response.json())
+            return 1
+
+        if not self._verify_hash(file, hasher, response.json()):
+            return 1
+
+        self.logger.info(f"Successfully uploaded file to: {response.json()['webUrl']}")
+        return 0
+
+    def _verify_hash(
+        self,
+        file_name: str,
+        hasher: QuickXorHash | BackgroundHasher,
+        item: dict | str | None,
+    ) -> bool:
+        """Compare a locally computed hash against the one stored by Sharepoint.
+
+        Args:
+            file_name (str): The name of the file, for logging.
+            hasher (QuickXorHash | BackgroundHasher): The hash computed from the
+            transferred bytes.
+            item (dict | str): Either the driveItem returned by the Graph API, or the
+            quickXorHash value itself.
+
+        Returns:
+            bool: False if the hashes differ, True if they match, verification is
+            disabled, or Sharepoint did not report a hash.
+        """
+        if not self.spec["protocol"].get("verifyHash", True):
+            return True
+
+        remote_hash = item
+        if isinstance(item, dict):
+            remote_hash = item.get("file", {}).get("hashes", {}).get("quickXorHash")
+
+        if not remote_hash:
+            self.logger.debug(f"No quickXorHash returned for {file_name}")
+            return True
+
+        local_hash = hasher.base64digest()
+        if local_hash != remote_hash:
+            self.logger.error(
+                f"quickXorHash mismatch for {file_name}: local {local_hash}, remote"
+                f" {remote_hash}"
+            )
+            return False
+
+        self.logger.debug(f"quickXorHash verified for {file_name}: {local_hash}")
+        return True
+
+    def _create_upload_session(self, file_name: str) -> tuple[str | None, str | None]:
+        """Create an upload session for a file.
+
+        Args:
+            file_name (str): The path of the file to upload, below the site root.
+
+        Returns:
+            tuple: The upload URL for the session (None if it could not be created),
+            and the URL of the existing file (None if it does not already exist).
+        """
         # To perform an upload session correctly, we need to:
         # 1. Determine if the file already exists
         # 2. If it does, get the parent item id
@@ -617,29 +2103,153 @@ class SharepointTransfer(RemoteTransferHandler):
             self.logger.info(f"File {file_name} already exists. Replacing file.")
             upload_session_url = f"{file_url}:/createUploadSession"
 
-        response = self._request(
-            "POST",
-            upload_session_url,
-            headers={
-                "Authorization": "Bearer " + self.credentials["access_token"],
-                "Content-Type": "application/json",
-            },
-            timeout=self.timeout,
-        )
-        if response.status_code != 200:
-            self.logger.error(f"Failed to create upload session: {file_name}")
+        response = self._request(
+            "POST",
+            upload_session_url,
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+                "Content-Type": "application/json",
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            self.logger.error(f"Failed to create upload session: {file_name}")
+            self.logger.error(f"Got return code: {response.status_code}")
+            self.logger.error(response.json())
+            return None, file_url
+
+        # Get the upload session id
+        upload_session_url = response.json()["uploadUrl"]
+        self.logger.info(
+            f"Created upload session: {upload_session_url} for file: {file_name}"
+        )
+
+        return upload_session_url, file_url
+
+    @timed_phase("upload")
+    def upload_stream(
+        self,
+        data: Iterable[bytes] | IO[bytes],
+        file_name: str,
+        size: int | None = None,
+    ) -> int:
+        """Upload data to Sharepoint without it needing to be in a local file.
+
+        The data is sent through an upload session as it is read, so it can be
+        generated on the fly, or piped straight from another handler (e.g. a
+        DownloadStream from another Sharepoint site). The directory and any rename in
+        the spec are applied to the file name, as with push_files_from_worker.
+
+        Args:
+            data (Iterable[bytes] | IO[bytes]): An iterable of byte chunks of any
+            size, or a file-like object. Neither needs to be seekable.
+            file_name (str): The name of the file to create.
+            size (int, optional): The total size of the data, if known. Without it,
+            the total is only sent with the final chunk.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        # Check that our creds are valid
+        self.validate_or_refresh_creds()
+
+        # Handle any rename that might be specified in the spec
+        file_name = self._rename(file_name)
+        # Append a directory if one is defined
+        if "directory" in self.spec:
+            file_name = f"{self.spec['directory']}/{file_name}"
+
+        self.logger.info(
+            f"Uploading stream to site {self.spec['siteName']} with path: {file_name}"
+        )
+
+        with self._track("upload", file_name, size) as progress:
+            hasher = BackgroundHasher()
+            chunks = iter_upload_chunks(data, STREAM_UPLOAD_CHUNK_SIZE)
+            first_chunk, is_last = next(chunks)
+
+            # Anything that fits in a single chunk doesn't need an upload session
+            if is_last:
+                hasher.update(first_chunk)
+                response = self._request(
+                    "PUT",
+                    f"{self.get_file_url_from_path(file_name)}:/content",
+                    headers={
+                        "Authorization": "Bearer " + self.credentials["access_token"],
+                    },
+                    data=first_chunk,
+                    timeout=self.spec["protocol"].get("largeFileUploadTimeout", 300),
+                )
+                if progress is not None:
+                    progress.update(len(first_chunk))
+            else:
+                upload_session_url, _ = self._create_upload_session(file_name)
+                if upload_session_url is None:
+                    return 1
+
+                offset = 0
+                for chunk, is_last in itertools.chain([(first_chunk, False)], chunks):
+                    hasher.update(chunk)
+                    chunk_end = offset + len(chunk) - 1
+                    total = (
+                        chunk_end + 1
+                        if is_last
+                        else (size if size is not None else "*")
+                    )
+                    chunk_range = f"bytes {offset}-{chunk_end}/{total}"
+                    self.logger.debug(f"Content-Range: {chunk_range}")
+
+                    response = self._request(
+                        "PUT",
+                        upload_session_url,
+                        data=chunk,
+                        headers={
+                            "Content-Range": chunk_range,
+                            "Authorization": "Bearer "
+                            + self.credentials["access_token"],
+                        },
+                        timeout=self.spec["protocol"].get(
+                            "largeFileUploadTimeout", 300
+                        ),
+                    )
+                    if response.status_code not in (202, 201, 200):
+                        break
+                    if progress is not None:
+                        progress.update(len(chunk))
+                    offset = chunk_end + 1
+
+        if response.status_code not in (200, 201):
+            self.logger.error(f"Failed to upload stream: {file_name}")
             self.logger.error(f"Got return code: {response.status_code}")
             self.logger.error(response.json())
             return 1
 
-        # Get the upload session id
-        upload_session_url = response.json()["uploadUrl"]
-        self.logger.info(
-            f"Created upload session: {upload_session_url} for file: {file_name}"
-        )
+        if not self._verify_hash(file_name, hasher, response.json()):
+            return 1
+
+        self.logger.info(f"Successfully uploaded {hasher.length} bytes to: {file_name}")
+        return 0
+
+    def _do_upload_session(
+        self, file: str, file_name: str, progress: FileProgress | None = None
+    ) -> int:
+        """Upload a file using an upload session.
+
+        Args:
+            file (str): The file to upload.
+            file_name (str): The name of the file to upload.
+            progress (FileProgress, optional): Updated as each chunk is sent.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        upload_session_url, file_url = self._create_upload_session(file_name)
+        if upload_session_url is None:
+            return 1
 
         # Now PUT the file to the upload session url, split the file into 50MB chunks
         # headers for each chunk need to indicate the Content-Range and Content-Length
+        hasher = BackgroundHasher()
         with open(file, "rb") as f:
 
             # Determine the number of chunks
@@ -647,15 +2257,9 @@ class SharepointTransfer(RemoteTransferHandler):
             chunk_size_max = 50000000
             num_chunks = math.ceil(file_size / chunk_size_max)
 
-            for i in range(num_chunks):
-                # Get the range of the chunk
-                chunk_start = i * chunk_size_max
-                chunk_end = (i + 1) * chunk_size_max - 1
-
-                if i == num_chunks - 1:
-                    if chunk_end >= file_size:
-                        chunk_end = file_size - 1
-
+            for i, (chunk_start, chunk_end) in enumerate(
+                iter_chunk_ranges(file_size, chunk_size_max)
+            ):
                 chunk_range = f"bytes {chunk_start}-{chunk_end}/{file_size}"
                 self.logger.debug(f"Content-Range: {chunk_range}")
 
@@ -668,6 +2272,7 @@ class SharepointTransfer(RemoteTransferHandler):
 
                 # Read the chunk from the file
                 chunk = f.read(chunk_end - chunk_start + 1)
+                hasher.update(chunk)
 
                 # PUT the chunk to the upload session url
                 response = self._request(
@@ -684,11 +2289,15 @@ class SharepointTransfer(RemoteTransferHandler):
                     self.logger.error(f"Got return code: {response.status_code}")
                     self.logger.error(response.json())
                     return 1
+                if progress is not None:
+                    progress.update(len(chunk))
 
                 # If it's a 201, then we are done with the upload
                 if response.status_code == 201 or (
                     response.status_code == 200 and file_url is not None
                 ):
+                    if not self._verify_hash(file_name, hasher, response.json()):
+                        return 1
                     self.logger.info(
                         f"Successfully uploaded file. File ID: {response.json()['id']}"
                     )
@@ -699,6 +2308,7 @@ class SharepointTransfer(RemoteTransferHandler):
 
         return 0
 
+    @timed_phase("download")
     def pull_files_to_worker(self, files: dict, local_staging_directory: str) -> int:
         """Pull files to the worker.
 
@@ -712,66 +2322,576 @@ class SharepointTransfer(RemoteTransferHandler):
         Returns:
             int: 0 if successful, 1 if not.
         """
+        if self._use_async_engine():
+            return int(
+                self._run_async("pull_files_to_worker", files, local_staging_directory)
+            )
+
         # Check that our creds are valid
         self.validate_or_refresh_creds()
 
         result = 0
         for file_name, attributes in files.items():
-            # Build up file path below site root
-            file_path = f"{attributes['directory']}/{file_name}"
-
-            try:
-                # Get the item url based on source path
-                file_url = self.get_file_url_from_path(file_path)
-                # Download file using item url
-                self.logger.info(f"Downloading file: {file_name}")
-                download_url = f"{file_url}:/content"
-                response = self._request(
-                    "GET",
-                    download_url,
-                    headers={
-                        "Authorization": "Bearer " + self.credentials["access_token"],
-                    },
-                    timeout=self.timeout,
+            if (
+                self._timed_file(
+                    "download",
+                    file_name,
+                    attributes.get("size"),
+                    self._download_file,
+                    file_name,
+                    attributes,
+                    local_staging_directory,
                 )
-
-                # Check the response was a success
-                if response.status_code not in (200, 201):
-                    self.logger.error(f"Failed to download file: {file_name}")
-                    self.logger.error(f"Got return code: {response.status_code}")
-                    self.logger.error(response.json())
-                    result = 1
-                else:
-                    local_file_name = f"{local_staging_directory}/{file_name}"
-                    with open(local_file_name, "wb") as local_file:
-                        local_file.write(response.content)
-                    self.logger.info("Successfully downloaded file")
-            except Exception as e:  # pylint: disable=broad-exception-caught
-                self.logger.error(f"Failed to transfer file: {file_name}")
-                self.logger.exception(e)
+                != 0
+            ):
                 result = 1
 
         return result
 
+    def _download_file(
+        self, file_name: str, attributes: dict, local_staging_directory: str
+    ) -> int:
+        """Download a single file to the worker.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+            local_staging_directory (str): The directory to download the file to.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        try:
+            local_file_name = f"{local_staging_directory}/{file_name}"
+            with (
+                self.open_file(file_name, attributes) as stream,
+                open(local_file_name, "wb") as local_file,
+                self._track("download", file_name, attributes.get("size")) as progress,
+            ):
+                for chunk in stream.iter_chunks():
+                    local_file.write(chunk)
+                    if progress is not None:
+                        progress.update(len(chunk))
+            self.logger.info("Successfully downloaded file")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Failed to transfer file: {file_name}")
+            self.logger.exception(e)
+            return 1
+
+        return 0
+
+    def open_file(self, file_name: str, attributes: dict) -> DownloadStream:
+        """Open a file in Sharepoint for reading, without downloading it to disk.
+
+        The returned stream reads from the download as it goes, so it can be passed
+        straight to another handler, e.g. to upload to a different destination.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+
+        Returns:
+            DownloadStream: A file-like object, which should be closed after use.
+            Reading to the end raises RemoteTransferError if the data does not match
+            the size or quickXorHash that Sharepoint reported.
+        """
+        response = None
+        download_url = usable_download_url(attributes)
+        if download_url is not None:
+            # Straight from the storage host. The URL is pre-authenticated, so no
+            # Authorization header is sent
+            self.logger.info(f"Downloading file: {file_name} from its download URL")
+            response = self._request(
+                "GET", download_url, timeout=self.timeout, stream=True
+            )
+            if response.status_code not in (200, 201):
+                self.logger.info(
+                    f"Download URL for {file_name} was rejected with"
+                    f" {response.status_code}, downloading through Graph instead"
+                )
+                response.close()
+                response = None
+
+        if response is None:
+            # Get the item url, by ID if listing recorded it, otherwise by path
+            file_url = self._get_listed_file_url(file_name, attributes)
+            # Download file using item url
+            self.logger.info(f"Downloading file: {file_name}")
+            response = self._request(
+                "GET",
+                item_action_url(str(file_url), "content"),
+                headers={
+                    "Authorization": "Bearer " + self.credentials["access_token"],
+                },
+                timeout=self.timeout,
+                stream=True,
+            )
+
+        # Check the response was a success
+        if response.status_code not in (200, 201):
+            self.logger.error(f"Failed to download file: {file_name}")
+            self.logger.error(f"Got return code: {response.status_code}")
+            self.logger.error(response.json())
+            raise RemoteTransferError(f"Failed to download file: {file_name}")
+
+        return DownloadStream(
+            response,
+            file_name,
+            size=attributes.get("size"),
+            expected_hash=(
+                attributes.get("quick_xor_hash")
+                if self.spec["protocol"].get("verifyHash", True)
+                else None
+            ),
+        )
+
+    @timed_phase("copy")
     def transfer_files(
         self,
-        files: list[str],
+        files: dict,  # type: ignore[override]
         remote_spec: dict,
         dest_remote_handler: RemoteTransferHandler,
     ) -> int:
-        """Not implemented for this transfer type."""
-        raise NotImplementedError
+        """Copy files to another Sharepoint location using the Graph copy action.
+
+        Sharepoint performs the copy itself, so no data passes through the worker.
+        Each copy runs asynchronously, so all of them are started first, and then
+        their monitor URLs are polled together until they have all finished.
+
+        The copies are made with this handler's token, so they are only attempted
+        when the destination uses the same tenant and app registration. Otherwise,
+        and for any file that copying is refused for with a 403 or 404, the files
+        are streamed through the worker with open_file and upload_stream.
+
+        Args:
+            files (dict): The files to copy, as returned by list_files.
+            remote_spec (dict): The destination spec.
+            dest_remote_handler (RemoteTransferHandler): The destination handler.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        if not isinstance(dest_remote_handler, SharepointTransfer):
+            self.logger.error(
+                "Direct transfers are only supported between Sharepoint locations"
+            )
+            return 1
+
+        # Check that our creds are valid
+        self.validate_or_refresh_creds()
+        dest_remote_handler.validate_or_refresh_creds()
+
+        if not self._can_copy_to(dest_remote_handler):
+            self.logger.info(
+                "Destination uses a different tenant or client, streaming files"
+                " through the worker instead of copying them"
+            )
+            return self._stream_files(files, dest_remote_handler)
+
+        result = 0
+        try:
+            parent_reference = dest_remote_handler.get_folder_reference(
+                remote_spec.get("directory", "")
+            )
+        except RemoteTransferError as e:
+            self.logger.error("Failed to resolve destination folder")
+            self.logger.exception(e)
+            return 1
+
+        # Start all of the copies
+        monitors = {}
+        copy_records = {}
+        refused = {}
+        for file_name, attributes in files.items():
+            if self.timeline is not None:
+                copy_records[file_name] = self.timeline.start_file(
+                    "copy", file_name, attributes.get("size")
+                )
+            new_file_name = file_name
+            if "rename" in remote_spec:
+                new_file_name = re.sub(
+                    remote_spec["rename"]["pattern"],
+                    remote_spec["rename"]["sub"],
+                    file_name,
+                )
+
+            file_path = f"{attributes['directory']}/{file_name}"
+            response = self._request_copy(
+                file_path,
+                parent_reference,
+                new_file_name,
+                listed_item_url(attributes),
+            )
+            if response.status_code == 202:
+                monitors[file_name] = str(response.headers["Location"])
+                continue
+
+            if file_name in copy_records:
+                self.timeline.finish_file(  # type: ignore[union-attr]
+                    copy_records.pop(file_name), "failed"
+                )
+            if response.status_code in (403, 404):
+                self.logger.info(
+                    f"Copy of {file_path} was refused with {response.status_code},"
+                    " streaming it through the worker instead"
+                )
+                refused[file_name] = attributes
+                continue
+            self._log_copy_failure(file_path, response)
+            result = 1
+
+        if self._wait_for_copies(monitors, copy_records):
+            result = 1
+        if refused and self._stream_files(refused, dest_remote_handler):
+            result = 1
+        return result
+
+    def _can_copy_to(self, dest_remote_handler: "SharepointTransfer") -> bool:
+        """Return whether files can be copied server side to another handler.
+
+        Args:
+            dest_remote_handler (SharepointTransfer): The destination handler.
+
+        Returns:
+            bool: True if both handlers use the same tenant and client, so this
+            handler's token can be used to write to the destination.
+        """
+        return all(
+            self.spec["protocol"].get(key) is not None
+            and self.spec["protocol"].get(key)
+            == dest_remote_handler.spec["protocol"].get(key)
+            for key in ("tenantId", "clientId")
+        )
+
+    def _stream_files(
+        self, files: dict, dest_remote_handler: "SharepointTransfer"
+    ) -> int:
+        """Stream files to another Sharepoint location through the worker.
+
+        Each file is read with open_file and passed straight to the destination's
+        upload_stream, so it isn't written to the worker's disk.
+
+        Args:
+            files (dict): The files to transfer, as returned by list_files.
+            dest_remote_handler (SharepointTransfer): The destination handler.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        result = 0
+        for file_name, attributes in files.items():
+            if (
+                self._timed_file(
+                    "stream",
+                    file_name,
+                    attributes.get("size"),
+                    self._stream_file,
+                    file_name,
+                    attributes,
+                    dest_remote_handler,
+                )
+                != 0
+            ):
+                result = 1
+        return result
+
+    def _stream_file(
+        self,
+        file_name: str,
+        attributes: dict,
+        dest_remote_handler: "SharepointTransfer",
+    ) -> int:
+        """Stream a single file to another Sharepoint location through the worker.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+            dest_remote_handler (SharepointTransfer): The destination handler.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        try:
+            with self.open_file(file_name, attributes) as stream:
+                return dest_remote_handler.upload_stream(
+                    stream, file_name, attributes.get("size")
+                )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Failed to transfer file: {file_name}")
+            self.logger.exception(e)
+            return 1
+
+    def _wait_for_copies(self, monitors: dict[str, str], copy_records: dict) -> list:
+        """Poll server side copies until they have all finished.
+
+        Each monitor URL is polled, backing off while copies are still running,
+        until every copy has completed or failed, or copyTimeout is reached.
+
+        Args:
+            monitors (dict): The monitor URL of each copy, by file name.
+            copy_records (dict): The timeline record of each copy, by file name.
+
+        Returns:
+            list: The names of the files whose copies failed, or timed out.
+        """
+        monitors = dict(monitors)
+        failed = []
+        delay = 1.0
+        deadline = time() + self.spec["protocol"].get("copyTimeout", 3600)
+        with ThreadPoolExecutor(
+            max_workers=self.spec["protocol"].get("maxConcurrency", 4)
+        ) as executor:
+            while monitors:
+                futures = {
+                    file_name: executor.submit(self._get_copy_status, monitor_url)
+                    for file_name, monitor_url in monitors.items()
+                }
+                for file_name, future in futures.items():
+                    try:
+                        status = future.result()
+                    except Exception as e:  # pylint: disable=broad-exception-caught
+                        self.logger.error(f"Failed to check copy of file: {file_name}")
+                        self.logger.exception(e)
+                        status = "failed"
+                    if status == "completed":
+                        self.logger.info(f"Successfully copied file: {file_name}")
+                    elif status == "failed":
+                        self.logger.error(f"Failed to copy file: {file_name}")
+                        failed.append(file_name)
+                    else:
+                        continue
+                    del monitors[file_name]
+                    if file_name in copy_records:
+                        self.timeline.finish_file(  # type: ignore[union-attr]
+                            copy_records.pop(file_name),
+                            "ok" if status == "completed" else "failed",
+                        )
+
+                if not monitors:
+                    break
+                if time() > deadline:
+                    self.logger.error(
+                        f"Timed out waiting for copies to complete: {list(monitors)}"
+                    )
+                    for record in copy_records.values():
+                        self.timeline.finish_file(  # type: ignore[union-attr]
+                            record, "failed"
+                        )
+                    return failed + list(monitors)
+
+                self.logger.info(
+                    f"Waiting {delay}s for {len(monitors)} copies to complete"
+                )
+                sleep(delay)
+                delay = min(delay * 2, 30)
+
+        return failed
+
+    def get_folder_reference(self, directory: str) -> dict:
+        """Return a parentReference for a folder, creating the folder if needed.
+
+        Args:
+            directory (str): The folder path, below the site root.
+
+        Returns:
+            dict: The driveId and id of the folder.
+        """
+        folder_id = self.create_or_get_folder(directory) if directory else None
+        response = self._request(
+            "GET",
+            f"{self._get_item_url(folder_id)}?$select=id,parentReference",
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code == 404 and self._forget_stale_ids(directory):
+            # The folder ID may have been stale, so it is looked up again
+            return self.get_folder_reference(directory)
+        if response.status_code != 200:
+            self.logger.error(f"Failed to get folder: {directory or '/'}")
+            self.logger.error(response.json())
+            raise RemoteTransferError(f"Failed to get folder: {directory or '/'}")
+
+        item = response.json()
+        return {"driveId": item["parentReference"]["driveId"], "id": item["id"]}
+
+    def _start_copy(
+        self,
+        file_path: str,
+        parent_reference: dict,
+        new_file_name: str,
+        file_url: str | None = None,
+    ) -> str | None:
+        """Start a server side copy of a file.
+
+        Args:
+            file_path (str): The path of the file to copy, below the site root.
+            parent_reference (dict): The driveId and id of the destination folder.
+            new_file_name (str): The name to give the copy.
+            file_url (str, optional): The URL of the file, if it is already known.
+            Otherwise it is looked up from file_path.
+
+        Returns:
+            str: The monitor URL for the copy, or None if it could not be started.
+        """
+        response = self._request_copy(
+            file_path, parent_reference, new_file_name, file_url
+        )
+        if response.status_code != 202:
+            self._log_copy_failure(file_path, response)
+            return None
+
+        return str(response.headers["Location"])
+
+    def _request_copy(
+        self,
+        file_path: str,
+        parent_reference: dict,
+        new_file_name: str,
+        file_url: str | None = None,
+    ) -> requests.Response:
+        """Send the request that starts a server side copy of a file.
+
+        Args:
+            file_path (str): The path of the file to copy, below the site root.
+            parent_reference (dict): The driveId and id of the destination folder.
+            new_file_name (str): The name to give the copy.
+            file_url (str, optional): The URL of the file, if it is already known.
+            Otherwise it is looked up from file_path.
+
+        Returns:
+            requests.Response: The response, which is a 202 with the monitor URL in
+            its Location header if the copy was started.
+        """
+        file_url = file_url or self.get_file_url_from_path(file_path)
+        self.logger.info(f"Copying file: {file_path} to {new_file_name}")
+        response: requests.Response = self._request(
+            "POST",
+            item_action_url(
+                str(file_url), "copy?@microsoft.graph.conflictBehavior=replace"
+            ),
+            headers={
+                "Authorization": "Bearer " + self.credentials["access_token"],
+                "Content-Type": "application/json",
+            },
+            json={"parentReference": parent_reference, "name": new_file_name},
+            timeout=self.timeout,
+        )
+        return response
+
+    def _log_copy_failure(self, file_path: str, response: requests.Response) -> None:
+        """Log a server side copy that could not be started.
+
+        Args:
+            file_path (str): The path of the file, below the site root.
+            response (requests.Response): The response to the copy request.
+        """
+        self.logger.error(f"Failed to start copy of file: {file_path}")
+        self.logger.error(f"Got return code: {response.status_code}")
+        self.logger.error(response.json())
+
+    def _get_copy_status(self, monitor_url: str) -> str:
+        """Return the status of a server side copy.
+
+        Args:
+            monitor_url (str): The monitor URL returned when the copy was started.
+
+        Returns:
+            str: completed, failed, or the status reported while it is in progress.
+        """
+        # The monitor URL is pre-authenticated, so no Authorization header is sent.
+        # Once complete it redirects to the new item, which isn't needed
+        response = self._request(
+            "GET", monitor_url, timeout=self.timeout, allow_redirects=False
+        )
+        if response.status_code in (200, 202, 303):
+            status = (
+                "completed"
+                if response.status_code == 303
+                else str(response.json().get("status", "inProgress"))
+            )
+            if status == "failed":
+                self.logger.error(response.json())
+            return status
+
+        self.logger.error(f"Got return code: {response.status_code}")
+        return "failed"
 
     def create_flag_files(self) -> int:
         """Not implemented for this transfer type."""
         raise NotImplementedError
 
     def tidy(self) -> None:
-        """Nothing to tidy."""
+        """Close the transport, and write out any metrics and timeline report.
+
+        A shared client is released instead, and its transport left open for the
+        other handlers using it.
+        """
+        if self.progress is not None:
+            self.progress.close()
+
+        if self._fan_out is not None:
+            release_fan_out(self._fan_out)
+            self._fan_out = None
+
+        if self._client is not None:
+            if self._transport is self._client.transport:
+                self._transport = None
+            release_client(self._client)
+            self._client = None
+
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+        if self._item_index is not None:
+            self._item_index.close()
+            self._item_index = None
+
+        if self.metrics is not None:
+            for sink in self._metrics_sinks:
+                sink.write(self.metrics)
+
+        if self.timeline is not None:
+            report = self.timeline.as_dict()
+            for phase in report["phases"]:
+                self.logger.info(
+                    f"Phase {phase['name']}: {phase.get('seconds', 0):.3f}s,"
+                    f" {phase['requests']} requests, {phase['mb_per_s'] or 0} MB/s"
+                )
+            self.timeline.write(self.spec["protocol"]["timeline"])
+            self.logger.info(
+                f"Wrote timeline report to {self.spec['protocol']['timeline']}"
+            )
+
+    def _get_listed_file_url(self, file_name: str, attributes: dict) -> str | None:
+        """Return the URL of a file returned by list_files.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+
+        Returns:
+            str: The URL of the item, by its IDs if list_files recorded them, and
+            otherwise by its path.
+        """
+        return listed_item_url(attributes) or self.get_file_url_from_path(
+            f"{attributes['directory']}/{file_name}"
+        )
 
     def get_file_url_from_path(self, file_path: str) -> str | None:
         """Returns the id for a sharepoint drive item from the path."""
         if file_path == "":  # We are dealing with the root folder
+            if self._folder_ids and "" in self._folder_ids:
+                return self._folder_ids[""]
+            indexed = (
+                self._item_index.get(self.site_id, "")
+                if self._item_index is not None
+                else None
+            )
+            if indexed is not None:
+                return str(indexed["item_id"])
             item_url = (
                 f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/root"
             )
@@ -789,37 +2909,11 @@ class SharepointTransfer(RemoteTransferHandler):
                 o365_file_path = "/".join(path_parts[2:])
 
                 # If the path starts with a / then it's a document library, we need to get the id of the document library
-                # Do a GET request to /sites/{siteId}/drives to get the document libraries
-                response = self._request(
-                    "GET",
-                    f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives",
-                    headers={
-                        "Authorization": "Bearer " + self.credentials["access_token"],
-                    },
-                    timeout=self.timeout,
-                )
-                if response.status_code != 200:
-                    self.logger.error("Failed to get document libraries")
-                    self.logger.error(response.json())
-                    raise RemoteTransferError("Failed to get document libraries")
-
-                document_libraries = response.json()["value"]
-
-                for document_library in document_libraries:
-                    if document_library["name"] == library_name:
-                        item_path = (
-                            f"{o365_file_path}/{file_name}"
-                            if o365_file_path
-                            else file_name
-                        )
-                        return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives/{document_library['id']}/root:/{item_path}"
-
-                self.logger.error(
-                    f"Failed to find document library with name {library_name}"
-                )
-                raise RemoteTransferError(
-                    f"Failed to find Document Library named {library_name}"
+                drive_id = self._get_drive_id(library_name)
+                item_path = (
+                    f"{o365_file_path}/{file_name}" if o365_file_path else file_name
                 )
+                return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives/{drive_id}/root:/{item_path}"
 
             return f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drive/root:/{re.sub(r'/+', '/', file_path)}"
 
@@ -842,6 +2936,8 @@ class SharepointTransfer(RemoteTransferHandler):
 
         if response.json()["id"]:
             self.logger.info(f"Successfully fetched id for item with path: {file_path}")
+            if self._item_index is not None:
+                self._item_index.put(self.site_id, "", str(response.json()["id"]))
             return str(response.json()["id"])
 
         raise RemoteTransferError(f"Failed to get id for item with path: {file_path}")
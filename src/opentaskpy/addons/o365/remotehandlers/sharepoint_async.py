@@ -0,0 +1,767 @@
+"""Asyncio engine for the Sharepoint remote handler.
+
+When a transfer moves lots of small files, most of the time goes on waiting for each
+Graph request to come back, not on sending data. This engine runs the per-file
+requests of the main handler operations concurrently on a single event loop, using
+httpx's async client. That lets thousands of requests be in flight without a thread
+for each one.
+
+It is used by SharepointTransfer when the asyncEngine protocol option is set, and
+needs the async extra (pip install otf-addons-o365[async]).
+"""
+
+import asyncio
+import glob
+import re
+from collections.abc import Awaitable
+from os import path
+from time import perf_counter
+from typing import Any
+
+import httpx
+from opentaskpy.exceptions import RemoteTransferError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from .conditionals import NEWEST_FIRST, ListingConditions
+from .metrics import response_size
+from .quickxorhash import QuickXorHash
+from .sharepoint import (
+    SharepointTransfer,
+    item_action_url,
+    listed_item_url,
+    usable_download_url,
+)
+from .streams import DEFAULT_CHUNK_SIZE, check_download
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+# Files up to this size are read into memory and uploaded from the event loop.
+# Anything bigger is streamed from disk by the synchronous handler in a thread
+BUFFERED_UPLOAD_LIMIT = 4 * 1024 * 1024
+# Number of times a throttled (429/503) request is retried
+MAX_THROTTLE_RETRIES = 5
+
+
+class AsyncSharepointEngine:
+    """Runs Sharepoint handler operations concurrently on an event loop.
+
+    The engine uses the site, credentials, spec and logger of the handler it is
+    created for. Each operation starts a task per file, and a semaphore sized by
+    maxConcurrency limits how many run at once. Use it as an async context manager,
+    which opens and closes the HTTP client:
+
+        async with AsyncSharepointEngine(handler) as engine:
+            files = await engine.list_files("folder")
+    """
+
+    def __init__(
+        self,
+        handler: SharepointTransfer,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """Initialise the engine.
+
+        Args:
+            handler (SharepointTransfer): The handler to run operations for.
+            transport (httpx.AsyncBaseTransport, optional): The transport for the
+            HTTP client. Defaults to httpx's own.
+        """
+        self.handler = handler
+        self.spec = handler.spec
+        self.logger = handler.logger
+        self.metrics = handler.metrics
+        self.timeline = handler.timeline
+        self.concurrency = self.spec["protocol"].get("maxConcurrency", 4)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._drive_ids: dict[str, str] = {}
+        self._drive_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncSharepointEngine":
+        """Open the HTTP client."""
+        self._client = httpx.AsyncClient(
+            timeout=self.handler.timeout,
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+            follow_redirects=True,
+            http2=self.spec["protocol"].get("httpVersion", "1.1") == "2",
+            transport=self._transport,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Close the HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _auth_headers(self) -> dict:
+        return {"Authorization": "Bearer " + self.handler.credentials["access_token"]}
+
+    @retry(
+        reraise=True,
+        stop=stop_after_attempt(6),
+        wait=wait_exponential(multiplier=2, min=5, max=60),
+        retry=retry_if_exception_type(httpx.ReadTimeout),
+        before_sleep=SharepointTransfer._log_retry_attempt,  # pylint: disable=protected-access
+    )
+    async def _request(
+        self, method: str, url: str, stream: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """Perform a request, retrying timeouts and waiting out throttling.
+
+        With thousands of requests in flight, Graph will throttle some of them, so
+        429 and 503 responses are retried after the Retry-After period it asks for.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            stream (bool): If True, the body is not read, and the response must be
+            closed by the caller.
+            **kwargs: Passed on to httpx.AsyncClient.build_request.
+
+        Returns:
+            httpx.Response: The response.
+        """
+        if self._client is None:
+            raise RemoteTransferError("The async engine has not been opened")
+
+        self.logger.debug(f"Making async request to {url} with method {method}")
+        attempt = 0
+        while True:
+            request = self._client.build_request(method, url, **kwargs)
+            start = perf_counter()
+            try:
+                response = await self._client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if self.metrics is not None:
+                    self.metrics.record_error(method, url, e, perf_counter() - start)
+                if self.timeline is not None:
+                    self.timeline.request_made(
+                        int(request.headers.get("Content-Length", 0))
+                    )
+                raise
+            bytes_sent = int(request.headers.get("Content-Length", 0))
+            bytes_received = response_size(response, stream)
+            if self.metrics is not None:
+                self.metrics.record(
+                    method,
+                    url,
+                    response.status_code,
+                    perf_counter() - start,
+                    bytes_sent,
+                    bytes_received,
+                )
+            if self.timeline is not None:
+                self.timeline.request_made(bytes_sent, bytes_received)
+            if (
+                response.status_code not in (429, 503)
+                or attempt == MAX_THROTTLE_RETRIES
+            ):
+                return response
+
+            await response.aclose()
+            if self.metrics is not None:
+                self.metrics.record_retry(method, url)
+            retry_after = float(response.headers.get("Retry-After", 2**attempt))
+            self.logger.info(
+                f"Request throttled with {response.status_code}. Retrying in"
+                f" {retry_after} seconds"
+            )
+            await asyncio.sleep(retry_after)
+            attempt += 1
+
+    async def _timed_file(
+        self, direction: str, name: str, size: int | None, operation: Awaitable[int]
+    ) -> int:
+        """Await a per-file operation, timing it if the handler has a timeline.
+
+        Args:
+            direction (str): How the file is being transferred, e.g. upload.
+            name (str): The name of the file.
+            size (int, optional): The size of the file, if it is known.
+            operation (Awaitable): The operation, which returns 0 if successful.
+
+        Returns:
+            int: The result of the operation.
+        """
+        if self.timeline is None:
+            return await operation
+        with self.timeline.file(direction, name, size) as record:
+            result = await operation
+            if result != 0:
+                record["status"] = "failed"
+            return result
+
+    async def _get_drive_id(self, library_name: str) -> str:
+        """Return the drive ID of a document library, fetching them on first use.
+
+        Args:
+            library_name (str): The name of the document library.
+
+        Returns:
+            str: The ID of the drive backing the document library.
+        """
+        async with self._drive_lock:
+            if library_name not in self._drive_ids:
+                response = await self._request(
+                    "GET",
+                    f"{GRAPH_URL}/sites/{self.handler.site_id}/drives",
+                    headers=self._auth_headers(),
+                )
+                if response.status_code != 200:
+                    self.logger.error("Failed to get document libraries")
+                    self.logger.error(response.text)
+                    raise RemoteTransferError("Failed to get document libraries")
+
+                self._drive_ids.update(
+                    {
+                        document_library["name"]: str(document_library["id"])
+                        for document_library in response.json()["value"]
+                    }
+                )
+
+        if library_name not in self._drive_ids:
+            self.logger.error(
+                f"Failed to find document library with name {library_name}"
+            )
+            raise RemoteTransferError(
+                f"Failed to find Document Library named {library_name}"
+            )
+        return self._drive_ids[library_name]
+
+    async def _get_item_url(self, file_path: str) -> str:
+        """Return the URL of a drive item from its path.
+
+        Paths are handled as they are by SharepointTransfer.get_file_url_from_path.
+
+        Args:
+            file_path (str): The path of the item, below the site root.
+
+        Returns:
+            str: The URL of the item.
+        """
+        site_url = f"{GRAPH_URL}/sites/{self.handler.site_id}"
+        if file_path == "":
+            return f"{site_url}/drive/root"
+
+        parts = file_path.split("/")
+        folder = "/".join(parts[:-1])
+        if folder.startswith("/"):
+            library_name, *folder_parts = folder.split("/")[1:]
+            drive_id = await self._get_drive_id(library_name)
+            item_path = "/".join([*folder_parts, parts[-1]])
+            return f"{site_url}/drives/{drive_id}/root:/{item_path}"
+
+        return f"{site_url}/drive/root:/{re.sub(r'/+', '/', file_path)}"
+
+    async def _get_children_url(self, directory: str | None) -> str:
+        """Return the URL used to list the children of a directory.
+
+        Args:
+            directory (str): The directory, relative to the site root.
+
+        Returns:
+            str: The URL of the children collection.
+        """
+        site_url = f"{GRAPH_URL}/sites/{self.handler.site_id}"
+        if not directory or directory == "/":
+            return f"{site_url}/drive/root/children"
+
+        if directory.startswith("/"):
+            path_parts = [part for part in directory.split("/") if part]
+            if len(path_parts) == 1:
+                drive_id = await self._get_drive_id(path_parts[0])
+                return f"{site_url}/drives/{drive_id}/root/children"
+            return f"{await self._get_item_url(directory.rstrip('/'))}:/children"
+
+        return f"{site_url}/drive/root:/{directory}:/children"
+
+    async def list_files(
+        self, directory: str | None = None, file_pattern: str | None = None
+    ) -> dict:
+        """Return list of files that match the source definition.
+
+        Args:
+            directory (str, optional): The directory to search in. Defaults to None.
+            file_pattern (str, optional): The file pattern to search for. Defaults to
+            None.
+
+        Returns:
+            dict: A dict of files, in the same format as SharepointTransfer.list_files.
+        """
+        self.logger.info(
+            f"Listing files in site {self.spec['siteName']} matching"
+            f" {file_pattern} in {directory if directory else '/'}"
+        )
+
+        remote_files: dict[str, dict] = {}
+        conditions = ListingConditions.from_spec(self.spec)
+        try:
+            url: str | None = (
+                f"{await self._get_children_url(directory)}"
+                f"?$select={self.handler._list_select()}"  # pylint: disable=protected-access
+            )
+            unordered_url = None
+            if conditions is not None and conditions.newest_first:
+                unordered_url = url
+                url = f"{url}&$orderby={NEWEST_FIRST}"
+            # Pages have to be fetched in turn, as each links to the next
+            while url:
+                self.handler.validate_or_refresh_creds()
+                response = (
+                    await self._request("GET", url, headers=self._auth_headers())
+                ).json()
+                if (
+                    "error" in response
+                    and unordered_url is not None
+                    and conditions is not None
+                ):
+                    # Not every library can be ordered by lastModifiedDateTime
+                    self.logger.info(
+                        "Failed to list files newest first, listing them in the"
+                        " default order"
+                    )
+                    conditions.in_order = False
+                    url, unordered_url = unordered_url, None
+                    continue
+                unordered_url = None
+                if not response.get("value"):
+                    break
+
+                self.handler._add_listed_files(  # pylint: disable=protected-access
+                    response["value"], directory, file_pattern, remote_files, conditions
+                )
+                if conditions is not None and conditions.window_passed(
+                    response["value"]
+                ):
+                    self.logger.info(
+                        f"Stopped listing at files older than {conditions.max_age} secs"
+                    )
+                    break
+                url = response.get("@odata.nextLink")
+        except Exception as e:
+            self.logger.error(f"Error listing files in site: {self.spec['siteName']}")
+            self.logger.exception(e)
+            raise e
+
+        if conditions is not None and conditions.skipped:
+            self.logger.info(
+                f"Skipped {conditions.skipped} files that don't meet the size or age"
+                " conditionals"
+            )
+        self.handler._log_listed_files(  # pylint: disable=protected-access
+            remote_files, directory
+        )
+        return remote_files
+
+    async def push_files_from_worker(
+        self, local_staging_directory: str, file_list: dict | None = None
+    ) -> int:
+        """Upload files from the worker concurrently.
+
+        Recursive uploads are not handled here, SharepointTransfer uses its threaded
+        tree upload for those.
+
+        Args:
+            local_staging_directory (str): The local staging directory to upload the
+            files from.
+            file_list (dict, optional): The list of files to transfer. Defaults to None.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        self.handler.validate_or_refresh_creds()
+
+        files = (
+            list(file_list.keys())
+            if file_list
+            else glob.glob(f"{local_staging_directory}/*")
+        )
+
+        # In sync mode, list the destination once up front, so files that are
+        # already there can be skipped
+        remote_files = None
+        if "sync" in self.spec:
+            remote_files = await self.list_files(self.spec.get("directory"))
+            self.handler.sync_stats = {"uploaded": 0, "skipped": 0, "bytes_saved": 0}
+
+        self.logger.info(
+            f"Uploading {len(files)} files with up to {self.concurrency} in flight"
+        )
+        results = await asyncio.gather(
+            *(self._push_file(file, remote_files) for file in files)
+        )
+
+        if remote_files is not None:
+            sync_stats = self.handler.sync_stats
+            self.logger.info(
+                f"Sync complete. Uploaded {sync_stats['uploaded']} files, skipped"
+                f" {sync_stats['skipped']} unchanged files, saving"
+                f" {sync_stats['bytes_saved']} bytes"
+            )
+
+        return 1 if any(results) else 0
+
+    async def _push_file(self, file: str, remote_files: dict | None) -> int:
+        """Upload a single file, unless sync mode finds it unchanged.
+
+        Args:
+            file (str): The local file to upload.
+            remote_files (dict): The files already in the destination, or None when
+            not in sync mode.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        async with self._semaphore:
+            # Strip the directory from the file
+            file_name = file.split("/")[-1]
+
+            # Handle any rename that might be specified in the spec
+            if "rename" in self.spec:
+                file_name = self.handler._rename(  # pylint: disable=protected-access
+                    file_name
+                )
+                self.logger.info(f"Renaming file to {file_name}")
+
+            if remote_files is not None and await asyncio.to_thread(
+                self.handler._is_unchanged,  # pylint: disable=protected-access
+                file,
+                remote_files.get(file_name),
+            ):
+                self.logger.info(
+                    f"Skipping file: {file} as {file_name} is already up to date"
+                )
+                self.handler.sync_stats["skipped"] += 1
+                self.handler.sync_stats["bytes_saved"] += path.getsize(file)
+                return 0
+
+            # Append a directory if one is defined
+            if "directory" in self.spec:
+                file_name = f"{self.spec['directory']}/{file_name}"
+
+            result = await self._timed_file(
+                "upload",
+                file_name,
+                path.getsize(file),
+                self._upload_file(file, file_name),
+            )
+            if result == 0 and remote_files is not None:
+                self.handler.sync_stats["uploaded"] += 1
+            return result
+
+    async def _upload_file(self, file: str, file_name: str) -> int:
+        """Upload a single file.
+
+        Args:
+            file (str): The local file to upload.
+            file_name (str): The path to upload the file to, below the site root.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        if path.getsize(file) > BUFFERED_UPLOAD_LIMIT:
+            return await asyncio.to_thread(
+                self.handler._upload_file,  # pylint: disable=protected-access
+                file,
+                file_name,
+            )
+
+        self.logger.info(
+            f"Uploading file: {file} to site {self.spec['siteName']} with path: {file_name}"
+        )
+        with open(file, "rb") as f:
+            data = f.read()
+        upload_url = f"{await self._get_item_url(file_name)}:/content"
+
+        # The file is sent in a single request, so it is all done when that returns
+        with self.handler._track(  # pylint: disable=protected-access
+            "upload", file_name, len(data)
+        ) as progress:
+            max_retries = 5
+            retry_delay = 1
+            for attempt in range(max_retries):
+                response = await self._request(
+                    "PUT",
+                    upload_url,
+                    headers={
+                        **self._auth_headers(),
+                        "Content-Type": "application/json",
+                    },
+                    content=data,
+                )
+                if response.status_code != 409:
+                    break
+                if attempt < max_retries - 1:
+                    sleep_time = retry_delay * (2**attempt)
+                    self.logger.info(
+                        f"Got 409 error from API. Sleeping for {sleep_time} seconds before retrying. Attempt {attempt} of {max_retries}"
+                    )
+                    await asyncio.sleep(sleep_time)
+            else:
+                self.logger.error(
+                    f"Failed to upload file after {max_retries} attempts due to 409 error"
+                )
+            if progress is not None and response.status_code in (200, 201):
+                progress.update(len(data))
+
+        # Check the response was a success
+        if response.status_code not in (200, 201):
+            self.logger.error(f"Failed to upload file: {file}")
+            self.logger.error(f"Got return code: {response.status_code}")
+            self.logger.error(response.text)
+            return 1
+
+        if not self.handler._verify_hash(  # pylint: disable=protected-access
+            file, QuickXorHash(data), response.json()
+        ):
+            return 1
+
+        self.logger.info(f"Successfully uploaded file to: {response.json()['webUrl']}")
+        return 0
+
+    async def pull_files_to_worker(
+        self, files: dict, local_staging_directory: str
+    ) -> int:
+        """Download files to the worker concurrently.
+
+        Args:
+            files (dict): The files to download, as returned by list_files.
+            local_staging_directory (str): The local staging directory to download the
+            files to.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        self.handler.validate_or_refresh_creds()
+
+        results = await asyncio.gather(
+            *(
+                self._pull_file(file_name, attributes, local_staging_directory)
+                for file_name, attributes in files.items()
+            )
+        )
+        return 1 if any(results) else 0
+
+    async def _pull_file(
+        self, file_name: str, attributes: dict, local_staging_directory: str
+    ) -> int:
+        """Download a single file, once there is a free slot.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+            local_staging_directory (str): The directory to download the file to.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        async with self._semaphore:
+            return await self._timed_file(
+                "download",
+                file_name,
+                attributes.get("size"),
+                self._download_file(file_name, attributes, local_staging_directory),
+            )
+
+    async def _download_file(
+        self, file_name: str, attributes: dict, local_staging_directory: str
+    ) -> int:
+        """Download a single file, checking its size and hash.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+            local_staging_directory (str): The directory to download the file to.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        try:
+            response = None
+            download_url = usable_download_url(attributes)
+            if download_url is not None:
+                # Pre-authenticated, so no Authorization header is sent
+                self.logger.info(f"Downloading file: {file_name} from its download URL")
+                response = await self._request("GET", download_url, stream=True)
+                if response.status_code not in (200, 201):
+                    self.logger.info(
+                        f"Download URL for {file_name} was rejected with"
+                        f" {response.status_code}, downloading through Graph instead"
+                    )
+                    await response.aclose()
+                    response = None
+
+            if response is None:
+                file_url = listed_item_url(attributes) or await self._get_item_url(
+                    f"{attributes['directory']}/{file_name}"
+                )
+                self.logger.info(f"Downloading file: {file_name}")
+                response = await self._request(
+                    "GET",
+                    item_action_url(file_url, "content"),
+                    headers=self._auth_headers(),
+                    stream=True,
+                )
+            try:
+                if response.status_code not in (200, 201):
+                    await response.aread()
+                    self.logger.error(f"Failed to download file: {file_name}")
+                    self.logger.error(f"Got return code: {response.status_code}")
+                    self.logger.error(response.text)
+                    raise RemoteTransferError(f"Failed to download file: {file_name}")
+
+                hasher = QuickXorHash()
+                with (
+                    open(f"{local_staging_directory}/{file_name}", "wb") as f,
+                    self.handler._track(  # pylint: disable=protected-access
+                        "download", file_name, attributes.get("size")
+                    ) as progress,
+                ):
+                    async for chunk in response.aiter_bytes(DEFAULT_CHUNK_SIZE):
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        if progress is not None:
+                            progress.update(len(chunk))
+            finally:
+                await response.aclose()
+
+            check_download(
+                file_name,
+                hasher.length,
+                hasher.base64digest(),
+                attributes.get("size"),
+                (
+                    attributes.get("quick_xor_hash")
+                    if self.spec["protocol"].get("verifyHash", True)
+                    else None
+                ),
+            )
+            self.logger.info("Successfully downloaded file")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Failed to transfer file: {file_name}")
+            self.logger.exception(e)
+            return 1
+
+        return 0
+
+    async def handle_post_copy_action(self, files: dict) -> int:
+        """Handle the post copy action specified in the config, concurrently.
+
+        Args:
+            files (dict): The files that need to be handled.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        self.handler.validate_or_refresh_creds()
+
+        action = self.spec["postCopyAction"]["action"]
+        destination_id = None
+        if action == "delete":
+            self.logger.info(f"Deleting files: {list(files)}")
+        elif action in ("move", "rename"):
+            # Every file goes to the same folder, so it only needs resolving once
+            destination_path = self.spec["postCopyAction"]["destination"]
+            destination_id = await asyncio.to_thread(
+                self.handler.create_or_get_folder, destination_path
+            )
+            if not destination_id:
+                self.logger.error(
+                    f"Failed to get or create destination folder for {destination_path}"
+                )
+                return 1
+        else:
+            return 0
+
+        results = await asyncio.gather(
+            *(
+                self._post_copy_file(file_name, attributes, destination_id)
+                for file_name, attributes in files.items()
+            )
+        )
+        return 1 if any(results) else 0
+
+    async def _post_copy_file(
+        self, file_name: str, attributes: dict, destination_id: str | None
+    ) -> int:
+        """Delete, move or rename a single file.
+
+        Args:
+            file_name (str): The name of the file.
+            attributes (dict): The attributes of the file, as returned by list_files.
+            destination_id (str): The ID of the folder to move the file to, or None
+            when deleting.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        async with self._semaphore:
+            file_url = listed_item_url(attributes) or await self._get_item_url(
+                f"{attributes['directory']}/{file_name}"
+            )
+
+            if destination_id is None:
+                response = await self._request(
+                    "DELETE", file_url, headers=self._auth_headers()
+                )
+                if response.status_code != 204:
+                    self.logger.error(f"Failed to delete file: {file_name}")
+                    self.logger.error(f"Got return code: {response.status_code}")
+                    self.logger.error(response.text)
+                    return 1
+                return 0
+
+            new_file = file_name.split("/")[-1]
+            if self.spec["postCopyAction"]["action"] == "rename":
+                # Use the pattern and sub values to rename the file correctly
+                new_file = re.sub(
+                    self.spec["postCopyAction"]["pattern"],
+                    self.spec["postCopyAction"]["sub"],
+                    file_name,
+                )
+            patch_body = {
+                "parentReference": {"id": f"{destination_id}"},
+                "name": f"{new_file}",
+            }
+            patch_headers = {**self._auth_headers(), "Content-Type": "application/json"}
+
+            response = await self._request(
+                "PATCH", file_url, headers=patch_headers, json=patch_body
+            )
+            if response.status_code == 409:
+                # Target already exists - delete it and retry (unix-style overwrite)
+                self.logger.info(
+                    f"Destination file {new_file} already exists, overwriting"
+                )
+                destination_path = self.spec["postCopyAction"]["destination"]
+                response = await self._request(
+                    "DELETE",
+                    await self._get_item_url(f"{destination_path}/{new_file}"),
+                    headers=self._auth_headers(),
+                )
+                if response.status_code != 204:
+                    self.logger.error(f"Failed to delete conflicting file: {new_file}")
+                    self.logger.error(f"Got return code: {response.status_code}")
+                    self.logger.error(response.text)
+                    return 1
+
+                response = await self._request(
+                    "PATCH", file_url, headers=patch_headers, json=patch_body
+                )
+
+            if response.status_code != 200:
+                self.logger.error(f"Failed to move file: {file_name}")
+                self.logger.error(f"Got return code: {response.status_code}")
+                self.logger.error(response.text)
+                return 1
+
+        return 0
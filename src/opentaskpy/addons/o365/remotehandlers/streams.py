@@ -0,0 +1,200 @@
+"""Streams used to move data in and out of Sharepoint without staging it on disk."""
+
+import io
+from collections.abc import Iterable, Iterator
+from typing import IO
+
+import requests
+from opentaskpy.exceptions import RemoteTransferError
+
+from .quickxorhash import BackgroundHasher
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Upload session chunks (other than the last) must be a multiple of 320 KiB
+UPLOAD_CHUNK_MULTIPLE = 320 * 1024
+
+
+class DownloadStream(io.RawIOBase):
+    """Read-only, file-like view of a file being downloaded from Sharepoint.
+
+    Data is pulled from the HTTP response as the stream is read, so the file is
+    never held in memory or written to disk in full. The quickXorHash of the data is
+    computed as it passes through, and checked once the end of the file is reached.
+    """
+
+    def __init__(
+        self,
+        response: requests.Response,
+        name: str,
+        size: int | None = None,
+        expected_hash: str | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        """Wrap a streamed download response.
+
+        Args:
+            response: The response, requested with stream=True.
+            name: The name of the file, used in error messages.
+            size: The size of the file, if known.
+            expected_hash: The quickXorHash Sharepoint reported for the file. If
+            set, reading the end of the stream raises RemoteTransferError when the
+            data does not match.
+            chunk_size: The size of each read from the response.
+        """
+        super().__init__()
+        self.name = name
+        self.size = size
+        self.expected_hash = expected_hash
+        self.bytes_read = 0
+        # Set once the end of the file has been read
+        self.hash: str | None = None
+        self._response = response
+        self._chunks = response.iter_content(chunk_size)
+        self._buffer = memoryview(b"")
+        self._hasher = BackgroundHasher()
+        self._finished = False
+
+    def readable(self) -> bool:
+        """Return True, the stream can be read."""
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:  # type: ignore[override]
+        """Read data from the download into a buffer.
+
+        Args:
+            buffer: The buffer to fill.
+
+        Returns:
+            int: The number of bytes read, 0 at the end of the file.
+        """
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._finish()
+                return 0
+            self._hasher.update(chunk)
+            self._buffer = memoryview(chunk)
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        self.bytes_read += size
+        return size
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Yield the rest of the file in the chunks it arrives in."""
+        if self._buffer:
+            remaining = bytes(self._buffer)
+            self._buffer = memoryview(b"")
+            self.bytes_read += len(remaining)
+            yield remaining
+
+        for chunk in self._chunks:
+            self._hasher.update(chunk)
+            self.bytes_read += len(chunk)
+            yield chunk
+
+        self._finish()
+
+    def close(self) -> None:
+        """Close the stream, and release the connection."""
+        if not self.closed:
+            self._response.close()
+        super().close()
+
+    def _finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self.hash = self._hasher.base64digest()
+        check_download(
+            self.name, self.bytes_read, self.hash, self.size, self.expected_hash
+        )
+
+
+def check_download(
+    name: str,
+    bytes_read: int,
+    local_hash: str,
+    size: int | None = None,
+    expected_hash: str | None = None,
+) -> None:
+    """Check that a completed download matches what Sharepoint reported.
+
+    Args:
+        name: The name of the file, used in error messages.
+        bytes_read: The number of bytes downloaded.
+        local_hash: The quickXorHash of the downloaded data.
+        size: The size Sharepoint reported, if known.
+        expected_hash: The quickXorHash Sharepoint reported, if it should be checked.
+
+    Raises:
+        RemoteTransferError: If the size or hash does not match.
+    """
+    if size is not None and bytes_read != size:
+        raise RemoteTransferError(
+            f"Download of {name} ended after {bytes_read} of {size} bytes"
+        )
+
+    if expected_hash and local_hash != expected_hash:
+        raise RemoteTransferError(
+            f"quickXorHash mismatch for {name}: local {local_hash}, remote"
+            f" {expected_hash}"
+        )
+
+
+def _read_blocks(data: Iterable[bytes] | IO[bytes], block_size: int) -> Iterator[bytes]:
+    if hasattr(data, "read"):
+        while block := data.read(block_size):
+            yield block
+    else:
+        yield from data
+
+
+def iter_chunk_ranges(size: int, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """Split a file of a known size into the byte ranges of an upload session.
+
+    Args:
+        size: The size of the file.
+        chunk_size: The size of every chunk except the last.
+
+    Yields:
+        tuple: The first and last byte (inclusive) of each chunk. An empty file has
+        no chunks.
+    """
+    for start in range(0, size, chunk_size):
+        yield start, min(start + chunk_size, size) - 1
+
+
+def iter_upload_chunks(
+    data: Iterable[bytes] | IO[bytes], chunk_size: int
+) -> Iterator[tuple[bytes, bool]]:
+    """Re-slice a stream of data into fixed size chunks for an upload session.
+
+    One chunk is held back, so that the last chunk can be identified even when the
+    total length of the data isn't known up front.
+
+    Args:
+        data: An iterable of byte chunks of any size, or a file-like object.
+        chunk_size: The size of every chunk except the last.
+
+    Yields:
+        tuple: Each chunk, and whether it is the last one. Empty data yields a single
+        empty chunk.
+    """
+    buffer = bytearray()
+    previous: bytes | None = None
+    for block in _read_blocks(data, chunk_size):
+        buffer += block
+        while len(buffer) >= chunk_size:
+            if previous is not None:
+                yield previous, False
+            previous = bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+
+    if buffer:
+        if previous is not None:
+            yield previous, False
+        yield bytes(buffer), True
+    else:
+        yield (previous if previous is not None else b""), True
@@ -0,0 +1,213 @@
+"""Per-phase and per-file timeline of a Sharepoint transfer.
+
+A transfer goes through distinct phases: getting an access token, resolving the
+site, listing, transferring each file, and post copy actions. The timeline records
+when each phase and file started, how long it took, the requests it made and the
+bytes it moved, so reports show which phase dominates a job, and the throughput
+actually achieved.
+"""
+
+import functools
+import json
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter, time
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The file being transferred by the current thread or asyncio task
+_current_file: ContextVar[tuple["TransferTimeline", dict] | None] = ContextVar(
+    "current_file", default=None
+)
+
+
+def _mb_per_s(size: int, seconds: float) -> float | None:
+    return round(size / seconds / 1024 / 1024, 3) if seconds > 0 else None
+
+
+class TransferTimeline:
+    """Thread safe record of the phases and files of a transfer."""
+
+    def __init__(self, task_id: str = ""):
+        """Start the timeline.
+
+        Args:
+            task_id (str): The task being timed.
+        """
+        self.task_id = task_id
+        self.started = time()
+        self._start = perf_counter()
+        self._lock = threading.Lock()
+        self._open_phases: list[dict] = []
+        self.phases: list[dict] = []
+        self.files: list[dict] = []
+
+    def _offset(self) -> float:
+        return round(perf_counter() - self._start, 6)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[dict]:
+        """Time a phase. Requests made from any thread while it runs are counted.
+
+        Args:
+            name (str): The name of the phase, e.g. list or upload.
+
+        Yields:
+            dict: The record for the phase.
+        """
+        record: dict[str, Any] = {
+            "name": name,
+            "start": self._offset(),
+            "requests": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+        }
+        with self._lock:
+            self.phases.append(record)
+            self._open_phases.append(record)
+        try:
+            yield record
+        finally:
+            with self._lock:
+                self._open_phases.remove(record)
+                record["seconds"] = round(self._offset() - record["start"], 6)
+
+    def start_file(self, direction: str, name: str, size: int | None = None) -> dict:
+        """Start timing a file, which is finished with finish_file.
+
+        Args:
+            direction (str): How the file is being transferred, e.g. upload.
+            name (str): The name of the file.
+            size (int, optional): The size of the file, if it is known.
+
+        Returns:
+            dict: The record for the file.
+        """
+        record: dict[str, Any] = {
+            "name": name,
+            "direction": direction,
+            "size": size,
+            "start": self._offset(),
+            "requests": 0,
+        }
+        with self._lock:
+            self.files.append(record)
+        return record
+
+    def finish_file(self, record: dict, status: str = "ok") -> None:
+        """Finish timing a file.
+
+        Args:
+            record (dict): The record returned by start_file.
+            status (str): ok, or failed.
+        """
+        with self._lock:
+            record.setdefault("status", status)
+            record["seconds"] = round(self._offset() - record["start"], 6)
+
+    @contextmanager
+    def file(
+        self, direction: str, name: str, size: int | None = None
+    ) -> Iterator[dict]:
+        """Time a file. Requests made from the same thread or task are counted.
+
+        The file is recorded as failed if an exception is raised, or if status is
+        set to failed on the record.
+
+        Args:
+            direction (str): How the file is being transferred, e.g. upload.
+            name (str): The name of the file.
+            size (int, optional): The size of the file, if it is known.
+
+        Yields:
+            dict: The record for the file.
+        """
+        record = self.start_file(direction, name, size)
+        token = _current_file.set((self, record))
+        try:
+            yield record
+        except BaseException:
+            self.finish_file(record, "failed")
+            raise
+        else:
+            self.finish_file(record)
+        finally:
+            _current_file.reset(token)
+
+    def request_made(self, bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        """Count a request against the open phases, and the current file.
+
+        Args:
+            bytes_sent (int): The size of the request body.
+            bytes_received (int): The size of the response body.
+        """
+        current = _current_file.get()
+        with self._lock:
+            for record in self._open_phases:
+                record["requests"] += 1
+                record["bytes_sent"] += bytes_sent
+                record["bytes_received"] += bytes_received
+            if current is not None and current[0] is self:
+                current[1]["requests"] += 1
+
+    def as_dict(self) -> dict:
+        """Return the timeline as a report, with the throughput of each item.
+
+        Returns:
+            dict: The task, its start time and duration, the phases, and the files.
+        """
+        with self._lock:
+            phases = [dict(record) for record in self.phases]
+            files = [dict(record) for record in self.files]
+
+        for record in phases:
+            record["mb_per_s"] = _mb_per_s(
+                record["bytes_sent"] + record["bytes_received"],
+                record.get("seconds", 0),
+            )
+        for record in files:
+            record["mb_per_s"] = _mb_per_s(
+                record["size"] or 0, record.get("seconds", 0)
+            )
+
+        return {
+            "task_id": self.task_id,
+            "started": self.started,
+            "seconds": self._offset(),
+            "phases": phases,
+            "files": files,
+        }
+
+    def write(self, file_name: str) -> None:
+        """Write the report to a JSON file.
+
+        Args:
+            file_name (str): The file to write. It is replaced if it exists.
+        """
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+
+def timed_phase(name: str) -> Callable[[F], F]:
+    """Decorate a handler method, so calls to it are timed as a phase.
+
+    The method is only timed if the handler has a timeline.
+
+    Args:
+        name (str): The name of the phase.
+    """
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            if self.timeline is None:
+                return method(self, *args, **kwargs)
+            with self.timeline.phase(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
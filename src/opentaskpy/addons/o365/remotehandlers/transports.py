@@ -0,0 +1,146 @@
+"""Alternative transports for the Graph requests made by the Sharepoint handler.
+
+By default every request goes through requests, which only speaks HTTP/1.1, so each
+concurrent request needs a connection (and TLS handshake) of its own. The
+transports here take the same arguments as the requests functions, and return
+responses that behave like requests responses, so they can sit behind
+SharepointTransfer._request without the rest of the handler knowing.
+"""
+
+from collections.abc import Iterator
+from contextlib import suppress
+from functools import partial
+from typing import Any
+
+import httpx
+import requests
+
+# Size of each read from a file-like request body
+BODY_CHUNK_SIZE = 1024 * 1024
+
+
+class Http2Response:
+    """requests-like view of an httpx response."""
+
+    def __init__(self, response: httpx.Response):
+        """Wrap an httpx response.
+
+        Args:
+            response (httpx.Response): The response to wrap.
+        """
+        self.raw = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def text(self) -> str:
+        """Return the body of the response as text."""
+        return str(self.raw.text)
+
+    @property
+    def content(self) -> bytes:
+        """Return the body of the response."""
+        return bytes(self.raw.read())
+
+    def json(self, **kwargs: Any) -> Any:
+        """Return the body of the response decoded from JSON."""
+        return self.raw.json(**kwargs)
+
+    def iter_content(self, chunk_size: int | None = 1) -> Iterator[bytes]:
+        """Yield the body of the response in chunks, as it arrives.
+
+        Args:
+            chunk_size (int): The size of each chunk.
+        """
+        yield from self.raw.iter_bytes(chunk_size)
+
+    def close(self) -> None:
+        """Release the connection."""
+        self.raw.close()
+
+
+class Http2Transport:
+    """Sends requests over multiplexed HTTP/2 connections, using httpx.
+
+    All of the requests made by a handler share a single client, so concurrent
+    requests to the same host are sent as streams on one connection, rather than
+    each needing a connection of its own.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10,
+        transport: httpx.BaseTransport | None = None,
+    ):
+        """Create the HTTP/2 client.
+
+        Args:
+            max_connections (int): The maximum number of connections to open.
+            transport (httpx.BaseTransport, optional): The transport for the client.
+            Defaults to httpx's own.
+        """
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections),
+            transport=transport,
+        )
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Http2Response:
+        """Send a request, taking the same arguments as requests.request.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            **kwargs: The headers, data, json, timeout, stream and allow_redirects
+            arguments supported by requests.
+
+        Returns:
+            Http2Response: The response. If stream is set, the body is read as it is
+            iterated over, and the response must be closed.
+        """
+        stream = kwargs.pop("stream", False)
+        # requests follows redirects by default, and httpx does not
+        follow_redirects = kwargs.pop("allow_redirects", True)
+        headers = dict(kwargs.pop("headers", None) or {})
+
+        content = kwargs.pop("data", None)
+        if hasattr(content, "read"):
+            # File-like bodies are streamed, e.g. a HashingReader for an upload
+            if hasattr(content, "__len__"):
+                headers.setdefault("Content-Length", str(len(content)))
+            content = iter(partial(content.read, BODY_CHUNK_SIZE), b"")
+
+        request = self.client.build_request(
+            method, url, headers=headers, content=content, **kwargs
+        )
+
+        # Raise the same exceptions as requests, so that the retry logic still works
+        try:
+            response = self.client.send(
+                request, stream=stream, follow_redirects=follow_redirects
+            )
+        except httpx.ReadTimeout as e:
+            raise requests.exceptions.ReadTimeout(str(e)) from e
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        return Http2Response(response)
+
+    def warm_up(self, url: str, timeout: float | None = None) -> None:
+        """Open a connection to a host, ready for the requests that follow.
+
+        Any response will do, so errors are ignored.
+
+        Args:
+            url (str): A URL on the host.
+            timeout (float, optional): How long to wait for the connection.
+        """
+        with suppress(httpx.HTTPError):
+            self.client.head(url, timeout=timeout)
+
+    def close(self) -> None:
+        """Close the client, and its connections."""
+        self.client.close()
@@ -0,0 +1,62 @@
+import time
+from collections.abc import Callable
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    SITE_ID,
+    FakeDrive,
+    FakeDriveTransport,
+)
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    """An empty site. Test modules that need files in it override this."""
+    return FakeDrive()
+
+
+@pytest.fixture
+def transport(drive: FakeDrive) -> FakeDriveTransport:
+    return FakeDriveTransport(drive)
+
+
+@pytest.fixture
+def make_handler() -> Callable[..., SharepointTransfer]:
+    """Return a factory for handlers that send their requests to a transport.
+
+    The handlers are built without running the network-heavy __init__. Keyword
+    arguments are added to the spec.
+    """
+
+    def make(transport: Any, **spec: Any) -> SharepointTransfer:
+        obj = SharepointTransfer.__new__(SharepointTransfer)
+        obj.logger = MagicMock()
+        obj.spec = {"siteName": "site", "protocol": {}, **spec}
+        obj.credentials = {"access_token": "token", "expiry": time.time() + 3600}
+        obj.timeout = 30
+        obj.site_id = SITE_ID
+        obj._transport = transport
+        return obj
+
+    return make
+
+
+@pytest.fixture
+def create_handler(
+    transport: FakeDriveTransport,
+) -> Callable[[dict], SharepointTransfer]:
+    """Return a factory for handlers created from a spec, as OTF creates them.
+
+    Each handler sends its requests to the transport.
+    """
+
+    def create(spec: dict) -> SharepointTransfer:
+        handler = SharepointTransfer(spec)
+        handler._transport = transport
+        return handler
+
+    return create
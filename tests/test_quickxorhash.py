@@ -0,0 +1,122 @@
+import base64
+import io
+import os
+import random
+import threading
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import (
+    BackgroundHasher,
+    HashingReader,
+    QuickXorHash,
+    quickxorhash_file,
+)
+
+
+def _reference_quickxorhash(data: bytes) -> bytes:
+    """Byte-at-a-time implementation, following the published algorithm."""
+    state = 0
+    shift = 0
+    for byte in data:
+        state ^= ((byte << shift) | (byte >> (160 - shift))) & ((1 << 160) - 1)
+        shift = (shift + 11) % 160
+
+    digest = bytearray(state.to_bytes(20, "little"))
+    for i, length_byte in enumerate(len(data).to_bytes(8, "little")):
+        digest[12 + i] ^= length_byte
+    return bytes(digest)
+
+
+def test_quickxorhash_empty() -> None:
+    assert QuickXorHash().base64digest() == base64.b64encode(bytes(20)).decode()
+
+
+@pytest.mark.parametrize("size", [1, 7, 159, 160, 161, 1000, 40960, 40961, 123457])
+def test_quickxorhash_matches_reference(size: int) -> None:
+    data = os.urandom(size)
+
+    assert QuickXorHash(data).digest() == _reference_quickxorhash(data)
+
+
+def test_quickxorhash_incremental_updates_match_single_update() -> None:
+    data = os.urandom(250000)
+    hasher = QuickXorHash()
+
+    position = 0
+    while position < len(data):
+        step = random.randint(1, 50000)
+        hasher.update(data[position : position + step])
+        position += step
+
+    assert hasher.length == len(data)
+    assert hasher.digest() == _reference_quickxorhash(data)
+
+
+def test_quickxorhash_copy_is_independent() -> None:
+    hasher = QuickXorHash(b"abc")
+    clone = hasher.copy()
+    clone.update(b"def")
+
+    assert hasher.digest() == _reference_quickxorhash(b"abc")
+    assert clone.digest() == _reference_quickxorhash(b"abcdef")
+
+
+@pytest.mark.parametrize("read_size", [8192, 100, -1])
+def test_hashing_reader_hashes_what_is_read(read_size: int) -> None:
+    data = os.urandom(300001)
+    hasher = QuickXorHash()
+    reader = HashingReader(io.BytesIO(data), hasher, len(data), block_size=65536)
+
+    assert len(reader) == len(data)
+
+    received = b""
+    while block := reader.read(read_size):
+        received += block
+
+    assert received == data
+    assert len(reader) == 0
+    assert hasher.digest() == _reference_quickxorhash(data)
+
+
+def test_quickxorhash_file(tmp_path) -> None:
+    data = os.urandom(100000)
+    file = tmp_path / "file.bin"
+    file.write_bytes(data)
+
+    assert quickxorhash_file(str(file), block_size=4096) == base64.b64encode(
+        _reference_quickxorhash(data)
+    ).decode("ascii")
+
+
+def test_background_hasher_matches_inline() -> None:
+    data = os.urandom(500000)
+    hasher = BackgroundHasher()
+    for start in range(0, len(data), 65536):
+        hasher.update(data[start : start + 65536])
+
+    assert hasher.length == len(data)
+    assert hasher.result().digest() == _reference_quickxorhash(data)
+
+
+def test_background_hasher_holds_one_block_at_a_time() -> None:
+    hasher = BackgroundHasher()
+    hashed = threading.Event()
+    update = hasher.hasher.update
+
+    def slow_update(data: bytes) -> None:
+        hashed.wait()
+        update(data)
+
+    hasher.hasher.update = slow_update  # type: ignore[method-assign]
+    hasher.update(b"first")
+    second = threading.Thread(target=hasher.update, args=(b"second",))
+    second.start()
+    second.join(0.1)
+    # Held up until the first block is hashed
+    held_up = second.is_alive()
+    hashed.set()
+    second.join()
+
+    assert held_up
+    assert hasher.result().digest() == _reference_quickxorhash(b"firstsecond")
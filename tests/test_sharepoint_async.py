@@ -0,0 +1,351 @@
+import asyncio
+import time
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers import sharepoint_async
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    SITE_ID,
+    FakeDrive,
+    FakeDriveTransport,
+)
+from opentaskpy.addons.o365.remotehandlers.metrics import RequestMetrics
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import QuickXorHash
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.sharepoint_async import (
+    AsyncSharepointEngine,
+)
+from opentaskpy.addons.o365.remotehandlers.timeline import TransferTimeline
+
+ROOT = f"https://graph.microsoft.com/v1.0/sites/{SITE_ID}/drive/root"
+
+
+@pytest.fixture
+def sharepoint_transfer_obj(
+    make_handler: Callable[..., SharepointTransfer], transport: FakeDriveTransport
+) -> SharepointTransfer:
+    """A handler whose synchronous requests go to the same drive as the engine's."""
+    obj = make_handler(
+        transport,
+        directory="dest",
+        protocol={"maxConcurrency": 8, "asyncEngine": True},
+    )
+    obj.sync_stats = {"uploaded": 0, "skipped": 0, "bytes_saved": 0}
+    return obj
+
+
+@pytest.fixture
+def graph(transport: FakeDriveTransport) -> "MockGraph":
+    return MockGraph(transport.drive)
+
+
+class MockGraph:
+    """Serves a FakeDrive to the async engine through httpx.MockTransport.
+
+    It keeps track of the requests in flight, and can throttle a URL once.
+    """
+
+    def __init__(self, drive: FakeDrive, delay: float = 0):
+        """Serve a drive, with an optional delay before each response."""
+        self.drive = drive
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttle: set[str] = set()
+        self.requests: list[tuple[str, str]] = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """Handle a request sent through httpx.MockTransport."""
+        url = str(request.url)
+        self.requests.append((request.method, url))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if url in self.throttle:
+                self.throttle.discard(url)
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            status, headers, body = self.drive.handle(
+                request.method,
+                request.url.raw_path.decode(),
+                dict(request.headers),
+                request.content,
+            )
+        finally:
+            self.in_flight -= 1
+        if isinstance(body, bytes):
+            return httpx.Response(status, headers=headers, content=body)
+        return httpx.Response(status, headers=headers, json=body)
+
+
+def _contents(drive: FakeDrive) -> dict[str, bytes]:
+    """Return the content of every file in the drive, by path."""
+    return {
+        drive._item_path(item): item["content"]  # pylint: disable=protected-access
+        for item in drive.items.values()
+        if item["content"] is not None
+    }
+
+
+def _run(handler: SharepointTransfer, graph: MockGraph, operation: str, *args):
+    async def run():
+        async with AsyncSharepointEngine(
+            handler, transport=httpx.MockTransport(graph.handle)
+        ) as engine:
+            return await getattr(engine, operation)(*args)
+
+    return asyncio.run(run())
+
+
+def test_async_list_files_follows_next_link(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph
+) -> None:
+    graph.drive.page_size = 2
+    for i in range(5):
+        graph.drive.add_file(f"src/file{i}.txt", b"x" * i)
+    graph.drive.add_file("src/other.csv", b"csv")
+
+    files = _run(sharepoint_transfer_obj, graph, "list_files", "src", r".*\.txt")
+
+    assert sorted(files) == [f"file{i}.txt" for i in range(5)]
+    assert files["file3.txt"]["size"] == 3
+    assert files["file3.txt"]["directory"] == "src"
+    assert files["file3.txt"]["quick_xor_hash"] == QuickXorHash(b"xxx").base64digest()
+    # Two items per page
+    assert len(graph.requests) == 3
+
+
+def test_async_push_runs_uploads_concurrently_up_to_the_limit(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    for i in range(40):
+        (tmp_path / f"file{i}.txt").write_bytes(f"content {i}".encode())
+    graph.delay = 0.01
+
+    result = _run(
+        sharepoint_transfer_obj, graph, "push_files_from_worker", str(tmp_path)
+    )
+
+    assert result == 0
+    assert _contents(graph.drive) == {
+        f"dest/file{i}.txt": f"content {i}".encode() for i in range(40)
+    }
+    assert 1 < graph.max_in_flight <= 8
+
+
+def test_async_push_fails_on_hash_mismatch(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    (tmp_path / "file.txt").write_bytes(b"content")
+
+    with patch.object(
+        FakeDrive,
+        "_item_json",
+        return_value={"webUrl": "url", "file": {"hashes": {"quickXorHash": "bad"}}},
+    ):
+        result = _run(
+            sharepoint_transfer_obj, graph, "push_files_from_worker", str(tmp_path)
+        )
+
+    assert result == 1
+
+
+def test_async_pull_downloads_and_verifies_files(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    graph.drive.add_file("src/a.txt", b"aaa")
+    graph.drive.add_file("src/b.txt", b"bbbb")
+    files = {
+        "a.txt": {
+            "size": 3,
+            "directory": "src",
+            "quick_xor_hash": QuickXorHash(b"aaa").base64digest(),
+        },
+        "b.txt": {
+            "size": 4,
+            "directory": "src",
+            "quick_xor_hash": QuickXorHash(b"not b").base64digest(),
+        },
+    }
+
+    result = _run(
+        sharepoint_transfer_obj, graph, "pull_files_to_worker", files, str(tmp_path)
+    )
+
+    # b.txt doesn't match the hash it was listed with
+    assert result == 1
+    assert (tmp_path / "a.txt").read_bytes() == b"aaa"
+
+
+def test_async_pull_uses_download_urls_while_valid(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    item = graph.drive.add_file("src/a.txt", b"aaa")
+    graph.drive.add_file("src/b.txt", b"bbbb")
+    download_url = f"{graph.drive.base_url}/download/{item['id']}?tempauth=fakedrive"
+    expiry = time.time() + 60
+    files = {
+        "a.txt": {
+            "size": 3,
+            "directory": "src",
+            "download_url": download_url,
+            "download_url_expiry": expiry,
+        },
+        # Rejected, so downloaded through Graph instead
+        "b.txt": {
+            "size": 4,
+            "directory": "src",
+            "download_url": "https://storage/expired",
+            "download_url_expiry": expiry,
+        },
+    }
+
+    result = _run(
+        sharepoint_transfer_obj, graph, "pull_files_to_worker", files, str(tmp_path)
+    )
+
+    assert result == 0
+    assert (tmp_path / "a.txt").read_bytes() == b"aaa"
+    assert (tmp_path / "b.txt").read_bytes() == b"bbbb"
+    assert ("GET", "https://storage/expired") in graph.requests
+    assert graph.requests.count(("GET", download_url)) == 1
+    assert ("GET", f"{ROOT}:/src/a.txt:/content") not in graph.requests
+    assert graph.requests.count(("GET", f"{ROOT}:/src/b.txt:/content")) == 1
+
+
+def test_async_request_waits_out_throttling(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    graph.drive.add_file("src/a.txt", b"aaa")
+    graph.throttle.add(f"{ROOT}:/src/a.txt:/content")
+
+    result = _run(
+        sharepoint_transfer_obj,
+        graph,
+        "pull_files_to_worker",
+        {"a.txt": {"size": 3, "directory": "src"}},
+        str(tmp_path),
+    )
+
+    assert result == 0
+    assert graph.requests.count(("GET", f"{ROOT}:/src/a.txt:/content")) == 2
+    assert (tmp_path / "a.txt").read_bytes() == b"aaa"
+
+
+def test_async_requests_are_recorded_in_metrics(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    sharepoint_transfer_obj.metrics = RequestMetrics("task")
+    graph.drive.add_file("src/a.txt", b"aaa")
+    graph.throttle.add(f"{ROOT}:/src/a.txt:/content")
+
+    _run(
+        sharepoint_transfer_obj,
+        graph,
+        "pull_files_to_worker",
+        {"a.txt": {"size": 3, "directory": "src"}},
+        str(tmp_path),
+    )
+
+    totals = sharepoint_transfer_obj.metrics.as_dict()["endpoints"]["GET content"]
+    assert totals["requests"] == 2
+    assert totals["statuses"] == {"200": 1, "429": 1}
+    assert totals["retries"] == 1
+    assert totals["bytes_received"] == 3
+
+
+def test_async_files_are_recorded_in_timeline(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    sharepoint_transfer_obj.timeline = TransferTimeline("task")
+    graph.drive.add_file("src/a.txt", b"aaa")
+
+    result = _run(
+        sharepoint_transfer_obj,
+        graph,
+        "pull_files_to_worker",
+        {
+            "a.txt": {"size": 3, "directory": "src"},
+            "missing.txt": {"size": 1, "directory": "src"},
+        },
+        str(tmp_path),
+    )
+
+    assert result == 1
+    files = {
+        record["name"]: record
+        for record in sharepoint_transfer_obj.timeline.as_dict()["files"]
+    }
+    assert files["a.txt"]["status"] == "ok"
+    assert files["a.txt"]["requests"] == 1
+    assert files["missing.txt"]["status"] == "failed"
+
+
+def test_async_transfers_report_progress(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    events: list[dict] = []
+    sharepoint_transfer_obj.add_progress_callback(events.append)
+    graph.drive.add_file("src/a.txt", b"aaa")
+
+    _run(
+        sharepoint_transfer_obj,
+        graph,
+        "pull_files_to_worker",
+        {"a.txt": {"size": 3, "directory": "src"}},
+        str(tmp_path),
+    )
+    sharepoint_transfer_obj.progress.close()
+
+    assert events[-1]["name"] == "a.txt"
+    assert events[-1]["bytes_done"] == 3
+    assert events[-1]["finished"]
+
+
+@pytest.mark.parametrize("action", ["delete", "move"])
+def test_async_post_copy_action(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, action: str
+) -> None:
+    sharepoint_transfer_obj.spec["postCopyAction"] = {
+        "action": action,
+        "destination": "archive",
+    }
+    graph.drive.add_file("src/a.txt", b"a")
+    graph.drive.add_file("src/b.txt", b"b")
+    graph.drive.add_file("archive/b.txt", b"old b")
+    files = {name: {"directory": "src"} for name in ("a.txt", "b.txt")}
+
+    result = _run(sharepoint_transfer_obj, graph, "handle_post_copy_action", files)
+
+    assert result == 0
+    if action == "delete":
+        assert _contents(graph.drive) == {"archive/b.txt": b"old b"}
+    else:
+        # The existing archive/b.txt is overwritten
+        assert _contents(graph.drive) == {"archive/a.txt": b"a", "archive/b.txt": b"b"}
+
+
+def test_sync_interface_runs_on_async_engine(
+    sharepoint_transfer_obj: SharepointTransfer, graph: MockGraph, tmp_path: Path
+) -> None:
+    (tmp_path / "file.txt").write_bytes(b"content")
+
+    class TestEngine(AsyncSharepointEngine):
+        def __init__(self, handler: SharepointTransfer):
+            super().__init__(handler, transport=httpx.MockTransport(graph.handle))
+
+    with (
+        patch.object(sharepoint_async, "AsyncSharepointEngine", TestEngine),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests"
+        ) as mock_requests,
+    ):
+        assert sharepoint_transfer_obj.push_files_from_worker(str(tmp_path)) == 0
+        assert sorted(sharepoint_transfer_obj.list_files("dest")) == ["file.txt"]
+
+    assert not mock_requests.method_calls
+    assert _contents(graph.drive) == {"dest/file.txt": b"content"}
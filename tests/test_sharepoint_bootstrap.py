@@ -0,0 +1,222 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from opentaskpy.exceptions import RemoteTransferError
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    SITE_ID,
+    FakeDrive,
+    FakeDriveTransport,
+)
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+CREDENTIALS = {
+    "access_token": "token",
+    "refresh_token": "new-refresh",
+    "expiry": time.time() + 3600,
+}
+
+
+def _spec(**spec) -> dict:
+    return {
+        "task_id": "bootstrap",
+        "siteHostname": "fakedrive.sharepoint.com",
+        "siteName": "site",
+        "directory": "dir",
+        "protocol": {
+            "name": "opentaskpy.addons.o365.remotehandlers.sharepoint.SharepointTransfer",
+            "refreshToken": "refresh",
+            "clientId": "client",
+            "tenantId": "tenant",
+        },
+        **spec,
+    }
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive()
+    drive.add_file("dir/a.txt", b"a")
+    return drive
+
+
+@pytest.fixture
+def get_access_token():
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+        return_value=dict(CREDENTIALS),
+    ) as get_access_token:
+        yield get_access_token
+
+
+def test_init_makes_no_requests(create_handler, transport, get_access_token) -> None:
+    spec = _spec()
+
+    create_handler(spec)
+
+    get_access_token.assert_not_called()
+    assert transport.counts["requests"] == 0
+    assert spec["protocol"]["refreshToken"] == "refresh"
+
+
+def test_first_operation_bootstraps_once(
+    create_handler, transport, get_access_token
+) -> None:
+    spec = _spec()
+    handler = create_handler(spec)
+
+    assert list(handler.list_files("dir")) == ["a.txt"]
+    assert list(handler.list_files("dir")) == ["a.txt"]
+
+    get_access_token.assert_called_once()
+    assert handler.site_id == SITE_ID
+    assert spec["protocol"]["refreshToken"] == "new-refresh"
+    # One site lookup, and two listings
+    assert transport.counts["requests"] == 3
+
+
+def test_concurrent_first_use_bootstraps_once(
+    create_handler, transport, get_access_token
+) -> None:
+    handler = create_handler(_spec())
+    results: list = []
+
+    def use() -> None:
+        results.append(handler.site_id)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [SITE_ID] * 8
+    get_access_token.assert_called_once()
+    assert transport.counts["requests"] == 1
+
+
+def test_bootstrap_overlaps_warm_up_and_cacheable_variables(
+    create_handler, transport, get_access_token
+) -> None:
+    transport.warm_up = MagicMock()
+    spec = _spec(
+        cacheableVariables=[
+            {
+                "variableName": "protocol.refreshToken",
+                "cachingPlugin": "file",
+                "cacheArgs": {"file": "refresh.txt"},
+            }
+        ]
+    )
+    handler = create_handler(spec)
+
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.cache_utils.update_cache"
+    ) as update_cache:
+        handler._bootstrap()
+
+    transport.warm_up.assert_called_once_with(
+        "https://graph.microsoft.com/v1.0", handler.timeout
+    )
+    update_cache.assert_called_once_with(spec["cacheableVariables"][0], "new-refresh")
+
+
+def test_failed_bootstrap_is_retried(
+    create_handler, transport, get_access_token
+) -> None:
+    get_access_token.side_effect = [
+        RemoteTransferError("Could not acquire token"),
+        dict(CREDENTIALS),
+    ]
+    handler = create_handler(_spec())
+
+    with pytest.raises(RemoteTransferError):
+        handler.list_files("dir")
+
+    assert list(handler.list_files("dir")) == ["a.txt"]
+    assert get_access_token.call_count == 2
+
+
+def _batch_spec(**spec) -> dict:
+    spec = _spec(**spec)
+    spec["protocol"]["batchBootstrap"] = True
+    return spec
+
+
+def test_batch_bootstrap_primes_caches(get_access_token) -> None:
+    transport = FakeDriveTransport(FakeDrive(libraries=("Documents", "Reports")))
+    transport.drive.add_file("dir/a.txt", b"a")
+    handler = SharepointTransfer(_batch_spec())
+    handler._transport = transport
+
+    handler._bootstrap()
+
+    assert handler.site_id == SITE_ID
+    # The site, drives, root and directory all came back in a single $batch
+    assert transport.counts["requests"] == 1
+    assert transport.counts["POST"] == 1
+    assert handler._drive_ids == {"Documents": "drive-1", "Reports": "drive-2"}
+    assert handler._folder_ids == {
+        "": "root-drive-1",
+        "dir": transport.drive.find("dir")["id"],
+    }
+
+    # None of these need another lookup
+    assert handler._get_drive_id("Reports") == "drive-2"
+    assert handler.get_file_url_from_path("") == "root-drive-1"
+    assert handler.create_or_get_folder("dir") == transport.drive.find("dir")["id"]
+    assert transport.counts["requests"] == 1
+
+
+def test_batch_bootstrap_skips_missing_directory(
+    create_handler, transport, get_access_token
+) -> None:
+    handler = create_handler(_batch_spec(directory="missing"))
+
+    handler._bootstrap()
+
+    assert handler.site_id == SITE_ID
+    assert handler._folder_ids == {"": "root-drive-1"}
+
+
+def test_batch_bootstrap_falls_back_to_site_lookup(
+    create_handler, transport, get_access_token
+) -> None:
+    transport.drive.handle = MagicMock(
+        side_effect=[
+            (400, {}, {"error": {"code": "invalidRequest", "message": "No"}}),
+            (200, {}, {"id": SITE_ID}),
+        ]
+    )
+    handler = create_handler(_batch_spec())
+
+    handler._bootstrap()
+
+    assert handler.site_id == SITE_ID
+    assert handler._drive_ids is None
+    assert transport.counts["requests"] == 2
+
+
+def test_batch_bootstrap_reports_site_errors(
+    create_handler, transport, get_access_token
+) -> None:
+    handler = create_handler(_batch_spec(siteName="other/site"))
+
+    with pytest.raises(RemoteTransferError):
+        handler._bootstrap()
+
+
+def test_drive_ids_are_fetched_once(
+    create_handler, transport, get_access_token
+) -> None:
+    handler = create_handler(_spec())
+
+    assert handler._get_drive_id("Documents") == "drive-1"
+    assert handler._get_drive_id("Documents") == "drive-1"
+    with pytest.raises(RemoteTransferError):
+        handler._get_drive_id("Missing")
+
+    # One site lookup, and one drives list
+    assert transport.counts["requests"] == 2
@@ -0,0 +1,114 @@
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import FakeDrive
+
+# A file watch that checks whether the folder has changed before listing it
+WATCH = {"timeout": 60, "changeDetection": True}
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive(libraries=("Documents", "Reports"), page_size=2)
+    for index in range(5):
+        drive.add_file(f"watch/old{index}.txt", b"old")
+    drive.add_file("watch/sub/nested.txt", b"nested")
+    drive.add_file("reports/r.txt", b"r", drive_id="drive-2")
+    return drive
+
+
+def test_unchanged_folder_is_not_listed_again(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+    assert handler.list_files("watch", r"new.*\.txt") == {}
+    requests = transport.counts["requests"]
+
+    for _ in range(3):
+        assert handler.list_files("watch", r"new.*\.txt") == {}
+
+    # Just the folder, once per poll
+    assert transport.counts["requests"] == requests + 3
+
+
+def test_changed_folder_is_listed_again(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+    assert handler.list_files("watch", r"new.*\.txt") == {}
+
+    transport.drive.add_file("watch/new.txt", b"new")
+
+    assert list(handler.list_files("watch", r"new.*\.txt")) == ["new.txt"]
+
+
+def test_changes_below_the_folder_are_noticed(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+    handler.list_files("/Reports/reports")
+    handler.list_files("watch")
+
+    transport.drive.add_file("watch/sub/other.txt", b"other")
+    transport.drive.add_file("reports/new.txt", b"new", drive_id="drive-2")
+
+    requests = transport.counts["requests"]
+    assert "new.txt" in handler.list_files("/Reports/reports")
+    handler.list_files("watch")
+    # Each folder, then its listing
+    assert transport.counts["requests"] == requests + 6
+
+
+def test_repeated_listings_can_be_changed_by_the_caller(
+    make_handler, transport
+) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+    first = handler.list_files("watch")
+    first.pop("old0.txt")
+    first["old1.txt"]["size"] = 0
+
+    second = handler.list_files("watch")
+
+    assert len(second) == 5
+    assert second["old1.txt"]["size"] == 3
+
+
+def test_listings_are_separate_per_pattern(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+    handler.list_files("watch", r"old0\.txt")
+
+    assert len(handler.list_files("watch", r"old.*")) == 5
+
+
+def test_missing_folder_is_listed_as_usual(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch=WATCH)
+
+    assert handler.list_files("missing") == {}
+    assert handler._folder_listings is None
+
+
+def test_every_poll_lists_without_change_detection(make_handler, transport) -> None:
+    handler = make_handler(transport, fileWatch={**WATCH, "changeDetection": False})
+    handler.list_files("watch")
+    requests = transport.counts["requests"]
+
+    handler.list_files("watch")
+
+    # Three pages of two
+    assert transport.counts["requests"] == requests + 3
+
+
+def test_folders_without_a_ctag_are_listed_every_time(
+    make_handler, transport, monkeypatch
+) -> None:
+    item_json = FakeDrive._item_json
+
+    def without_ctag(drive: FakeDrive, item: dict) -> dict:
+        body = item_json(drive, item)
+        if "folder" in body:
+            # An eTag that stays the same when the folder's children change
+            body["eTag"] = f'"{{{item["id"]}}},1"'
+            del body["cTag"]
+        return body
+
+    monkeypatch.setattr(FakeDrive, "_item_json", without_ctag)
+    handler = make_handler(transport, fileWatch=WATCH)
+    assert handler.list_files("watch", r"new.*\.txt") == {}
+
+    transport.drive.add_file("watch/new.txt", b"new")
+
+    assert list(handler.list_files("watch", r"new.*\.txt")) == ["new.txt"]
+    assert handler._folder_listings is None
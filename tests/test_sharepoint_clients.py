@@ -0,0 +1,217 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers import clients
+from opentaskpy.addons.o365.remotehandlers.clients import (
+    SessionTransport,
+    acquire_client,
+    client_key,
+    close_clients,
+    release_client,
+)
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    SITE_ID,
+    FakeDrive,
+)
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+
+def _spec(shared: bool = True, **spec) -> dict:
+    return {
+        "task_id": "clients",
+        "siteHostname": "fakedrive.sharepoint.com",
+        "siteName": "site",
+        "directory": "dir",
+        "protocol": {
+            "name": "opentaskpy.addons.o365.remotehandlers.sharepoint.SharepointTransfer",
+            "refreshToken": "refresh",
+            "clientId": "client",
+            "tenantId": "tenant",
+            "sharedClient": shared,
+        },
+        **spec,
+    }
+
+
+def _credentials(expires_in: float = 3600) -> dict:
+    return {
+        "access_token": "token",
+        "refresh_token": "new-refresh",
+        "expiry": time.time() + expires_in,
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_clients():
+    yield
+    close_clients()
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive(libraries=("Documents", "Reports"))
+    drive.add_file("dir/a.txt", b"a")
+    return drive
+
+
+@pytest.fixture
+def get_access_token():
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+        side_effect=lambda protocol: _credentials(),
+    ) as get_access_token:
+        yield get_access_token
+
+
+def test_handlers_for_a_site_share_its_client(
+    create_handler, transport, get_access_token
+) -> None:
+    first = create_handler(_spec())
+    assert list(first.list_files("dir")) == ["a.txt"]
+    assert first._get_drive_id("Reports") == "drive-2"
+
+    second_spec = _spec()
+    second = create_handler(second_spec)
+    assert second._client is first._client
+    assert list(second.list_files("dir")) == ["a.txt"]
+    assert second._get_drive_id("Reports") == "drive-2"
+
+    get_access_token.assert_called_once()
+    assert second.site_id == SITE_ID
+    assert second_spec["protocol"]["refreshToken"] == "new-refresh"
+    # One site lookup, one drives list, and two listings
+    assert transport.counts["requests"] == 4
+
+
+def test_other_sites_get_their_own_client(
+    create_handler, transport, get_access_token
+) -> None:
+    first = create_handler(_spec())
+    second = create_handler(_spec(siteName="other"))
+    unshared = create_handler(_spec(shared=False))
+
+    assert first._client is not second._client
+    assert unshared._client is None
+
+
+def test_handlers_for_other_users_keep_their_own_credentials(
+    create_handler, transport
+) -> None:
+    def token_for(protocol: dict) -> dict:
+        user = protocol["refreshToken"]
+        return {
+            "access_token": f"token-{user}",
+            "refresh_token": f"{user}-rotated",
+            "expiry": time.time() + 3600,
+        }
+
+    other_spec = _spec()
+    other_spec["protocol"]["refreshToken"] = "other"
+    later_spec = _spec()
+    later_spec["protocol"]["refreshToken"] = "refresh-rotated"
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+        side_effect=token_for,
+    ):
+        first = create_handler(_spec())
+        first._bootstrap()
+        other = create_handler(other_spec)
+        other._bootstrap()
+        # Given the refresh token the first handler was rotated to
+        later = create_handler(later_spec)
+        later._bootstrap()
+
+    assert other._client is not first._client
+    assert first.credentials["access_token"] == "token-refresh"
+    assert other.credentials["access_token"] == "token-other"
+    assert other_spec["protocol"]["refreshToken"] == "other-rotated"
+    assert later._client is first._client
+    assert later.credentials["access_token"] == "token-refresh"
+
+
+def test_expiring_token_is_refreshed(
+    create_handler, transport, get_access_token
+) -> None:
+    first = create_handler(_spec())
+    first._bootstrap()
+    first._client.credentials = _credentials(expires_in=60)
+
+    second = create_handler(_spec())
+    second._bootstrap()
+
+    assert get_access_token.call_count == 2
+    assert second.credentials["expiry"] > time.time() + 3000
+    assert first._client.token_is_valid()
+    # The site isn't looked up again
+    assert transport.counts["requests"] == 1
+
+
+def test_cacheable_variables_are_written_for_each_handler(
+    create_handler, transport, get_access_token
+) -> None:
+    create_handler(_spec())._bootstrap()
+    handler = create_handler(
+        _spec(
+            cacheableVariables=[
+                {
+                    "variableName": "protocol.refreshToken",
+                    "cachingPlugin": "file",
+                    "cacheArgs": {"file": "refresh.txt"},
+                }
+            ]
+        )
+    )
+
+    with patch.object(handler, "handle_cacheable_variables") as handle:
+        handler._bootstrap()
+
+    handle.assert_called_once()
+
+
+def test_tidy_releases_the_client(create_handler, transport, get_access_token) -> None:
+    first = create_handler(_spec())
+    second = create_handler(_spec())
+    client = first._client
+
+    first.tidy()
+    assert first._client is None
+    assert client.references == 1
+    assert client.idle_since is None
+
+    second.tidy()
+    assert client.references == 0
+    assert client.idle_since is not None
+    # Kept for the next task
+    assert create_handler(_spec())._client is client
+
+
+def test_idle_clients_are_closed(monkeypatch) -> None:
+    key = client_key(_spec())
+    client = acquire_client(key)
+    client.transport = MagicMock()
+    transport = client.transport
+    release_client(client)
+
+    monkeypatch.setattr(clients, "CLIENT_IDLE_TIMEOUT", 0)
+    other = acquire_client(key)
+
+    transport.close.assert_called_once()
+    assert other is not client
+
+
+def test_connections_are_shared(get_access_token) -> None:
+    first = SharepointTransfer(_spec())
+    second = SharepointTransfer(_spec())
+
+    assert isinstance(first._transport, SessionTransport)
+    assert second._transport is first._transport
+
+    with patch.object(SessionTransport, "close") as close:
+        first.tidy()
+        second.tidy()
+        close.assert_not_called()
+
+        close_clients()
+        close.assert_called_once()
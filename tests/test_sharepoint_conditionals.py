@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.conditionals import ListingConditions
+from opentaskpy.addons.o365.remotehandlers.fakedrive import FakeDrive
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive(page_size=2)
+    # Years of history, and two files from today
+    for index in range(10):
+        drive.add_file(f"history/old{index}.csv", b"x" * 100)
+        drive.find(f"history/old{index}.csv")["modified"] = time.time() - (
+            index + 1
+        ) * (100 * DAY)
+    drive.add_file("history/today.csv", b"x" * 100)
+    drive.add_file("history/today_empty.csv", b"")
+    return drive
+
+
+def test_listing_stops_at_files_older_than_the_window(make_handler, transport) -> None:
+    handler = make_handler(transport, conditionals={"age": {"lt": DAY}})
+
+    files = handler.list_files("history", r".*\.csv")
+
+    assert sorted(files) == ["today.csv", "today_empty.csv"]
+    # The page with today's files, then the first page of older ones
+    assert transport.counts["requests"] == 2
+
+
+def test_size_conditionals_are_applied_while_listing(make_handler, transport) -> None:
+    handler = make_handler(
+        transport, conditionals={"size": {"gt": 50}, "age": {"lt": DAY}}
+    )
+
+    assert list(handler.list_files("history")) == ["today.csv"]
+    # The empty file, and the first page of older ones
+    handler.logger.info.assert_any_call(
+        "Skipped 3 files that don't meet the size or age conditionals"
+    )
+
+
+def test_unordered_libraries_are_listed_in_full(make_handler, transport) -> None:
+    transport.drive.orderable = ()
+    handler = make_handler(transport, conditionals={"age": {"lt": DAY}})
+
+    files = handler.list_files("history")
+
+    assert sorted(files) == ["today.csv", "today_empty.csv"]
+    # The rejected ordered request, then all six pages
+    assert transport.counts["requests"] == 7
+
+
+def test_out_of_order_pages_stop_early_stopping() -> None:
+    conditions = ListingConditions(max_age=DAY)
+    old = {"lastModifiedDateTime": "2020-01-01T00:00:00Z"}
+    new = {"lastModifiedDateTime": "2999-01-01T00:00:00Z"}
+
+    assert conditions.window_passed([old, new]) is False
+    assert conditions.window_passed([old, old]) is False
+    assert conditions.in_order is False
+
+
+@pytest.mark.parametrize(
+    ("conditionals", "file_watch", "checked"),
+    [
+        ({"age": {"lt": DAY}}, False, True),
+        ({"size": {"lt": 10}}, False, True),
+        # Left to OTF
+        ({"age": {"gt": DAY}}, False, False),
+        ({"count": {"minCount": 2}}, False, False),
+        # OTF doesn't check conditionals during a file watch unless asked to
+        ({"age": {"lt": DAY}}, True, False),
+        ({"age": {"lt": DAY}, "checkDuringFilewatch": True}, True, True),
+    ],
+)
+def test_conditionals_checked_while_listing(
+    conditionals: dict, file_watch: bool, checked: bool
+) -> None:
+    spec: dict = {"conditionals": conditionals}
+    if file_watch:
+        spec["fileWatch"] = {"timeout": 60}
+
+    assert (ListingConditions.from_spec(spec) is not None) is checked
+
+
+def test_listing_without_conditionals_is_unordered(make_handler, transport) -> None:
+    handler = make_handler(transport, conditionals={})
+    urls: list[str] = []
+    send_request = handler._send_request
+
+    def record(method_upper: str, url: str, **kwargs) -> object:
+        urls.append(url)
+        return send_request(method_upper, url, **kwargs)
+
+    handler._send_request = record  # type: ignore[method-assign]
+
+    assert len(handler.list_files("history")) == 12
+    assert not any("$orderby" in url for url in urls)
@@ -0,0 +1,211 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+APP = {"tenantId": "tenant", "clientId": "client"}
+
+
+def _handler(site_id: str, spec: dict) -> SharepointTransfer:
+    """Build a SharepointTransfer object without running network-heavy __init__."""
+    obj = SharepointTransfer.__new__(SharepointTransfer)
+    obj.logger = MagicMock()
+    obj.spec = spec
+    obj.credentials = {"access_token": "token", "expiry": 4102444800}
+    obj.timeout = 30
+    obj.site_id = site_id
+    return obj
+
+
+@pytest.fixture
+def source() -> SharepointTransfer:
+    return _handler("source-site", {"siteName": "source", "protocol": dict(APP)})
+
+
+@pytest.fixture
+def destination() -> SharepointTransfer:
+    return _handler(
+        "dest-site",
+        {
+            "siteName": "dest",
+            "directory": "archive",
+            "rename": {"pattern": "^", "sub": "copy_"},
+            "protocol": dict(APP),
+        },
+    )
+
+
+def _response(status_code: int, json: dict | None = None, headers=None) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json or {}
+    response.headers = headers or {}
+    return response
+
+
+def test_supports_direct_transfer_can_be_disabled(source: SharepointTransfer) -> None:
+    assert source.supports_direct_transfer()
+
+    source.spec["protocol"]["serverSideCopy"] = False
+    assert not source.supports_direct_transfer()
+
+
+def test_transfer_files_copies_server_side_and_polls_monitors(
+    source: SharepointTransfer, destination: SharepointTransfer
+) -> None:
+    files = {
+        "a.txt": {"size": 1, "modified_time": 0, "directory": "src"},
+        "b.txt": {"size": 1, "modified_time": 0, "directory": "src"},
+    }
+    monitor_responses = {
+        "https://monitor/a.txt": [
+            _response(202, {"status": "inProgress"}),
+            _response(303),
+        ],
+        "https://monitor/b.txt": [_response(200, {"status": "completed"})],
+    }
+
+    def fake_post(url: str, **kwargs) -> MagicMock:
+        name = url.split(":/copy")[0].split("/")[-1]
+        return _response(202, headers={"Location": f"https://monitor/{name}"})
+
+    def fake_get(url: str, **kwargs) -> MagicMock:
+        assert "headers" not in kwargs
+        assert kwargs["allow_redirects"] is False
+        return monitor_responses[url].pop(0)
+
+    with (
+        patch.object(
+            SharepointTransfer,
+            "get_folder_reference",
+            return_value={"driveId": "dest-drive", "id": "archive-id"},
+        ) as mock_reference,
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post",
+            side_effect=fake_post,
+        ) as mock_post,
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get",
+            side_effect=fake_get,
+        ),
+        patch("opentaskpy.addons.o365.remotehandlers.sharepoint.sleep") as mock_sleep,
+    ):
+        result = source.transfer_files(files, destination.spec, destination)
+
+    assert result == 0
+    mock_reference.assert_called_once_with("archive")
+    assert mock_sleep.call_count == 1
+
+    copy_urls = [call.args[0] for call in mock_post.call_args_list]
+    assert copy_urls == [
+        "https://graph.microsoft.com/v1.0/sites/source-site/drive/root:/src/a.txt:/copy"
+        "?@microsoft.graph.conflictBehavior=replace",
+        "https://graph.microsoft.com/v1.0/sites/source-site/drive/root:/src/b.txt:/copy"
+        "?@microsoft.graph.conflictBehavior=replace",
+    ]
+    assert mock_post.call_args_list[0].kwargs["json"] == {
+        "parentReference": {"driveId": "dest-drive", "id": "archive-id"},
+        "name": "copy_a.txt",
+    }
+
+
+def test_transfer_files_reports_failed_copy(
+    source: SharepointTransfer, destination: SharepointTransfer
+) -> None:
+    files = {"a.txt": {"size": 1, "modified_time": 0, "directory": "src"}}
+
+    with (
+        patch.object(
+            SharepointTransfer,
+            "get_folder_reference",
+            return_value={"driveId": "dest-drive", "id": "archive-id"},
+        ),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post",
+            return_value=_response(202, headers={"Location": "https://monitor/a"}),
+        ),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get",
+            return_value=_response(200, {"status": "failed"}),
+        ),
+    ):
+        assert source.transfer_files(files, destination.spec, destination) == 1
+
+
+def test_transfer_files_streams_to_other_tenants(
+    source: SharepointTransfer, destination: SharepointTransfer
+) -> None:
+    destination.spec["protocol"]["tenantId"] = "other-tenant"
+    files = {"a.txt": {"size": 1, "modified_time": 0, "directory": "src"}}
+    stream = MagicMock()
+
+    with (
+        patch.object(SharepointTransfer, "open_file", return_value=stream),
+        patch.object(
+            SharepointTransfer, "upload_stream", return_value=0
+        ) as mock_upload,
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post"
+        ) as mock_post,
+    ):
+        assert source.transfer_files(files, destination.spec, destination) == 0
+
+    mock_post.assert_not_called()
+    mock_upload.assert_called_once_with(stream.__enter__.return_value, "a.txt", 1)
+
+
+def test_transfer_files_streams_refused_copies(
+    source: SharepointTransfer, destination: SharepointTransfer
+) -> None:
+    files = {
+        "a.txt": {"size": 1, "modified_time": 0, "directory": "src"},
+        "b.txt": {"size": 1, "modified_time": 0, "directory": "src"},
+    }
+
+    def fake_post(url: str, **kwargs) -> MagicMock:
+        if "a.txt" in url:
+            return _response(403, {"error": {"code": "accessDenied"}})
+        return _response(202, headers={"Location": "https://monitor/b"})
+
+    with (
+        patch.object(
+            SharepointTransfer,
+            "get_folder_reference",
+            return_value={"driveId": "dest-drive", "id": "archive-id"},
+        ),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post",
+            side_effect=fake_post,
+        ),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get",
+            return_value=_response(303),
+        ),
+        patch.object(SharepointTransfer, "open_file", return_value=MagicMock()),
+        patch.object(
+            SharepointTransfer, "upload_stream", return_value=0
+        ) as mock_upload,
+    ):
+        assert source.transfer_files(files, destination.spec, destination) == 0
+
+    assert [call.args[1] for call in mock_upload.call_args_list] == ["a.txt"]
+
+
+def test_failed_copy_checks_only_fail_their_file(
+    source: SharepointTransfer,
+) -> None:
+    def get_copy_status(monitor_url: str) -> str:
+        if monitor_url == "https://monitor/a":
+            raise ConnectionError("reset")
+        return "completed"
+
+    with patch.object(
+        SharepointTransfer, "_get_copy_status", side_effect=get_copy_status
+    ):
+        failed = source._wait_for_copies(
+            {"a.txt": "https://monitor/a", "b.txt": "https://monitor/b"}, {}
+        )
+
+    assert failed == ["a.txt"]
+    source.logger.info.assert_any_call("Successfully copied file: b.txt")
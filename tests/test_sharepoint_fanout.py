@@ -0,0 +1,125 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers import fanout
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+CREDENTIALS = {
+    "access_token": "token",
+    "refresh_token": "new-refresh",
+    "expiry": time.time() + 3600,
+}
+
+
+def _spec(directory: str, tenant: str = "tenant", **spec) -> dict:
+    return {
+        "task_id": "fanout",
+        "siteHostname": "fakedrive.sharepoint.com",
+        "siteName": "site",
+        "directory": directory,
+        "fanOut": True,
+        "protocol": {
+            "name": "opentaskpy.addons.o365.remotehandlers.sharepoint.SharepointTransfer",
+            "refreshToken": "refresh",
+            "clientId": "client",
+            "tenantId": tenant,
+        },
+        **spec,
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_fan_outs():
+    yield
+    fanout._fan_outs.clear()
+
+
+@pytest.fixture(autouse=True)
+def get_access_token():
+    with (
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+            side_effect=lambda protocol: dict(CREDENTIALS),
+        ) as get_access_token,
+        patch("opentaskpy.addons.o365.remotehandlers.sharepoint.sleep"),
+    ):
+        yield get_access_token
+
+
+@pytest.fixture
+def staging(tmp_path):
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_bytes(name.encode() * 100)
+    return str(tmp_path)
+
+
+def test_later_destinations_copy_server_side(
+    create_handler, transport, staging
+) -> None:
+    first = create_handler(_spec("one"))
+    second = create_handler(_spec("two", rename={"pattern": "^", "sub": "x_"}))
+
+    assert first.push_files_from_worker(staging) == 0
+    puts = transport.counts["PUT"]
+    assert second.push_files_from_worker(staging) == 0
+
+    # Nothing more was uploaded from the worker
+    assert transport.counts["PUT"] == puts
+    assert transport.drive.find("two/x_a.txt")["content"] == b"a.txt" * 100
+    assert transport.drive.find("two/x_b.txt")["content"] == b"b.txt" * 100
+    assert first.fan_out_stats == {"uploaded": 2, "copied": 0, "failed": 0}
+    assert second.fan_out_stats == {"uploaded": 0, "copied": 2, "failed": 0}
+    assert first._fan_out.results == {
+        "fakedrive.sharepoint.com/site/one": first.fan_out_stats,
+        "fakedrive.sharepoint.com/site/two": second.fan_out_stats,
+    }
+
+
+def test_changed_files_are_uploaded_again(create_handler, transport, staging) -> None:
+    first = create_handler(_spec("one"))
+    second = create_handler(_spec("two"))
+    assert first.push_files_from_worker(staging) == 0
+
+    os.utime(f"{staging}/a.txt", (0, 0))
+    assert second.push_files_from_worker(staging) == 0
+
+    assert second.fan_out_stats == {"uploaded": 1, "copied": 1, "failed": 0}
+
+
+def test_other_tenants_upload_from_the_worker(
+    create_handler, transport, staging
+) -> None:
+    first = create_handler(_spec("one"))
+    second = create_handler(_spec("two", tenant="other"))
+    assert first.push_files_from_worker(staging) == 0
+    assert second.push_files_from_worker(staging) == 0
+
+    assert second.fan_out_stats == {"uploaded": 2, "copied": 0, "failed": 0}
+
+
+def test_failed_copies_are_uploaded_from_the_worker(
+    create_handler, transport, staging
+) -> None:
+    first = create_handler(_spec("one"))
+    second = create_handler(_spec("two"))
+    assert first.push_files_from_worker(staging) == 0
+
+    with patch.object(SharepointTransfer, "_get_copy_status", return_value="failed"):
+        assert second.push_files_from_worker(staging) == 0
+
+    assert second.fan_out_stats == {"uploaded": 2, "copied": 0, "failed": 0}
+    assert transport.drive.find("two/a.txt") is not None
+
+
+def test_fan_out_is_released_in_tidy(create_handler, transport) -> None:
+    first = create_handler(_spec("one"))
+    second = create_handler(_spec("two"))
+    assert first._fan_out is second._fan_out
+
+    first.tidy()
+    assert "fanout" in fanout._fan_outs
+    second.tidy()
+    assert "fanout" not in fanout._fan_outs
@@ -0,0 +1,150 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+import requests
+
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import (
+    HashingReader,
+    QuickXorHash,
+)
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.transports import Http2Transport
+
+
+@pytest.fixture
+def sharepoint_transfer_obj() -> SharepointTransfer:
+    """Build a SharepointTransfer object without running network-heavy __init__."""
+    obj = SharepointTransfer.__new__(SharepointTransfer)
+    obj.logger = MagicMock()
+    obj.spec = {"siteName": "site", "protocol": {"httpVersion": "2"}}
+    obj.credentials = {"access_token": "token", "expiry": 4102444800}
+    obj.timeout = 30
+    obj.site_id = "site-id"
+    return obj
+
+
+def _use_transport(obj: SharepointTransfer, handler) -> list[httpx.Request]:
+    requests_sent: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        request.read()
+        requests_sent.append(request)
+        return handler(request)
+
+    obj._transport = Http2Transport(transport=httpx.MockTransport(record))
+    return requests_sent
+
+
+def test_request_is_sent_through_http2_transport(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    sent = _use_transport(
+        sharepoint_transfer_obj, lambda request: httpx.Response(200, json={"id": "1"})
+    )
+
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get"
+    ) as mock_get:
+        response = sharepoint_transfer_obj._request(
+            "GET",
+            "https://graph.microsoft.com/v1.0/sites/site-id",
+            headers={"Authorization": "Bearer token"},
+            timeout=5,
+        )
+
+    mock_get.assert_not_called()
+    assert response.status_code == 200
+    assert response.json() == {"id": "1"}
+    assert sent[0].headers["Authorization"] == "Bearer token"
+    assert sent[0].extensions["timeout"]["read"] == 5
+
+
+def test_file_like_body_is_streamed_with_content_length(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    data = b"x" * 3_000_000
+    sent = _use_transport(
+        sharepoint_transfer_obj, lambda request: httpx.Response(201, json={})
+    )
+    hasher = QuickXorHash()
+
+    response = sharepoint_transfer_obj._request(
+        "PUT",
+        "https://graph.microsoft.com/v1.0/upload",
+        data=HashingReader(io.BytesIO(data), hasher, len(data)),
+    )
+
+    assert response.status_code == 201
+    assert sent[0].headers["Content-Length"] == str(len(data))
+    assert sent[0].content == data
+    assert hasher.digest() == QuickXorHash(data).digest()
+
+
+def test_streamed_response_and_redirects(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/monitor":
+            return httpx.Response(303, headers={"Location": "https://example/item"})
+        return httpx.Response(200, content=b"file content")
+
+    _use_transport(sharepoint_transfer_obj, handler)
+
+    response = sharepoint_transfer_obj._request(
+        "GET", "https://example/monitor", allow_redirects=False
+    )
+    assert response.status_code == 303
+
+    response = sharepoint_transfer_obj._request(
+        "GET", "https://example/content", stream=True
+    )
+    assert b"".join(response.iter_content(4)) == b"file content"
+    response.close()
+
+
+def test_http2_read_timeout_is_retried(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json={})
+
+    _use_transport(sharepoint_transfer_obj, handler)
+
+    with patch.object(SharepointTransfer._request.retry, "sleep"):  # type: ignore[attr-defined]
+        response = sharepoint_transfer_obj._request("GET", "https://example/item")
+
+    assert response.status_code == 200
+    assert len(attempts) == 2
+    assert sharepoint_transfer_obj.logger.warning.called
+
+
+def test_http2_connection_errors_match_requests(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=request)
+
+    _use_transport(sharepoint_transfer_obj, handler)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        sharepoint_transfer_obj._request("GET", "https://example/item")
+
+
+def test_http2_transport_is_created_and_closed(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    transport = sharepoint_transfer_obj._create_http2_transport()
+    assert isinstance(transport, Http2Transport)
+    sharepoint_transfer_obj._transport = transport
+
+    sharepoint_transfer_obj.tidy()
+
+    assert sharepoint_transfer_obj._transport is None
+    assert transport.client.is_closed
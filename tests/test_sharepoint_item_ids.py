@@ -0,0 +1,163 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import FakeDrive
+from opentaskpy.addons.o365.remotehandlers.sharepoint import (
+    SharepointTransfer,
+    item_action_url,
+    listed_item_url,
+)
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive(libraries=("Documents", "Reports"))
+    drive.add_file("in/a.txt", b"a" * 10, drive_id="drive-2")
+    drive.add_file("in/b.txt", b"b" * 20, drive_id="drive-2")
+    return drive
+
+
+def _requested_urls(handler: SharepointTransfer) -> list[str]:
+    urls: list[str] = []
+    send_request = handler._send_request
+
+    def record(method_upper: str, url: str, **kwargs) -> object:
+        urls.append(f"{method_upper} {url}")
+        return send_request(method_upper, url, **kwargs)
+
+    handler._send_request = record  # type: ignore[method-assign]
+    return urls
+
+
+def test_listing_records_drive_and_item_ids(make_handler, transport) -> None:
+    files = make_handler(transport).list_files("/Reports/in")
+
+    assert files["a.txt"]["drive_id"] == "drive-2"
+    assert (
+        files["a.txt"]["item_id"] == transport.drive.find("in/a.txt", "drive-2")["id"]
+    )
+    assert listed_item_url(files["a.txt"]) == (
+        "https://graph.microsoft.com/v1.0/drives/drive-2/items/"
+        f"{files['a.txt']['item_id']}"
+    )
+
+
+def test_downloads_address_items_by_id(make_handler, transport, tmp_path) -> None:
+    handler = make_handler(transport)
+    files = handler.list_files("/Reports/in")
+    urls = _requested_urls(handler)
+
+    assert handler.pull_files_to_worker(files, str(tmp_path)) == 0
+
+    assert (tmp_path / "b.txt").read_bytes() == b"b" * 20
+    assert sorted(urls) == [
+        f"GET {listed_item_url(files[name])}/content" for name in ("a.txt", "b.txt")
+    ]
+
+
+def test_post_copy_delete_addresses_items_by_id(make_handler, transport) -> None:
+    handler = make_handler(transport, postCopyAction={"action": "delete"})
+    files = handler.list_files("/Reports/in")
+    urls = _requested_urls(handler)
+
+    assert handler.handle_post_copy_action(files) == 0
+
+    assert transport.drive.find("in/a.txt", "drive-2") is None
+    assert sorted(urls) == [
+        f"DELETE {listed_item_url(files[name])}" for name in ("a.txt", "b.txt")
+    ]
+
+
+def test_files_without_ids_are_found_by_path(make_handler, transport, tmp_path) -> None:
+    handler = make_handler(transport)
+    files = {"a.txt": {"size": 10, "modified_time": 0, "directory": "/Reports/in"}}
+
+    assert listed_item_url(files["a.txt"]) is None
+    assert handler.pull_files_to_worker(files, str(tmp_path)) == 0
+    assert (tmp_path / "a.txt").read_bytes() == b"a" * 10
+
+
+def test_item_action_url_handles_both_forms() -> None:
+    assert item_action_url("https://x/drive/root:/a.txt", "content") == (
+        "https://x/drive/root:/a.txt:/content"
+    )
+    assert item_action_url("https://x/drives/d/items/i", "content") == (
+        "https://x/drives/d/items/i/content"
+    )
+
+
+def test_server_side_copy_addresses_items_by_id(make_handler, transport) -> None:
+    app = {"tenantId": "tenant", "clientId": "client"}
+    source = make_handler(transport, protocol=dict(app))
+    files = source.list_files("/Reports/in")
+    urls = _requested_urls(source)
+
+    with patch.object(
+        SharepointTransfer,
+        "get_folder_reference",
+        return_value={"driveId": "drive-1", "id": "root-drive-1"},
+    ):
+        destination = make_handler(transport, protocol=dict(app))
+        assert source.transfer_files(files, {}, destination) == 0
+
+    assert transport.drive.find("a.txt") is not None
+    copies = [url for url in urls if url.startswith("POST")]
+    assert sorted(copies) == [
+        f"POST {listed_item_url(files[name])}"
+        "/copy?@microsoft.graph.conflictBehavior=replace"
+        for name in ("a.txt", "b.txt")
+    ]
+
+
+def test_direct_download_uses_the_listed_download_url(
+    make_handler, transport, tmp_path
+) -> None:
+    handler = make_handler(transport, protocol={"directDownload": True})
+    files = handler.list_files("/Reports/in")
+    urls = _requested_urls(handler)
+
+    assert handler.pull_files_to_worker(files, str(tmp_path)) == 0
+
+    assert (tmp_path / "a.txt").read_bytes() == b"a" * 10
+    assert sorted(urls) == [
+        f"GET {files[name]['download_url']}" for name in ("a.txt", "b.txt")
+    ]
+    assert (
+        "download_url" not in make_handler(transport).list_files("/Reports/in")["a.txt"]
+    )
+
+
+def test_download_urls_are_kept_out_of_the_listing_repr(
+    make_handler, transport
+) -> None:
+    handler = make_handler(transport, protocol={"directDownload": True})
+    files = handler.list_files("/Reports/in")
+    download_url = files["a.txt"]["download_url"]
+
+    # As OTF logs the listing during file watches
+    assert download_url not in repr(files)
+    assert "download_url" not in list(files["a.txt"])
+    assert files["a.txt"].copy()["download_url"] == download_url
+
+
+def test_expired_download_urls_go_through_graph(
+    make_handler, transport, tmp_path
+) -> None:
+    handler = make_handler(transport, protocol={"directDownload": True})
+    files = handler.list_files("/Reports/in")
+    files["a.txt"]["download_url_expiry"] = time.time() - 1
+    # No longer accepted by the storage host
+    files["b.txt"]["download_url"] = files["b.txt"]["download_url"].replace(
+        "/download/", "/download/revoked-"
+    )
+    urls = _requested_urls(handler)
+
+    assert handler.pull_files_to_worker(files, str(tmp_path)) == 0
+
+    assert (tmp_path / "a.txt").read_bytes() == b"a" * 10
+    assert (tmp_path / "b.txt").read_bytes() == b"b" * 20
+    assert f"GET {listed_item_url(files['a.txt'])}/content" in urls
+    assert f"GET {files['b.txt']['download_url']}" in urls
+    assert f"GET {listed_item_url(files['b.txt'])}/content" in urls
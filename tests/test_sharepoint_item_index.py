@@ -0,0 +1,157 @@
+from collections.abc import Callable
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import SITE_ID, FakeDrive
+from opentaskpy.addons.o365.remotehandlers.itemindex import ItemIndex, index_path
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive(libraries=("Documents", "Reports"))
+    drive.add_file("in/a.txt", b"a")
+    drive.add_file("in/b.txt", b"b")
+    drive.add_file("archive/2024/old.txt", b"old")
+    drive.add_file("reports/r.txt", b"r", drive_id="drive-2")
+    return drive
+
+
+@pytest.fixture
+def index_file(tmp_path) -> str:
+    return str(tmp_path / "items.db")
+
+
+@pytest.fixture
+def indexed_handler(
+    make_handler, transport, index_file
+) -> Callable[..., SharepointTransfer]:
+    def make(**spec) -> SharepointTransfer:
+        handler = make_handler(transport, protocol={"itemIndex": index_file}, **spec)
+        handler._item_index = ItemIndex(index_file)
+        return handler
+
+    return make
+
+
+def _move_spec() -> dict:
+    return {"postCopyAction": {"action": "move", "destination": "archive/2024"}}
+
+
+def test_index_keys_ignore_case_and_slashes(index_file) -> None:
+    index = ItemIndex(index_file)
+    index.put(SITE_ID, "Archive//2024/", "folder-1", '"etag"')
+
+    assert index.get(SITE_ID, "archive/2024")["item_id"] == "folder-1"
+    assert index.get("other-site", "archive/2024") is None
+    assert index_path("/Reports/in/") == "/reports/in"
+
+
+def test_invalidating_removes_everything_below(index_file) -> None:
+    index = ItemIndex(index_file)
+    index.put_many(
+        SITE_ID,
+        [
+            ("archive", "folder-1", None, None, None),
+            ("archive/2024", "folder-2", None, None, None),
+            ("archive_old", "folder-3", None, None, None),
+        ],
+    )
+
+    index.invalidate(SITE_ID, "archive")
+
+    assert index.get(SITE_ID, "archive/2024") is None
+    assert index.get(SITE_ID, "archive_old") is not None
+
+
+def test_new_item_at_a_path_replaces_its_children(index_file) -> None:
+    index = ItemIndex(index_file)
+    index.put(SITE_ID, "archive", "folder-1")
+    index.put(SITE_ID, "archive/2024", "folder-2")
+
+    # Same item, with a new eTag
+    index.put(SITE_ID, "archive", "folder-1", '"changed"')
+    assert index.get(SITE_ID, "archive/2024") is not None
+
+    # Deleted and created again
+    index.put(SITE_ID, "archive", "folder-9")
+    assert index.get(SITE_ID, "archive/2024") is None
+
+
+def test_later_runs_resolve_ids_from_the_index(indexed_handler, transport) -> None:
+    first = indexed_handler(**_move_spec())
+    assert first.handle_post_copy_action(first.list_files("in", "a.txt")) == 0
+    assert first._get_drive_id("Reports") == "drive-2"
+    first.tidy()
+
+    second = indexed_handler(**_move_spec())
+    requests = transport.counts["requests"]
+    files = second.list_files("in", "b.txt")
+    assert second.handle_post_copy_action(files) == 0
+    assert second._get_drive_id("Reports") == "drive-2"
+
+    assert transport.drive.find("archive/2024/b.txt") is not None
+    # Just the listing and the move
+    assert transport.counts["requests"] == requests + 2
+
+
+def test_listing_indexes_files_and_folders(indexed_handler, transport) -> None:
+    handler = indexed_handler()
+    handler.list_files("/Reports/reports")
+    handler.list_files()
+
+    item = transport.drive.find("reports/r.txt", "drive-2")
+    indexed = handler._item_index.get(SITE_ID, "/Reports/reports/r.txt")
+    assert indexed["item_id"] == item["id"]
+    assert indexed["size"] == 1
+    assert indexed["etag"].startswith(f'"{{{item["id"]}}}')
+    assert (
+        handler._item_index.get(SITE_ID, "archive")["item_id"]
+        == transport.drive.find("archive")["id"]
+    )
+
+
+def test_stale_folder_ids_are_looked_up_again(
+    indexed_handler, transport, index_file
+) -> None:
+    ItemIndex(index_file).put(SITE_ID, "archive/2024", "deleted-folder")
+    handler = indexed_handler(**_move_spec())
+
+    assert handler.handle_post_copy_action(handler.list_files("in", "a.txt")) == 0
+
+    assert transport.drive.find("archive/2024/a.txt") is not None
+    assert (
+        handler._item_index.get(SITE_ID, "archive/2024")["item_id"]
+        == transport.drive.find("archive/2024")["id"]
+    )
+
+
+def test_libraries_missing_from_the_index_are_fetched(
+    indexed_handler, transport, index_file
+) -> None:
+    ItemIndex(index_file).put_drive_ids(SITE_ID, {"Documents": "drive-1"})
+    handler = indexed_handler()
+
+    assert handler._get_drive_id("Reports") == "drive-2"
+    assert ItemIndex(index_file).get_drive_ids(SITE_ID)["Reports"] == "drive-2"
+
+
+@pytest.mark.parametrize(
+    ("directory", "expected"), [("/Reports", "top.txt"), ("/Reports/reports", "r.txt")]
+)
+def test_stale_drive_ids_are_looked_up_again(
+    indexed_handler, transport, index_file, directory: str, expected: str
+) -> None:
+    transport.drive.add_file("top.txt", b"t", drive_id="drive-2")
+    # As if the document library had been deleted and created again
+    ItemIndex(index_file).put_drive_ids(
+        SITE_ID, {"Documents": "drive-1", "Reports": "recreated-drive"}
+    )
+    handler = indexed_handler()
+
+    assert list(handler.list_files(directory)) == [expected]
+    assert handler._item_index.get_drive_ids(SITE_ID)["Reports"] == "drive-2"
+    # Only retried once, so a missing folder is still found to be missing
+    requests = transport.counts["requests"]
+    assert handler.list_files("/Reports/missing") == {}
+    assert transport.counts["requests"] == requests + 1
@@ -0,0 +1,110 @@
+import copy
+import pickle
+from datetime import UTC, datetime
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.conditionals import parse_modified_time
+from opentaskpy.addons.o365.remotehandlers.fakedrive import FakeDrive
+from opentaskpy.addons.o365.remotehandlers.listing import ListedFile
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    drive = FakeDrive()
+    drive.add_file("in/a.txt", b"a")
+    drive.add_file("in/b.txt", b"b")
+    return drive
+
+
+def test_listed_file_behaves_as_a_dict() -> None:
+    listed = ListedFile(10, 1.5, "in", drive_id="drive-1", item_id="item-1")
+    expected = {
+        "size": 10,
+        "modified_time": 1.5,
+        "directory": "in",
+        "drive_id": "drive-1",
+        "item_id": "item-1",
+    }
+
+    assert listed == expected
+    assert dict(listed) == expected
+    assert repr(listed) == repr(expected)
+    assert len(listed) == 5
+    assert listed["size"] == 10
+    assert "download_url" not in listed
+    assert listed.get("download_url") is None
+    assert listed.get("quick_xor_hash", "none") == "none"
+    with pytest.raises(KeyError):
+        listed["quick_xor_hash"]  # pylint: disable=pointless-statement
+
+
+def test_listed_file_can_be_changed() -> None:
+    listed = ListedFile(10, 1.5, "in")
+
+    listed["size"] = 0
+    listed["local_path"] = "/tmp/in"
+    del listed["directory"]
+
+    assert listed == {"size": 0, "modified_time": 1.5, "local_path": "/tmp/in"}
+    with pytest.raises(KeyError):
+        del listed["item_id"]
+
+
+def test_listed_file_copies_are_separate() -> None:
+    listed = ListedFile(10, 1.5, "in", quick_xor_hash="hash")
+    listed["extra"] = 1
+
+    for other in (
+        listed.copy(),
+        copy.deepcopy(listed),
+        pickle.loads(pickle.dumps(listed)),
+    ):
+        other["size"] = 0
+        other["extra"] = 2
+        assert other["quick_xor_hash"] == "hash"
+
+    assert listed["size"] == 10
+    assert listed["extra"] == 1
+
+
+def test_list_files_returns_compact_records(make_handler, transport) -> None:
+    files = make_handler(transport).list_files("in")
+
+    assert isinstance(files["a.txt"], ListedFile)
+    assert sorted(files["a.txt"]) == [
+        "directory",
+        "drive_id",
+        "item_id",
+        "modified_time",
+        "quick_xor_hash",
+        "size",
+    ]
+
+
+def test_listing_is_logged_as_a_summary(make_handler, transport) -> None:
+    for index in range(25):
+        transport.drive.add_file(f"many/file{index:02d}.txt", b"x")
+    handler = make_handler(transport)
+
+    handler.list_files("in")
+    handler.list_files("many")
+    handler.list_files("many", r"nothing")
+
+    handler.logger.info.assert_any_call("Found 2 files in in: a.txt, b.txt")
+    names = ", ".join(f"file{index:02d}.txt" for index in range(20))
+    handler.logger.info.assert_any_call(
+        f"Found 25 files in many, including: {names}, and 5 more"
+    )
+    handler.logger.info.assert_any_call("Found 0 files in many")
+
+
+@pytest.mark.parametrize(
+    "value", ["2024-01-31T12:34:56Z", "1999-12-31T23:59:59Z", "2024-02-29T00:00:00Z"]
+)
+def test_modified_times_match_strptime(value: str) -> None:
+    expected = (
+        datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=UTC).timestamp()
+    )
+
+    assert parse_modified_time(value) == expected
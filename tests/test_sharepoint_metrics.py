@@ -0,0 +1,169 @@
+import json
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from opentaskpy.addons.o365.remotehandlers.metrics import (
+    JsonFileSink,
+    LogSink,
+    PrometheusFileSink,
+    RequestMetrics,
+    create_sinks,
+    endpoint_class,
+)
+from opentaskpy.addons.o365.remotehandlers.recording import make_response
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+GRAPH = "https://graph.microsoft.com/v1.0"
+
+
+@pytest.fixture
+def measured_handler(make_handler) -> Callable[..., SharepointTransfer]:
+    def make(transport) -> SharepointTransfer:
+        handler = make_handler(transport, directory="dir")
+        handler.metrics = RequestMetrics("task")
+        return handler
+
+    return make
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (f"{GRAPH}/sites/host.sharepoint.com:/sites/site", "site"),
+        (f"{GRAPH}/sites/site-id/drives", "drives"),
+        (f"{GRAPH}/sites/site-id/drive/root:/dir:/children?$select=id", "children"),
+        (f"{GRAPH}/sites/site-id/drive/items/1/children", "children"),
+        (f"{GRAPH}/sites/site-id/drive/root:/dir/a.txt:/content", "content"),
+        (
+            f"{GRAPH}/sites/site-id/drive/root:/a.txt:/createUploadSession",
+            "upload_session",
+        ),
+        (f"{GRAPH}/sites/site-id/drive/items/1/copy", "copy"),
+        (f"{GRAPH}/sites/site-id/drive/root:/dir/a.txt", "item"),
+        (f"{GRAPH}/$batch", "batch"),
+        (
+            "https://tenant.sharepoint.com/_api/v2.0/drives/x/items/y/uploadSession?guid=1",
+            "upload_chunk",
+        ),
+        ("https://tenant.sharepoint.com/_api/v2.0/monitor/abc", "copy_monitor"),
+        (
+            "https://tenant.sharepoint.com/_layouts/15/download.aspx?UniqueId=1",
+            "download",
+        ),
+        ("https://example.com/", "other"),
+    ],
+)
+def test_endpoint_class(url: str, expected: str) -> None:
+    assert endpoint_class(url) == expected
+
+
+def test_requests_are_recorded_per_endpoint(
+    measured_handler, transport, tmp_path
+) -> None:
+    handler = measured_handler(transport)
+    (tmp_path / "a.txt").write_bytes(b"a" * 100)
+
+    assert handler.push_files_from_worker(str(tmp_path)) == 0
+    handler.list_files("dir")
+
+    endpoints = handler.metrics.as_dict()["endpoints"]
+    assert endpoints["PUT content"]["requests"] == 1
+    assert endpoints["PUT content"]["statuses"] == {"201": 1}
+    assert endpoints["PUT content"]["bytes_sent"] == 100
+    assert endpoints["GET children"]["requests"] == 1
+    assert endpoints["GET children"]["bytes_received"] > 0
+    assert endpoints["GET children"]["seconds"]["buckets"]["0.05"] == 1
+
+
+def test_retries_and_errors_are_recorded(measured_handler) -> None:
+    transport = MagicMock()
+    transport.request.side_effect = [
+        requests.exceptions.ReadTimeout("timed out"),
+        make_response(200, {}, b"{}", f"{GRAPH}/sites/site-id/drives"),
+    ]
+    handler = measured_handler(transport)
+
+    with patch.object(SharepointTransfer._request.retry, "sleep"):  # type: ignore[attr-defined]
+        handler._request("GET", f"{GRAPH}/sites/site-id/drives")
+
+    totals = handler.metrics.as_dict()["endpoints"]["GET drives"]
+    assert totals["requests"] == 2
+    assert totals["errors"] == {"ReadTimeout": 1}
+    assert totals["retries"] == 1
+    assert totals["statuses"] == {"200": 1}
+
+
+def test_sinks_write_metrics(tmp_path) -> None:
+    metrics = RequestMetrics("task")
+    metrics.record("GET", f"{GRAPH}/sites/site-id/drives", 200, 0.2, 0, 50)
+    metrics.record("GET", f"{GRAPH}/sites/site-id/drives", 429, 0.01, 0, 0)
+    metrics.record_retry("GET", f"{GRAPH}/sites/site-id/drives")
+    logger = MagicMock()
+
+    sinks = create_sinks(
+        {"json": str(tmp_path / "m.json"), "prometheus": str(tmp_path / "m.prom")},
+        logger,
+    )
+    assert [type(sink) for sink in sinks] == [LogSink, JsonFileSink, PrometheusFileSink]
+    for sink in sinks:
+        sink.write(metrics)
+
+    assert "GET drives: 2" in logger.info.call_args.args[0]
+    written = json.loads((tmp_path / "m.json").read_text())
+    assert written["endpoints"]["GET drives"]["statuses"] == {"200": 1, "429": 1}
+
+    prometheus = (tmp_path / "m.prom").read_text()
+    labels = 'task_id="task",method="GET",endpoint="drives"'
+    assert (
+        f'sharepoint_request_duration_seconds_bucket{{{labels},le="0.05"}} 1'
+        in prometheus
+    )
+    assert (
+        f'sharepoint_request_duration_seconds_bucket{{{labels},le="0.25"}} 2'
+        in prometheus
+    )
+    assert (
+        f'sharepoint_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2'
+        in prometheus
+    )
+    assert f'sharepoint_responses_total{{{labels},status="429"}} 1' in prometheus
+    assert f"sharepoint_request_retries_total{{{labels}}} 1" in prometheus
+    assert f"sharepoint_request_bytes_received_total{{{labels}}} 50" in prometheus
+
+
+def test_metrics_are_written_in_tidy(measured_handler, tmp_path) -> None:
+    handler = measured_handler(None)
+    handler._metrics_sinks = [JsonFileSink(str(tmp_path / "m.json"))]
+
+    handler.tidy()
+
+    assert json.loads((tmp_path / "m.json").read_text())["task_id"] == "task"
+
+
+def test_concurrent_sink_writes(tmp_path) -> None:
+    sink = JsonFileSink(str(tmp_path / "m.json"))
+
+    def write(index: int) -> None:
+        sink.write(RequestMetrics(f"task{index}"))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(32)))
+
+    assert json.loads((tmp_path / "m.json").read_text())["task_id"].startswith("task")
+    assert [file.name for file in tmp_path.iterdir()] == ["m.json"]
+
+
+def test_failed_sink_writes_leave_no_temporary_file(tmp_path) -> None:
+    sink = JsonFileSink(str(tmp_path / "m.json"))
+
+    with (
+        patch("os.replace", side_effect=OSError("disk full")),
+        pytest.raises(OSError),
+    ):
+        sink.write(RequestMetrics("task"))
+
+    assert not list(tmp_path.iterdir())
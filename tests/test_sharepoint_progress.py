@@ -0,0 +1,163 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from opentaskpy.addons.o365.remotehandlers.progress import (
+    FileProgress,
+    LogProgress,
+    ProgressReporter,
+)
+
+
+def test_event_reports_throughput_and_eta() -> None:
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.progress.monotonic",
+        side_effect=[100.0, 102.0, 104.0],
+    ):
+        progress = FileProgress("upload", "big.bin", 1000)
+        progress.update(200)
+        first = progress.event()
+        second = progress.event()
+
+    assert first["bytes_done"] == 200
+    assert first["percent"] == 20.0
+    assert first["bytes_per_second"] == 100.0
+    assert first["average_bytes_per_second"] == 100.0
+    assert first["eta_seconds"] == 8.0
+    assert not first["stalled"]
+    # Nothing moved since the first event
+    assert second["bytes_per_second"] == 0.0
+    assert second["average_bytes_per_second"] == 50.0
+    assert second["stalled"]
+
+
+def test_event_without_a_total() -> None:
+    progress = FileProgress("upload", "stream", None)
+    progress.update(10)
+
+    event = progress.event()
+
+    assert event["percent"] is None
+    assert event["eta_seconds"] is None
+
+
+def test_reporter_sends_events_while_files_are_in_flight() -> None:
+    events: list[dict] = []
+    reporter = ProgressReporter(interval=0.01)
+    reporter.add_callback(events.append)
+
+    with reporter.track("download", "a.txt", 10) as progress:
+        progress.update(5)
+        time.sleep(0.1)
+        progress.update(5)
+
+    assert any(not event["finished"] for event in events)
+    assert events[-1]["finished"]
+    assert events[-1]["bytes_done"] == 10
+    assert events[-1]["percent"] == 100.0
+    reporter.close()
+
+
+def test_failing_callbacks_are_logged() -> None:
+    logger = MagicMock()
+    reporter = ProgressReporter(interval=60, logger=logger)
+    reporter.add_callback(MagicMock(side_effect=ValueError("boom")))
+
+    with reporter.track("upload", "a.txt", 1) as progress:
+        progress.update(1)
+
+    logger.warning.assert_called_once()
+    reporter.close()
+
+
+def test_log_progress_warns_when_stalled() -> None:
+    logger = MagicMock()
+    log = LogProgress(logger)
+    progress = FileProgress("upload", "big.bin", 2048)
+    progress.update(1024)
+
+    log(progress.event())
+    log(progress.event())
+
+    assert "ETA" in logger.info.call_args[0][0]
+    assert "no data moved" in logger.warning.call_args[0][0]
+
+
+def test_log_progress_logs_finished_files_at_debug() -> None:
+    logger = MagicMock()
+    log = LogProgress(logger)
+    progress = FileProgress("download", "small.txt", 10)
+    progress.update(10)
+
+    log(progress.event(finished=True))
+
+    logger.info.assert_not_called()
+    assert "finished in" in logger.debug.call_args[0][0]
+
+
+def test_uploads_and_downloads_report_progress(
+    make_handler, transport, tmp_path
+) -> None:
+    upload_dir = tmp_path / "upload"
+    download_dir = tmp_path / "download"
+    upload_dir.mkdir()
+    download_dir.mkdir()
+    (upload_dir / "a.txt").write_bytes(b"a" * 100)
+    handler = make_handler(transport, directory="dir")
+    events: list[dict] = []
+    lock = threading.Lock()
+
+    def callback(event: dict) -> None:
+        with lock:
+            events.append(event)
+
+    handler.add_progress_callback(callback)
+
+    assert handler.push_files_from_worker(str(upload_dir)) == 0
+    assert handler.upload_stream(iter([b"x" * 10, b"y" * 10]), "stream.txt", 20) == 0
+    files = handler.list_files("dir", r"a\.txt")
+    assert handler.pull_files_to_worker(files, str(download_dir)) == 0
+    handler.tidy()
+
+    finished = {
+        (event["direction"], event["name"]): event
+        for event in events
+        if event["finished"]
+    }
+    assert finished["upload", "dir/a.txt"]["bytes_done"] == 100
+    assert finished["upload", "dir/stream.txt"]["bytes_done"] == 20
+    assert finished["download", "a.txt"]["bytes_done"] == 100
+    assert finished["download", "a.txt"]["percent"] == 100.0
+
+
+def test_recursive_uploads_report_progress(make_handler, transport, tmp_path) -> None:
+    (tmp_path / "2024" / "jan").mkdir(parents=True)
+    (tmp_path / "top.txt").write_bytes(b"t" * 10)
+    (tmp_path / "2024" / "jan" / "a.txt").write_bytes(b"a" * 100)
+    handler = make_handler(transport, directory="dir", recursive=True)
+    events: list[dict] = []
+    lock = threading.Lock()
+
+    def callback(event: dict) -> None:
+        with lock:
+            events.append(event)
+
+    handler.add_progress_callback(callback)
+
+    assert handler.push_files_from_worker(str(tmp_path)) == 0
+    handler.tidy()
+
+    finished = {event["name"]: event for event in events if event["finished"]}
+    assert finished["dir/top.txt"]["bytes_done"] == 10
+    assert finished["dir/2024/jan/a.txt"]["bytes_done"] == 100
+    assert finished["dir/2024/jan/a.txt"]["direction"] == "upload"
+
+
+def test_no_progress_is_tracked_by_default(make_handler, transport, tmp_path) -> None:
+    (tmp_path / "a.txt").write_bytes(b"a")
+    handler = make_handler(transport, directory="dir")
+
+    with patch.object(ProgressReporter, "track") as track:
+        assert handler.push_files_from_worker(str(tmp_path)) == 0
+
+    track.assert_not_called()
@@ -0,0 +1,122 @@
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+
+@pytest.fixture
+def sharepoint_transfer_obj() -> SharepointTransfer:
+    """Build a SharepointTransfer object without running network-heavy __init__."""
+    obj = SharepointTransfer.__new__(SharepointTransfer)
+    obj.logger = MagicMock()
+    obj.spec = {
+        "siteName": "site",
+        "directory": "reports",
+        "recursive": True,
+        "protocol": {"maxConcurrency": 8},
+    }
+    obj.credentials = {"access_token": "token", "expiry": 4102444800}
+    obj.timeout = 30
+    obj.site_id = "site-id"
+    return obj
+
+
+def _make_tree(root: Path) -> None:
+    for relative in [
+        "top.txt",
+        "2024/jan/a.txt",
+        "2024/jan/b.txt",
+        "2024/feb/c.txt",
+        "2025/mar/deep/d.txt",
+    ]:
+        file = root / relative
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(relative)
+
+
+def test_recursive_upload_resolves_folders_level_by_level(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    _make_tree(tmp_path)
+    resolved: list[tuple[str | None, str]] = []
+    lock = threading.Lock()
+
+    def fake_get_or_create(parent_id: str | None, folder: str) -> str:
+        with lock:
+            resolved.append((parent_id, folder))
+        return f"{parent_id}/{folder}"
+
+    with (
+        patch.object(
+            SharepointTransfer, "create_or_get_folder", return_value="base"
+        ) as mock_base,
+        patch.object(
+            SharepointTransfer, "_get_or_create_folder", side_effect=fake_get_or_create
+        ),
+        patch.object(
+            SharepointTransfer, "_upload_to_folder", return_value=0
+        ) as mock_upload,
+    ):
+        result = sharepoint_transfer_obj.push_files_from_worker(str(tmp_path))
+
+    assert result == 0
+    mock_base.assert_called_once_with("reports")
+
+    # Each level is resolved before the next one starts
+    depths = [folder_id.count("/") for folder_id, _ in resolved]
+    assert depths == sorted(depths)
+    assert len(resolved) == 6
+
+    uploads = {call.args[3]: call.args[1] for call in mock_upload.call_args_list}
+    assert uploads == {
+        "reports/top.txt": "base",
+        "reports/2024/jan/a.txt": "base/2024/jan",
+        "reports/2024/jan/b.txt": "base/2024/jan",
+        "reports/2024/feb/c.txt": "base/2024/feb",
+        "reports/2025/mar/deep/d.txt": "base/2025/mar/deep",
+    }
+
+
+def test_recursive_upload_fails_if_any_file_fails(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    _make_tree(tmp_path)
+
+    with (
+        patch.object(SharepointTransfer, "create_or_get_folder", return_value="base"),
+        patch.object(SharepointTransfer, "_get_or_create_folder", return_value="id"),
+        patch.object(
+            SharepointTransfer, "_upload_to_folder", side_effect=[0, 1, 0, 0, 0]
+        ),
+    ):
+        assert sharepoint_transfer_obj.push_files_from_worker(str(tmp_path)) == 1
+
+
+def test_get_or_create_folder_creates_missing_folder(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    not_found = MagicMock()
+    not_found.status_code = 404
+    created = MagicMock()
+    created.status_code = 201
+    created.json.return_value = {"id": "new-id"}
+
+    with (
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get",
+            return_value=not_found,
+        ) as mock_get,
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post",
+            return_value=created,
+        ) as mock_post,
+    ):
+        assert (
+            sharepoint_transfer_obj._get_or_create_folder("parent", "jan") == "new-id"
+        )
+
+    assert mock_get.call_args.args[0].endswith("/drive/items/parent:/jan")
+    assert mock_post.call_args.args[0].endswith("/drive/items/parent/children")
@@ -8,6 +8,7 @@ import requests
 from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import QuickXorHash
 from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
 
 
@@ -119,3 +120,104 @@ def test_sharepoint_destination_protocol_timeout_rejects_non_integer(
 
     with pytest.raises(ValidationError):
         validate(instance=payload, schema=schema)
+
+
+def test_simple_upload_verifies_quickxorhash(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    local_file = tmp_path / "upload.txt"
+    local_file.write_bytes(b"some file content")
+    sharepoint_transfer_obj.spec = {"protocol": {}}
+    sharepoint_transfer_obj.credentials = {"access_token": "token"}
+    sharepoint_transfer_obj.timeout = 30
+
+    def fake_put(url: str, **kwargs: Any) -> MagicMock:
+        # Drain the body as requests would
+        while kwargs["data"].read(8192):
+            pass
+        response = MagicMock()
+        response.status_code = 201
+        response.json.return_value = {
+            "webUrl": "https://example.com/upload.txt",
+            "file": {"hashes": {"quickXorHash": remote_hash}},
+        }
+        return response
+
+    remote_hash = QuickXorHash(b"some file content").base64digest()
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.put",
+        side_effect=fake_put,
+    ):
+        assert (
+            sharepoint_transfer_obj._do_simple_upload(
+                str(local_file), "https://example.com/item"
+            )
+            == 0
+        )
+
+    remote_hash = QuickXorHash(b"different content").base64digest()
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.put",
+        side_effect=fake_put,
+    ):
+        assert (
+            sharepoint_transfer_obj._do_simple_upload(
+                str(local_file), "https://example.com/item"
+            )
+            == 1
+        )
+
+
+def test_verify_hash_can_be_disabled(
+    sharepoint_transfer_obj: SharepointTransfer,
+) -> None:
+    sharepoint_transfer_obj.spec = {"protocol": {"verifyHash": False}}
+
+    assert sharepoint_transfer_obj._verify_hash(
+        "file.txt", QuickXorHash(b"local"), "not-the-same-hash"
+    )
+
+
+@pytest.mark.parametrize(
+    "transport, valid",
+    [
+        ({"record": "/tmp/recording.jsonl"}, True),
+        ({"replay": "/tmp/recording.jsonl", "timeScale": 0.5}, True),
+        ({"record": "/tmp/a.jsonl", "replay": "/tmp/b.jsonl"}, False),
+        ({"timeScale": 1}, False),
+        ({"replay": "/tmp/recording.jsonl", "timeScale": -1}, False),
+    ],
+)
+def test_sharepoint_destination_protocol_transport(
+    transport: dict, valid: bool
+) -> None:
+    schema = _load_sharepoint_destination_protocol_schema()
+    payload = _valid_protocol_payload()
+    payload["transport"] = transport
+
+    if valid:
+        validate(instance=payload, schema=schema)
+    else:
+        with pytest.raises(ValidationError):
+            validate(instance=payload, schema=schema)
+
+
+@pytest.mark.parametrize(
+    "progress, valid",
+    [
+        ({}, True),
+        ({"interval": 0.5, "log": False}, True),
+        ({"interval": 0}, False),
+        ({"every": 5}, False),
+    ],
+)
+def test_sharepoint_destination_protocol_progress(progress: dict, valid: bool) -> None:
+    schema = _load_sharepoint_destination_protocol_schema()
+    payload = _valid_protocol_payload()
+    payload["progress"] = progress
+
+    if valid:
+        validate(instance=payload, schema=schema)
+    else:
+        with pytest.raises(ValidationError):
+            validate(instance=payload, schema=schema)
@@ -0,0 +1,153 @@
+import json
+import os
+import stat
+import subprocess  # nosec B404
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from opentaskpy.addons.o365.remotehandlers import creds
+from opentaskpy.addons.o365.remotehandlers.retries import LazyRetry, lazy_retry
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+CREDENTIALS = {"clientId": "client", "tenantId": "tenant", "refreshToken": "refresh"}
+
+
+def test_import_defers_heavy_modules() -> None:
+    script = (
+        "import sys\n"
+        "import opentaskpy.addons.o365.remotehandlers.sharepoint\n"
+        "print(*[m for m in ('msal', 'tenacity', 'dateutil', 'asyncio', 'sqlite3')"
+        " if m in sys.modules])\n"
+    )
+    completed = subprocess.run(  # nosec B603
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+
+    assert completed.stdout.split() == []
+
+
+def test_lazy_retry_builds_the_policy_on_first_use() -> None:
+    make_retrying = MagicMock(
+        side_effect=lambda: __import__("tenacity").Retrying(reraise=True)
+    )
+
+    class Thing:
+        @lazy_retry(make_retrying)
+        def method(self, value: int) -> int:
+            return value * 2
+
+    make_retrying.assert_not_called()
+    assert isinstance(Thing.__dict__["method"], LazyRetry)
+    assert Thing().method(2) == 4
+    assert Thing().method(3) == 6
+    make_retrying.assert_called_once()
+    assert Thing.method.retry is Thing.method.retry
+
+
+def test_cached_token_is_used_without_msal(tmp_path) -> None:
+    cache_file = tmp_path / "tokens.json"
+    token = {"access_token": "cached", "expiry": time.time() + 3600}
+    token["refresh_token"] = "new refresh"
+    creds.write_cached_token(str(cache_file), CREDENTIALS, token)
+
+    with patch.dict(sys.modules, {"msal": None}):
+        result = creds.get_access_token({**CREDENTIALS, "tokenCache": str(cache_file)})
+
+    assert result == token
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+
+
+def test_token_is_cached_when_acquired(tmp_path) -> None:
+    cache_file = tmp_path / "tokens.json"
+    # Tokens about to expire are not used
+    creds.write_cached_token(
+        str(cache_file),
+        CREDENTIALS,
+        {"access_token": "old", "expiry": time.time() + 10, "refresh_token": "r"},
+    )
+    creds.write_cached_token(
+        str(cache_file),
+        {**CREDENTIALS, "clientId": "other"},
+        {"access_token": "other", "expiry": time.time() + 3600, "refresh_token": "r"},
+    )
+    app = MagicMock()
+    app.acquire_token_by_refresh_token.return_value = {
+        "access_token": "new",
+        "expires_in": 3600,
+        "refresh_token": "new refresh",
+    }
+
+    with patch("msal.PublicClientApplication", return_value=app):
+        result = creds.get_access_token({**CREDENTIALS, "tokenCache": str(cache_file)})
+
+    assert result["access_token"] == "new"
+    cached = json.loads(cache_file.read_text())
+    for refresh_token in ("refresh", "new refresh"):
+        key = creds._token_cache_key(CREDENTIALS, refresh_token)
+        assert cached[key]["access_token"] == "new"
+    other = creds._token_cache_key({**CREDENTIALS, "clientId": "other"}, "refresh")
+    assert cached[other]["access_token"] == "other"
+
+
+def test_cached_tokens_are_kept_per_user(tmp_path) -> None:
+    cache_file = str(tmp_path / "tokens.json")
+    token = {"access_token": "a", "expiry": time.time() + 3600, "refresh_token": "a2"}
+    creds.write_cached_token(cache_file, CREDENTIALS, token)
+
+    other_user = {**CREDENTIALS, "refreshToken": "other refresh"}
+    assert creds.read_cached_token(cache_file, other_user) is None
+    assert (
+        creds.read_cached_token(cache_file, {**CREDENTIALS, "refreshToken": ""}) is None
+    )
+    # The rotated refresh token finds the same access token
+    rotated = {**CREDENTIALS, "refreshToken": "a2"}
+    assert creds.read_cached_token(cache_file, rotated) == token
+
+
+def test_concurrent_token_cache_writes(tmp_path) -> None:
+    cache_file = str(tmp_path / "tokens.json")
+
+    def write(index: int) -> None:
+        creds.write_cached_token(
+            cache_file,
+            {**CREDENTIALS, "refreshToken": f"refresh{index}"},
+            {"access_token": str(index), "expiry": time.time() + 3600},
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(32)))
+
+    for index in range(32):
+        cached = creds.read_cached_token(
+            cache_file, {**CREDENTIALS, "refreshToken": f"refresh{index}"}
+        )
+        assert cached is not None
+        assert cached["access_token"] == str(index)
+    assert os.listdir(tmp_path) == ["tokens.json"]
+
+
+def test_unreadable_token_cache_is_ignored(tmp_path) -> None:
+    cache_file = tmp_path / "tokens.json"
+    cache_file.write_text("not json")
+
+    assert creds.read_cached_token(str(cache_file), CREDENTIALS) is None
+    assert creds.read_cached_token(str(tmp_path / "missing"), CREDENTIALS) is None
+
+
+def test_expired_creds_are_refreshed() -> None:
+    handler = SharepointTransfer.__new__(SharepointTransfer)
+    handler.logger = MagicMock()
+    handler.spec = {"protocol": {"refreshToken": "old"}}
+    handler.credentials = {"access_token": "a", "expiry": time.time() - 1}
+    new = {"access_token": "b", "expiry": time.time() + 3600, "refresh_token": "new"}
+
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+        return_value=new,
+    ):
+        handler.validate_or_refresh_creds()
+
+    assert handler.credentials == new
+    assert handler.spec["protocol"]["refreshToken"] == "new"
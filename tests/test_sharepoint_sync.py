@@ -0,0 +1,130 @@
+import os
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import QuickXorHash
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+
+
+@pytest.fixture
+def sharepoint_transfer_obj() -> SharepointTransfer:
+    """Build a SharepointTransfer object without running network-heavy __init__."""
+    obj = SharepointTransfer.__new__(SharepointTransfer)
+    obj.logger = MagicMock()
+    obj.spec = {
+        "siteName": "site",
+        "directory": "dest",
+        "protocol": {},
+        "sync": {},
+    }
+    obj.credentials = {"access_token": "token", "expiry": 4102444800}
+    obj.timeout = 30
+    return obj
+
+
+def _write(path: Path, content: bytes, mtime: float) -> None:
+    path.write_bytes(content)
+    os.utime(path, (mtime, mtime))
+
+
+def test_sync_uploads_only_new_or_changed_files(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    now = time.time()
+    _write(tmp_path / "unchanged.txt", b"same", now - 3600)
+    _write(tmp_path / "resized.txt", b"longer content", now - 3600)
+    _write(tmp_path / "modified.txt", b"newer", now)
+    _write(tmp_path / "new.txt", b"new file", now)
+
+    remote_files = {
+        "unchanged.txt": {"size": 4, "modified_time": now - 60, "directory": "dest"},
+        "resized.txt": {"size": 3, "modified_time": now - 60, "directory": "dest"},
+        "modified.txt": {"size": 5, "modified_time": now - 60, "directory": "dest"},
+    }
+
+    with (
+        patch.object(
+            SharepointTransfer, "list_files", return_value=remote_files
+        ) as mock_list,
+        patch.object(SharepointTransfer, "_upload_file", return_value=0) as mock_upload,
+    ):
+        result = sharepoint_transfer_obj.push_files_from_worker(str(tmp_path))
+
+    assert result == 0
+    mock_list.assert_called_once_with("dest")
+    uploaded = sorted(call.args[1] for call in mock_upload.call_args_list)
+    assert uploaded == ["dest/modified.txt", "dest/new.txt", "dest/resized.txt"]
+    assert sharepoint_transfer_obj.sync_stats == {
+        "uploaded": 3,
+        "skipped": 1,
+        "bytes_saved": 4,
+    }
+
+
+def test_sync_compare_hash_ignores_timestamps(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    sharepoint_transfer_obj.spec["sync"] = {"compareHash": True}
+    now = time.time()
+    _write(tmp_path / "same.txt", b"identical", now)
+    _write(tmp_path / "differs.txt", b"local one", now - 3600)
+
+    remote_files = {
+        "same.txt": {
+            "size": 9,
+            "modified_time": now - 3600,
+            "quick_xor_hash": QuickXorHash(b"identical").base64digest(),
+        },
+        "differs.txt": {
+            "size": 9,
+            "modified_time": now,
+            "quick_xor_hash": QuickXorHash(b"remote on").base64digest(),
+        },
+    }
+
+    with (
+        patch.object(SharepointTransfer, "list_files", return_value=remote_files),
+        patch.object(SharepointTransfer, "_upload_file", return_value=0) as mock_upload,
+    ):
+        sharepoint_transfer_obj.push_files_from_worker(str(tmp_path))
+
+    assert [call.args[1] for call in mock_upload.call_args_list] == ["dest/differs.txt"]
+    assert sharepoint_transfer_obj.sync_stats["skipped"] == 1
+
+
+def test_sync_compares_against_renamed_file(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    sharepoint_transfer_obj.spec["rename"] = {"pattern": "^local", "sub": "remote"}
+    _write(tmp_path / "local.txt", b"data", time.time() - 3600)
+
+    with (
+        patch.object(
+            SharepointTransfer,
+            "list_files",
+            return_value={"remote.txt": {"size": 4, "modified_time": time.time()}},
+        ),
+        patch.object(SharepointTransfer, "_upload_file", return_value=0) as mock_upload,
+    ):
+        sharepoint_transfer_obj.push_files_from_worker(str(tmp_path))
+
+    mock_upload.assert_not_called()
+
+
+def test_without_sync_every_file_is_uploaded(
+    sharepoint_transfer_obj: SharepointTransfer, tmp_path: Path
+) -> None:
+    del sharepoint_transfer_obj.spec["sync"]
+    _write(tmp_path / "a.txt", b"data", time.time())
+
+    with (
+        patch.object(SharepointTransfer, "list_files") as mock_list,
+        patch.object(SharepointTransfer, "_upload_file", return_value=0) as mock_upload,
+    ):
+        sharepoint_transfer_obj.push_files_from_worker(str(tmp_path))
+
+    mock_list.assert_not_called()
+    mock_upload.assert_called_once()
@@ -0,0 +1,104 @@
+import json
+import threading
+from collections.abc import Callable
+
+import pytest
+
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.timeline import TransferTimeline
+
+
+@pytest.fixture
+def timed_handler(make_handler, transport) -> Callable[..., SharepointTransfer]:
+    def make(**protocol) -> SharepointTransfer:
+        handler = make_handler(
+            transport,
+            directory="dir",
+            postCopyAction={"action": "delete"},
+            protocol=protocol,
+        )
+        handler.timeline = TransferTimeline("task")
+        return handler
+
+    return make
+
+
+def test_phases_and_files_are_timed(timed_handler, tmp_path) -> None:
+    upload_dir = tmp_path / "upload"
+    download_dir = tmp_path / "download"
+    upload_dir.mkdir()
+    download_dir.mkdir()
+    (upload_dir / "a.txt").write_bytes(b"a" * 100)
+    (upload_dir / "b.txt").write_bytes(b"b" * 200)
+    handler = timed_handler(maxConcurrency=2)
+
+    assert handler.push_files_from_worker(str(upload_dir)) == 0
+    files = handler.list_files("dir", r".*\.txt")
+    files["missing.txt"] = {"size": 1, "directory": "dir"}
+    assert handler.pull_files_to_worker(files, str(download_dir)) == 1
+    del files["missing.txt"]
+    assert handler.handle_post_copy_action(files) == 0
+
+    report = handler.timeline.as_dict()
+    phases = {phase["name"]: phase for phase in report["phases"]}
+    assert list(phases) == ["upload", "list", "download", "post_copy"]
+    assert phases["upload"]["bytes_sent"] == 300
+    assert phases["download"]["bytes_received"] >= 300
+    assert phases["list"]["requests"] == 1
+    assert all(phase["seconds"] >= 0 for phase in phases.values())
+
+    records = {(f["direction"], f["name"]): f for f in report["files"]}
+    assert records["upload", "dir/a.txt"]["size"] == 100
+    assert records["upload", "dir/a.txt"]["status"] == "ok"
+    assert records["upload", "dir/a.txt"]["requests"] >= 1
+    assert records["download", "b.txt"]["status"] == "ok"
+    assert records["download", "missing.txt"]["status"] == "failed"
+
+
+def test_requests_are_counted_against_the_file_in_each_thread() -> None:
+    timeline = TransferTimeline()
+
+    def transfer(name: str, requests: int) -> None:
+        with timeline.file("upload", name, 10):
+            for _ in range(requests):
+                timeline.request_made(10)
+
+    with timeline.phase("upload") as phase:
+        threads = [
+            threading.Thread(target=transfer, args=(f"{i}.txt", i)) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert phase["requests"] == 6
+    assert phase["bytes_sent"] == 60
+    assert {f["name"]: f["requests"] for f in timeline.files} == {
+        "0.txt": 0,
+        "1.txt": 1,
+        "2.txt": 2,
+        "3.txt": 3,
+    }
+
+
+def test_timeline_is_written_in_tidy(timed_handler, transport, tmp_path) -> None:
+    report_file = tmp_path / "timeline.json"
+    transport.drive.add_file("dir/a.txt", b"a")
+    handler = timed_handler(timeline=str(report_file))
+
+    handler.list_files("dir")
+    handler.tidy()
+
+    report = json.loads(report_file.read_text())
+    assert report["task_id"] == "task"
+    assert [phase["name"] for phase in report["phases"]] == ["list"]
+    assert report["phases"][0]["mb_per_s"] is not None
+
+
+def test_nothing_is_timed_without_a_timeline(timed_handler, transport) -> None:
+    transport.drive.add_file("dir/a.txt", b"a")
+    handler = timed_handler()
+    handler.timeline = None
+
+    assert list(handler.list_files("dir")) == ["a.txt"]
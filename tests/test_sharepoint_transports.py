@@ -0,0 +1,202 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from opentaskpy.addons.o365.remotehandlers.fakedrive import (
+    SITE_ID,
+    FakeDrive,
+    FakeDriveTransport,
+)
+from opentaskpy.addons.o365.remotehandlers.recording import (
+    RecordingTransport,
+    ReplayTransport,
+)
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.streams import UPLOAD_CHUNK_MULTIPLE
+
+
+def _run_transfer(handler: SharepointTransfer, tmp_path) -> dict:
+    """Upload two files, list and download them, then delete them."""
+    upload_dir = tmp_path / "upload"
+    download_dir = tmp_path / "download"
+    upload_dir.mkdir(parents=True)
+    download_dir.mkdir(parents=True)
+    (upload_dir / "a.txt").write_bytes(b"a" * 100)
+    (upload_dir / "b.txt").write_bytes(b"b" * 200)
+
+    assert handler.push_files_from_worker(str(upload_dir)) == 0
+    files = handler.list_files("dir", r".*\.txt")
+    assert handler.pull_files_to_worker(files, str(download_dir)) == 0
+    assert (download_dir / "b.txt").read_bytes() == b"b" * 200
+    assert handler.handle_post_copy_action(files) == 0
+    return files
+
+
+def test_fake_drive_transport_runs_a_transfer(
+    make_handler, transport, tmp_path
+) -> None:
+    handler = make_handler(
+        transport, directory="dir", postCopyAction={"action": "delete"}
+    )
+
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get"
+    ) as mock_get:
+        files = _run_transfer(handler, tmp_path)
+
+    mock_get.assert_not_called()
+    assert sorted(files) == ["a.txt", "b.txt"]
+    assert files["a.txt"]["size"] == 100
+    assert transport.drive.find("dir/a.txt") is None
+    assert transport.counts["requests"] > 0
+
+
+def test_fake_drive_add_file_and_listing_pages(make_handler) -> None:
+    drive = FakeDrive(page_size=2)
+    for i in range(5):
+        drive.add_file(f"dir/file{i}.txt", b"x" * i)
+    handler = make_handler(FakeDriveTransport(drive))
+
+    files = handler.list_files("dir")
+
+    assert sorted(files) == [f"file{i}.txt" for i in range(5)]
+    assert files["file3.txt"]["size"] == 3
+    assert "quick_xor_hash" in files["file3.txt"]
+
+
+def test_recorded_transfer_replays_offline(make_handler, tmp_path) -> None:
+    recording = tmp_path / "recording.jsonl"
+    spec = {"directory": "dir", "postCopyAction": {"action": "delete"}}
+
+    recorder = RecordingTransport(FakeDriveTransport(), str(recording))
+    recorded_files = _run_transfer(make_handler(recorder, **spec), tmp_path / "record")
+    recorder.close()
+
+    lines = [json.loads(line) for line in recording.read_text().splitlines()]
+    assert {line["method"] for line in lines} == {"GET", "PUT", "DELETE"}
+    assert all("elapsed" in line and "started" in line for line in lines)
+    assert "token" not in recording.read_text()
+
+    replay = ReplayTransport(str(recording), time_scale=0)
+    replayed_files = _run_transfer(make_handler(replay, **spec), tmp_path / "replay")
+
+    assert replayed_files == recorded_files
+    assert replay.remaining == 0
+
+
+def test_recordings_leave_out_pre_authenticated_urls(make_handler, tmp_path) -> None:
+    recording = tmp_path / "recording.jsonl"
+    spec = {
+        "directory": "dir",
+        "postCopyAction": {"action": "delete"},
+        "protocol": {"directDownload": True},
+    }
+    data = b"x" * (UPLOAD_CHUNK_MULTIPLE + 10)
+
+    def run(transport) -> dict:
+        handler = make_handler(transport, **spec)
+        # Small chunks, so the stream goes through an upload session
+        with patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.STREAM_UPLOAD_CHUNK_SIZE",
+            UPLOAD_CHUNK_MULTIPLE,
+        ):
+            assert handler.upload_stream(iter([data]), "stream.txt") == 0
+        return _run_transfer(handler, tmp_path / str(id(transport)))
+
+    recorder = RecordingTransport(FakeDriveTransport(), str(recording))
+    recorded_files = run(recorder)
+    recorder.close()
+
+    text = recording.read_text()
+    assert "uploadUrl" in text
+    assert "@microsoft.graph.downloadUrl" in text
+    assert "tempauth" not in text
+    assert "/upload/" not in text
+
+    replay = ReplayTransport(str(recording), time_scale=0)
+    assert run(replay) == recorded_files
+    assert replay.remaining == 0
+
+
+def test_replay_without_a_recorded_response_fails(make_handler, tmp_path) -> None:
+    recording = tmp_path / "recording.jsonl"
+    recording.write_text("")
+    handler = make_handler(ReplayTransport(str(recording)))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        handler._request("GET", "https://graph.microsoft.com/v1.0/sites/x")
+
+
+def test_replay_reproduces_timings_and_timeouts(make_handler, tmp_path) -> None:
+    url = "https://graph.microsoft.com/v1.0/sites/x"
+    recording = tmp_path / "recording.jsonl"
+    recording.write_text(
+        json.dumps(
+            {
+                "method": "GET",
+                "url": url,
+                "exception": "ReadTimeout",
+                "message": "timed out",
+                "started": 0,
+                "elapsed": 0.05,
+            }
+        )
+        + "\n"
+        + json.dumps(
+            {
+                "method": "GET",
+                "url": url,
+                "status": 200,
+                "headers": {"Content-Type": "application/json"},
+                "text": '{"id": "x"}',
+                "started": 0.1,
+                "elapsed": 0.05,
+            }
+        )
+        + "\n"
+    )
+    handler = make_handler(ReplayTransport(str(recording)))
+
+    start = time.perf_counter()
+    with patch.object(SharepointTransfer._request.retry, "sleep"):  # type: ignore[attr-defined]
+        response = handler._request("GET", url)
+
+    assert time.perf_counter() - start >= 0.1
+    assert response.json() == {"id": "x"}
+    assert handler.logger.warning.called
+
+
+def test_init_with_replay_needs_no_credentials(tmp_path) -> None:
+    recording = tmp_path / "recording.jsonl"
+    recorder = RecordingTransport(FakeDriveTransport(), str(recording))
+    recorder.request(
+        "GET",
+        "https://graph.microsoft.com/v1.0/sites/fakedrive.sharepoint.com:/sites/site",
+    )
+    recorder.close()
+
+    spec = {
+        "task_id": "replay",
+        "siteHostname": "fakedrive.sharepoint.com",
+        "siteName": "site",
+        "protocol": {
+            "name": "opentaskpy.addons.o365.remotehandlers.sharepoint.SharepointTransfer",
+            "refreshToken": "refresh",
+            "clientId": "client",
+            "tenantId": "tenant",
+            "transport": {"replay": str(recording), "timeScale": 0},
+        },
+    }
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.get_access_token",
+        side_effect=AssertionError("no credentials needed"),
+    ):
+        handler = SharepointTransfer(spec)
+
+    assert handler.site_id == SITE_ID
+    assert isinstance(handler._transport, ReplayTransport)
+    handler.tidy()
+    assert handler._transport is None
@@ -0,0 +1,200 @@
+import io
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from opentaskpy.exceptions import RemoteTransferError
+
+from opentaskpy.addons.o365.remotehandlers.quickxorhash import QuickXorHash
+from opentaskpy.addons.o365.remotehandlers.sharepoint import SharepointTransfer
+from opentaskpy.addons.o365.remotehandlers.streams import (
+    DownloadStream,
+    iter_chunk_ranges,
+    iter_upload_chunks,
+)
+
+
+def _response(data: bytes, chunk_size: int = 1000) -> MagicMock:
+    response = MagicMock()
+    response.status_code = 200
+    response.iter_content.side_effect = lambda _: iter(
+        data[i : i + chunk_size] for i in range(0, len(data), chunk_size)
+    )
+    return response
+
+
+def test_download_stream_read_returns_all_data() -> None:
+    data = os.urandom(12345)
+    stream = DownloadStream(
+        _response(data),
+        "file.bin",
+        size=len(data),
+        expected_hash=QuickXorHash(data).base64digest(),
+    )
+
+    assert io.BufferedReader(stream, 4096).read() == data
+    assert stream.bytes_read == len(data)
+    assert stream.hash == QuickXorHash(data).base64digest()
+
+
+def test_download_stream_iter_chunks_after_partial_read() -> None:
+    data = os.urandom(5000)
+    stream = DownloadStream(_response(data), "file.bin", size=len(data))
+
+    start = stream.read(10)
+    rest = b"".join(stream.iter_chunks())
+
+    assert start + rest == data
+
+
+def test_download_stream_raises_on_hash_mismatch() -> None:
+    data = os.urandom(5000)
+    stream = DownloadStream(
+        _response(data),
+        "file.bin",
+        expected_hash=QuickXorHash(b"other").base64digest(),
+    )
+
+    with pytest.raises(RemoteTransferError, match="quickXorHash mismatch"):
+        b"".join(stream.iter_chunks())
+
+
+def test_download_stream_raises_on_truncated_download() -> None:
+    stream = DownloadStream(_response(b"short"), "file.bin", size=100)
+
+    with pytest.raises(RemoteTransferError, match="ended after 5 of 100 bytes"):
+        stream.read()
+
+
+def test_download_stream_close_releases_response() -> None:
+    response = _response(b"data")
+    with DownloadStream(response, "file.bin") as stream:
+        stream.read(1)
+
+    response.close.assert_called_once()
+
+
+def _handler() -> SharepointTransfer:
+    """Build a SharepointTransfer object without running network-heavy __init__."""
+    handler = SharepointTransfer.__new__(SharepointTransfer)
+    handler.logger = MagicMock()
+    handler.spec = {"siteName": "site", "directory": "dest", "protocol": {}}
+    handler.credentials = {"access_token": "token", "expiry": 4102444800}
+    handler.timeout = 30
+    handler.site_id = "site-id"
+    return handler
+
+
+def test_open_file_streams_the_download() -> None:
+    handler = _handler()
+    data = b"file content"
+
+    with (
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.get",
+            return_value=_response(data),
+        ) as mock_get,
+        handler.open_file(
+            "file.txt",
+            {
+                "directory": "src",
+                "size": len(data),
+                "quick_xor_hash": QuickXorHash(data).base64digest(),
+            },
+        ) as stream,
+    ):
+        assert stream.read() == data
+
+    assert mock_get.call_args.args[0].endswith("/drive/root:/src/file.txt:/content")
+    assert mock_get.call_args.kwargs["stream"] is True
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ([], [(b"", True)]),
+        ([b"abc"], [(b"abc", True)]),
+        ([b"ab", b"cd"], [(b"abcd", True)]),
+        ([b"abcde", b"f"], [(b"abcd", False), (b"ef", True)]),
+        ([b"a", b"bcdefgh"], [(b"abcd", False), (b"efgh", True)]),
+        (io.BytesIO(b"abcdefghi"), [(b"abcd", False), (b"efgh", False), (b"i", True)]),
+    ],
+)
+def test_iter_upload_chunks(data, expected) -> None:
+    assert list(iter_upload_chunks(data, 4)) == expected
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [
+        (0, []),
+        (3, [(0, 2)]),
+        (4, [(0, 3)]),
+        (9, [(0, 3), (4, 7), (8, 8)]),
+    ],
+)
+def test_iter_chunk_ranges(size, expected) -> None:
+    assert list(iter_chunk_ranges(size, 4)) == expected
+
+
+def test_upload_stream_small_data_uses_single_put() -> None:
+    handler = _handler()
+    response = MagicMock()
+    response.status_code = 201
+    response.json.return_value = {
+        "file": {"hashes": {"quickXorHash": QuickXorHash(b"small").base64digest()}}
+    }
+
+    with patch(
+        "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.put",
+        return_value=response,
+    ) as mock_put:
+        assert handler.upload_stream(iter([b"sm", b"all"]), "file.txt") == 0
+
+    assert mock_put.call_args.args[0].endswith("/drive/root:/dest/file.txt:/content")
+    assert mock_put.call_args.kwargs["data"] == b"small"
+
+
+def test_upload_stream_of_unknown_length_uses_upload_session() -> None:
+    handler = _handler()
+    data = os.urandom(10)
+    session = MagicMock()
+    session.status_code = 200
+    session.json.return_value = {"uploadUrl": "https://upload/session"}
+
+    def fake_put(url: str, **kwargs) -> MagicMock:
+        response = MagicMock()
+        last = not kwargs["headers"]["Content-Range"].endswith("/*")
+        response.status_code = 201 if last else 202
+        response.json.return_value = {
+            "file": {"hashes": {"quickXorHash": QuickXorHash(data).base64digest()}}
+        }
+        return response
+
+    with (
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.STREAM_UPLOAD_CHUNK_SIZE",
+            4,
+        ),
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.post",
+            return_value=session,
+        ) as mock_post,
+        patch(
+            "opentaskpy.addons.o365.remotehandlers.sharepoint.requests.put",
+            side_effect=fake_put,
+        ) as mock_put,
+    ):
+        assert handler.upload_stream(io.BytesIO(data), "file.txt") == 0
+
+    assert mock_post.call_args.args[0].endswith(
+        "/drive/root:/dest/file.txt:/createUploadSession"
+    )
+    assert [
+        call.kwargs["headers"]["Content-Range"] for call in mock_put.call_args_list
+    ] == [
+        "bytes 0-3/*",
+        "bytes 4-7/*",
+        "bytes 8-9/10",
+    ]
+    assert b"".join(call.kwargs["data"] for call in mock_put.call_args_list) == data